@@ -44,6 +44,24 @@ def create_app(config_name='development'):
     from app.api import api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
     
+    # 初始化缓存（词库目录、排行榜、用户档案、游戏会话单词）
+    from app.utils import cache, catalog_cache, user_cache, session_words
+    cache.init_app(app)
+    
+    # 初始化后台导入任务队列
+    from app.utils.jobs import import_jobs
+    import_jobs.init_app(app)
+    
+    # 初始化进行中游戏会话的状态存储和答题写后缓冲
+    from app.utils.answer_buffer import answer_buffer
+    from app.utils.live_sessions import live_sessions
+    live_sessions.init_app(app)
+    answer_buffer.init_app(app)
+    
+    # 初始化游戏会话代码分配器
+    from app.utils.session_codes import session_codes
+    session_codes.init_app(app)
+    
     # 注册错误处理器
     from app.utils.error_handlers import register_error_handlers
     register_error_handlers(app)
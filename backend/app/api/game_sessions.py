@@ -4,21 +4,21 @@
 from datetime import datetime
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.orm import defer
 from app import db
 from app.models.game import Game, GameSession
 from app.models.user import User
 from app.models.word import Word
+from app.utils.live_sessions import live_sessions
+from app.utils.session_words import cache_session_words, get_session_word
+from app.utils.pagination import keyset_paginate, InvalidCursorError
+from app.utils.session_codes import session_codes
+from app.utils.user_cache import invalidate_profile
 import random
-import string
 
 game_sessions_bp = Blueprint('game_sessions', __name__)
 
 
-def generate_session_code():
-    """生成游戏会话代码"""
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-
-
 @game_sessions_bp.route('/create', methods=['POST'])
 @jwt_required()
 def create_session():
@@ -34,20 +34,15 @@ def create_session():
         if not game or not game.is_active:
             return jsonify({'error': '游戏不存在或已停用'}), 404
         
-        # 生成唯一的会话代码
-        session_code = generate_session_code()
-        while GameSession.query.filter_by(session_code=session_code).first():
-            session_code = generate_session_code()
-        
         # 创建游戏会话
         session = GameSession(
-            session_code=session_code,
             game_id=game.id,
             user_id=user_id,
             total_rounds=data.get('total_rounds', 1)
         )
         
-        db.session.add(session)
+        # 分配会话代码（不查询是否已存在，冲突时由唯一索引发现后重试）
+        session_codes.add(session)
         db.session.commit()
         
         return jsonify({
@@ -141,6 +136,8 @@ def start_session(session_code):
         session.set_words_data(words_data)
         
         db.session.commit()
+        live_sessions.start(session)
+        cache_session_words(session, words_data)
         
         return jsonify({
             'message': '游戏开始',
@@ -159,7 +156,8 @@ def submit_answer(session_code):
     """提交答案"""
     try:
         user_id = get_jwt_identity()
-        session = GameSession.query.filter_by(session_code=session_code).first()
+        # 单词列表来自缓存，不加载 words_data 列
+        session = GameSession.query.options(defer(GameSession.words_data)).filter_by(session_code=session_code).first()
         
         if not session:
             return jsonify({'error': '游戏会话不存在'}), 404
@@ -174,45 +172,26 @@ def submit_answer(session_code):
         word_id = data['word_id']
         answer = data['answer'].strip()
         
-        # 验证答案
-        words_data = session.get_words_data()
-        target_word = None
-        for word in words_data:
-            if word['id'] == word_id:
-                target_word = word
-                break
-        
+        # 验证答案（按单词ID查找）
+        target_word = get_session_word(session, word_id)
         if not target_word:
             return jsonify({'error': '单词不存在'}), 404
         
         # 检查答案是否正确
         is_correct = answer.lower() == target_word['translation'].lower()
         
-        # 更新统计
-        if is_correct:
-            session.correct_answers += 1
-            score = 10  # 基础分数
-        else:
-            session.wrong_answers += 1
-            score = 0
-        
-        session.final_score += score
+        score = 10 if is_correct else 0  # 基础分数
         
-        # 更新玩家数据
-        players_data = session.get_players_data()
-        for player in players_data:
-            if player['user_id'] == user_id:
-                player['score'] += score
-                break
-        
-        session.set_players_data(players_data)
-        db.session.commit()
+        # 记录答题并更新统计和玩家得分（按字段原子自增）
+        totals = live_sessions.record_answer(session_code, session.id, user_id, word_id, is_correct, score)
+        if totals is None:
+            return jsonify({'error': '游戏未在进行中'}), 400
         
         return jsonify({
             'is_correct': is_correct,
             'score': score,
             'correct_answer': target_word['translation'],
-            'total_score': session.final_score
+            'total_score': totals['final_score']
         }), 200
         
     except Exception as e:
@@ -237,6 +216,9 @@ def finish_session(session_code):
         if session.status != 'playing':
             return jsonify({'error': '游戏未在进行中'}), 400
         
+        # 写回会话存储中的实时状态
+        live_sessions.finalize(session)
+        
         # 更新会话状态
         session.status = 'finished'
         session.finished_at = datetime.utcnow()
@@ -267,7 +249,9 @@ def finish_session(session_code):
         }
         session.set_game_result(game_result)
         
+        invalidate_profile(session.user_id)
         db.session.commit()
+        live_sessions.discard(session_code)
         
         return jsonify({
             'message': '游戏结束',
@@ -288,8 +272,8 @@ def get_session(session_code):
         if not session:
             return jsonify({'error': '游戏会话不存在'}), 404
         
-        session_data = session.to_dict()
-        session_data['players'] = session.get_players_data()
+        session_data = live_sessions.to_dict(session)
+        session_data['players'] = live_sessions.players(session)
         
         # 如果游戏正在进行，返回当前单词
         if session.status == 'playing':
@@ -310,6 +294,18 @@ def get_my_sessions():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         
+        # 游标分页（传入 cursor 参数时启用，不统计总数）
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            sessions, cursor_pagination = keyset_paginate(GameSession.query.filter_by(user_id=user_id), [
+                (GameSession.created_at, True),
+                (GameSession.id, True)
+            ], cursor, per_page)
+            return jsonify({
+                'sessions': [session.to_dict() for session in sessions],
+                'pagination': cursor_pagination
+            }), 200
+        
         sessions = GameSession.query.filter_by(user_id=user_id).order_by(
             GameSession.created_at.desc()
         ).paginate(
@@ -330,5 +326,7 @@ def get_my_sessions():
             }
         }), 200
         
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'获取游戏会话列表失败: {str(e)}'}), 500
\ No newline at end of file
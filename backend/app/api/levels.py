@@ -7,6 +7,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models.level import Level, LevelRecord, GameHistory
 from app.models.user import User
+from app.utils.pagination import keyset_paginate, InvalidCursorError
 
 levels_bp = Blueprint('levels', __name__)
 
@@ -305,6 +306,18 @@ def get_game_history():
         if level_id:
             query = query.filter_by(level_id=level_id)
         
+        # 游标分页（传入 cursor 参数时启用，不统计总数）
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            histories, cursor_pagination = keyset_paginate(query, [
+                (GameHistory.played_at, True),
+                (GameHistory.id, True)
+            ], cursor, per_page)
+            return jsonify({
+                'histories': [history.to_dict() for history in histories],
+                'pagination': cursor_pagination
+            }), 200
+        
         histories = query.order_by(GameHistory.played_at.desc()).paginate(
             page=page, 
             per_page=per_page, 
@@ -323,6 +336,8 @@ def get_game_history():
             }
         }), 200
         
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'获取游戏历史失败: {str(e)}'}), 500
 
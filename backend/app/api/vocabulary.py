@@ -1,12 +1,35 @@
 """
 词库管理API
 """
-from flask import Blueprint, request, jsonify
+import io
+import json
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, case, func
 from app import db
 from app.models.vocabulary import VocabularyLibrary, WordGroup, VocabularyWord
+from app.models.search import CjkGram
+from app.models.tag import Tag
 from app.utils.validators import validate_required_fields
+from app.utils.pagination import keyset_paginate, InvalidCursorError
+from app.utils.export import EXPORT_FORMATS, export_library
+from app.utils.importer import (
+    IMPORT_FORMATS, ON_CONFLICT_MODES, WordImporter, detect_format, import_message, import_words
+)
+from app.utils.jobs import JobQueueFullError, import_jobs
+from app.utils.clone import clone_library
+from app.utils.bulk import (
+    ActiveJobError, BulkOperationError, GROUP_BULK_FIELDS, WORD_BULK_FIELDS, parse_changes, parse_ids, parse_order,
+    update_words, delete_words, reorder_words, update_groups, delete_groups, reorder_groups,
+    ensure_no_active_jobs, force_delete_group, force_delete_library
+)
+from app.models.job import ImportJob
+from app.utils.fields import InvalidFieldsError, parse_fields, load_fields, select_fields
+from app.utils.http_cache import latest, make_etag, not_modified_response, set_cache_headers
+from app.utils.fulltext import apply_fulltext_search
+from app.utils.word_index import word_index
+from app.utils.fuzzy import fuzzy_indexes
+from app.utils.catalog_cache import catalog_cache, get_library_data, get_group_data
 
 vocabulary_bp = Blueprint('vocabulary', __name__)
 
@@ -24,6 +47,21 @@ def get_libraries():
         tags = request.args.get('tags', '')
         is_active = request.args.get('is_active', type=bool)
         
+        # 词库数量、最大ID、内容版本号之和与最晚修改时间决定列表内容，客户端缓存有效时不执行列表查询；
+        # 删除词库后最晚修改时间可能变早，列表只用 ETag 验证，不返回 Last-Modified
+        libraries_count, max_id, versions, last_updated = db.session.query(
+            func.count(VocabularyLibrary.id),
+            func.max(VocabularyLibrary.id),
+            func.coalesce(func.sum(VocabularyLibrary.content_version), 0),
+            func.max(VocabularyLibrary.updated_at)
+        ).one()
+        etag = make_etag('libraries', libraries_count, max_id, versions, last_updated)
+        not_modified = not_modified_response(etag)
+        if not_modified is not None:
+            return not_modified
+        
+        # 稀疏字段集（只查询和输出 fields 指定的字段）
+        fields = parse_fields(VocabularyLibrary.FIELD_COLUMNS)
         query = VocabularyLibrary.query
         
         # 搜索过滤
@@ -33,27 +71,43 @@ def get_libraries():
                 VocabularyLibrary.description.contains(search)
             ))
         
-        # 标签过滤
+        # 标签过滤（需同时带有全部标签）
         if tags:
-            tag_list = [tag.strip() for tag in tags.split(',')]
-            for tag in tag_list:
-                query = query.filter(VocabularyLibrary.tags.contains(tag))
+            query = Tag.filter_tagged(query, VocabularyLibrary, tags)
         
         # 状态过滤
         if is_active is not None:
             query = query.filter(VocabularyLibrary.is_active == is_active)
         
+        # 游标分页（传入 cursor 参数时启用，不统计总数）
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            query = load_fields(query, VocabularyLibrary, fields, extra=('sort_order', 'created_at'))
+            libraries, cursor_pagination = keyset_paginate(query, [
+                (VocabularyLibrary.sort_order, False),
+                (VocabularyLibrary.created_at, True),
+                (VocabularyLibrary.id, True)
+            ], cursor, per_page)
+            response = jsonify({
+                'success': True,
+                'data': {
+                    'libraries': [lib.to_dict(fields=fields) for lib in libraries],
+                    'pagination': cursor_pagination
+                }
+            })
+            return set_cache_headers(response, etag)
+        
         # 排序
         query = query.order_by(VocabularyLibrary.sort_order.asc(), VocabularyLibrary.created_at.desc())
         
         # 分页
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        pagination = load_fields(query, VocabularyLibrary, fields).paginate(page=page, per_page=per_page, error_out=False)
         libraries = pagination.items
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'data': {
-                'libraries': [lib.to_dict() for lib in libraries],
+                'libraries': [lib.to_dict(fields=fields) for lib in libraries],
                 'pagination': {
                     'page': page,
                     'per_page': per_page,
@@ -64,6 +118,9 @@ def get_libraries():
                 }
             }
         })
+        return set_cache_headers(response, etag)
+    except (InvalidCursorError, InvalidFieldsError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -115,11 +172,22 @@ def create_library():
 def get_library(library_id):
     """获取词库详情"""
     try:
-        library = VocabularyLibrary.query.get_or_404(library_id)
-        return jsonify({
+        library = get_library_data(library_id)
+        if library is None:
+            return jsonify({'success': False, 'message': '词库不存在'}), 404
+        
+        etag = make_etag('library', library_id, library['version'])
+        not_modified = not_modified_response(etag, library['updated_at'])
+        if not_modified is not None:
+            return not_modified
+        
+        response = jsonify({
             'success': True,
-            'data': library.to_dict()
+            'data': select_fields(library['data'], parse_fields(VocabularyLibrary.FIELD_COLUMNS))
         })
+        return set_cache_headers(response, etag, library['updated_at'])
+    except InvalidFieldsError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -167,10 +235,13 @@ def update_library(library_id):
 @vocabulary_bp.route('/libraries/<int:library_id>', methods=['DELETE'])
 @jwt_required()
 def delete_library(library_id):
-    """删除词库"""
+    """删除词库（force=true 时连同全部词组和单词一起删除）"""
     try:
         library = VocabularyLibrary.query.get_or_404(library_id)
         
+        if request.args.get('force', '').lower() == 'true':
+            return _force_delete(force_delete_library, library_id, '词库', library_id=library_id)
+        
         # 检查是否有关联的词组
         if library.word_groups.count() > 0:
             return jsonify({'success': False, 'message': '词库下还有词组，无法删除'}), 400
@@ -187,6 +258,81 @@ def delete_library(library_id):
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+def _force_delete(operation, record_id, noun, library_id=None, group_id=None):
+    """
+    用 DELETE 语句删除词库或词组及其子记录
+    
+    background=true 时在后台线程中执行并立即返回 202；执行中断时重新发起删除即可继续
+    """
+    try:
+        ensure_no_active_jobs(library_id=library_id, group_id=group_id)
+    except ActiveJobError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+    
+    if request.args.get('background', '').lower() == 'true':
+        import_jobs.run_task(operation, record_id)
+        return jsonify({'success': True, 'message': f'{noun}正在后台删除'}), 202
+    
+    try:
+        operation(record_id)
+    except ActiveJobError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+    return jsonify({
+        'success': True,
+        'message': f'{noun}删除成功'
+    })
+
+
+@vocabulary_bp.route('/libraries/<int:library_id>/clone', methods=['POST'])
+@jwt_required()
+def clone_library_route(library_id):
+    """复制词库（词组、单词和标签在数据库内用 INSERT ... SELECT 复制）"""
+    try:
+        data = request.get_json(silent=True) or {}
+        name = (data.get('name') or '').strip() or None
+        if name and VocabularyLibrary.query.filter_by(name=name).first():
+            return jsonify({'success': False, 'message': '词库名称已存在'}), 400
+        
+        try:
+            library = clone_library(library_id, name)
+        except LookupError as e:
+            return jsonify({'success': False, 'message': str(e)}), 404
+        
+        return jsonify({
+            'success': True,
+            'message': '词库复制成功',
+            'data': library.to_dict()
+        }), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@vocabulary_bp.route('/libraries/<int:library_id>/export', methods=['GET'])
+@jwt_required()
+def export_library_words(library_id):
+    """导出词库的全部单词（流式输出 NDJSON 或 CSV，客户端支持时 gzip 压缩）"""
+    try:
+        library = db.session.get(VocabularyLibrary, library_id)
+        if library is None:
+            return jsonify({'success': False, 'message': '词库不存在'}), 404
+        
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'success': False, 'message': f'不支持的导出格式: {export_format}'}), 400
+        
+        compress = request.accept_encodings['gzip'] > 0
+        chunks = export_library(library_id, export_format, compress=compress)
+        response = Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[export_format])
+        response.headers['Content-Disposition'] = f'attachment; filename=library-{library_id}.{export_format}'
+        response.headers['Vary'] = 'Accept-Encoding'
+        if compress:
+            response.headers['Content-Encoding'] = 'gzip'
+        return response
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
 # ==================== 词组管理 ====================
 
 @vocabulary_bp.route('/libraries/<int:library_id>/groups', methods=['GET'])
@@ -196,6 +342,12 @@ def get_groups(library_id):
     try:
         library = VocabularyLibrary.query.get_or_404(library_id)
         
+        # 词组及其单词的写入都会递增词库的内容版本号
+        etag = make_etag('groups', library.id, library.content_version)
+        not_modified = not_modified_response(etag, library.updated_at)
+        if not_modified is not None:
+            return not_modified
+        
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         search = request.args.get('search', '')
@@ -214,6 +366,24 @@ def get_groups(library_id):
         if is_active is not None:
             query = query.filter(WordGroup.is_active == is_active)
         
+        # 游标分页（传入 cursor 参数时启用，不统计总数）
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            groups, cursor_pagination = keyset_paginate(query, [
+                (WordGroup.sort_order, False),
+                (WordGroup.created_at, True),
+                (WordGroup.id, True)
+            ], cursor, per_page)
+            response = jsonify({
+                'success': True,
+                'data': {
+                    'library': library.to_dict(),
+                    'groups': [group.to_dict() for group in groups],
+                    'pagination': cursor_pagination
+                }
+            })
+            return set_cache_headers(response, etag, library.updated_at)
+        
         # 排序
         query = query.order_by(WordGroup.sort_order.asc(), WordGroup.created_at.desc())
         
@@ -221,7 +391,7 @@ def get_groups(library_id):
         pagination = query.paginate(page=page, per_page=per_page, error_out=False)
         groups = pagination.items
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'data': {
                 'library': library.to_dict(),
@@ -236,6 +406,9 @@ def get_groups(library_id):
                 }
             }
         })
+        return set_cache_headers(response, etag, library.updated_at)
+    except InvalidCursorError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -285,11 +458,20 @@ def create_group(library_id):
 def get_group(group_id):
     """获取词组详情"""
     try:
-        group = WordGroup.query.get_or_404(group_id)
-        return jsonify({
+        group = get_group_data(group_id)
+        if group is None:
+            return jsonify({'success': False, 'message': '词组不存在'}), 404
+        
+        etag = make_etag('group', group_id, group['version'], group['library_version'])
+        not_modified = not_modified_response(etag, group['updated_at'])
+        if not_modified is not None:
+            return not_modified
+        
+        response = jsonify({
             'success': True,
-            'data': group.to_dict()
+            'data': group['data']
         })
+        return set_cache_headers(response, etag, group['updated_at'])
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -335,10 +517,13 @@ def update_group(group_id):
 @vocabulary_bp.route('/groups/<int:group_id>', methods=['DELETE'])
 @jwt_required()
 def delete_group(group_id):
-    """删除词组"""
+    """删除词组（force=true 时连同全部单词一起删除）"""
     try:
         group = WordGroup.query.get_or_404(group_id)
         
+        if request.args.get('force', '').lower() == 'true':
+            return _force_delete(force_delete_group, group_id, '词组', group_id=group_id)
+        
         # 检查是否有关联的单词
         if group.vocabulary_words.count() > 0:
             return jsonify({'success': False, 'message': '词组下还有单词，无法删除'}), 400
@@ -364,43 +549,84 @@ def get_words(group_id):
     try:
         group = WordGroup.query.get_or_404(group_id)
         
+        # 单词写入会递增词组的内容版本号，词库版本号覆盖词库名称的修改
+        last_modified = latest(group.updated_at, group.library.updated_at)
+        etag = make_etag('words', group.id, group.content_version, group.library.content_version)
+        not_modified = not_modified_response(etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
         search = request.args.get('search', '')
         tags = request.args.get('tags', '')
         is_active = request.args.get('is_active', type=bool)
         
+        # 稀疏字段集（只查询和输出 fields 指定的字段）
+        fields = parse_fields(VocabularyWord.FIELD_COLUMNS)
         query = VocabularyWord.query.filter_by(group_id=group_id)
-        
-        # 搜索过滤
-        if search:
-            query = query.filter(or_(
-                VocabularyWord.word.contains(search),
-                VocabularyWord.translation.contains(search)
-            ))
-        
-        # 标签过滤
+        cursor = request.args.get('cursor')
+        fuzzy = request.args.get('fuzzy', '').lower() == 'true'
+        
+        # 容错搜索（按编辑距离匹配单词，距离近的排在前面）
+        if search and fuzzy:
+            distances = fuzzy_indexes[VocabularyWord].search(search, request.args.get('distance', type=int),
+                                                             scope=group_id, is_active=is_active)
+            query = query.filter(VocabularyWord.id.in_(list(distances)))
+            if cursor is None and distances:
+                query = query.order_by(case(distances, value=VocabularyWord.id))
+        
+        # 搜索过滤（英文走全文索引、中文走 n-gram 索引并按相关度排序，游标分页时只过滤不排序）
+        elif search:
+            searched = apply_fulltext_search(query, VocabularyWord, search, db.session, rank=cursor is None)
+            if searched is None:
+                searched = CjkGram.apply_search(query, VocabularyWord, search, rank=cursor is None)
+            if searched is not None:
+                query = searched
+            else:
+                query = query.filter(or_(
+                    VocabularyWord.word.contains(search),
+                    VocabularyWord.translation.contains(search)
+                ))
+        
+        # 标签过滤（需同时带有全部标签）
         if tags:
-            tag_list = [tag.strip() for tag in tags.split(',')]
-            for tag in tag_list:
-                query = query.filter(VocabularyWord.tags.contains(tag))
+            query = Tag.filter_tagged(query, VocabularyWord, tags)
         
         # 状态过滤
         if is_active is not None:
             query = query.filter(VocabularyWord.is_active == is_active)
         
+        # 游标分页（传入 cursor 参数时启用，不统计总数）
+        if cursor is not None:
+            query = load_fields(query, VocabularyWord, fields, extra=('sort_order', 'created_at'))
+            words, cursor_pagination = keyset_paginate(query, [
+                (VocabularyWord.sort_order, False),
+                (VocabularyWord.created_at, True),
+                (VocabularyWord.id, True)
+            ], cursor, per_page)
+            response = jsonify({
+                'success': True,
+                'data': {
+                    'group': group.to_dict(),
+                    'words': [word.to_dict(group=group, fields=fields) for word in words],
+                    'pagination': cursor_pagination
+                }
+            })
+            return set_cache_headers(response, etag, last_modified)
+        
         # 排序
         query = query.order_by(VocabularyWord.sort_order.asc(), VocabularyWord.created_at.desc())
         
         # 分页
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        pagination = load_fields(query, VocabularyWord, fields).paginate(page=page, per_page=per_page, error_out=False)
         words = pagination.items
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'data': {
                 'group': group.to_dict(),
-                'words': [word.to_dict() for word in words],
+                'words': [word.to_dict(group=group, fields=fields) for word in words],
                 'pagination': {
                     'page': page,
                     'per_page': per_page,
@@ -411,6 +637,9 @@ def get_words(group_id):
                 }
             }
         })
+        return set_cache_headers(response, etag, last_modified)
+    except (InvalidCursorError, InvalidFieldsError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -458,23 +687,86 @@ def create_word(group_id):
         return jsonify({
             'success': True,
             'message': '单词创建成功',
-            'data': word.to_dict()
+            'data': word.to_dict(group=group)
         }), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@vocabulary_bp.route('/words/suggest', methods=['GET'])
+@jwt_required()
+def suggest_words():
+    """单词输入联想（进程内有序索引，不访问数据库）"""
+    try:
+        prefix = request.args.get('prefix', '')
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+        group_id = request.args.get('group_id', type=int)
+        
+        suggestions = word_index.suggest(prefix, limit=limit, group_id=group_id)
+        
+        return jsonify({
+            'success': True,
+            'data': [
+                {'id': word_id, 'word': word, 'group_id': word_group_id}
+                for word_id, word, word_group_id in suggestions
+            ]
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@vocabulary_bp.route('/words/facets', methods=['GET'])
+@jwt_required()
+def get_word_facets():
+    """单词的标签、难度、词性分布统计"""
+    try:
+        library_id = request.args.get('library_id', type=int)
+        group_id = request.args.get('group_id', type=int)
+        tags = request.args.get('tags', '')
+        is_active = request.args.get('is_active')
+        
+        query = VocabularyWord.query
+        if group_id is not None:
+            query = query.filter(VocabularyWord.group_id == group_id)
+        if library_id is not None:
+            query = query.join(WordGroup, WordGroup.id == VocabularyWord.group_id).filter(
+                WordGroup.library_id == library_id
+            )
+        if tags:
+            query = Tag.filter_tagged(query, VocabularyWord, tags)
+        if is_active is not None:
+            query = query.filter(VocabularyWord.is_active == (is_active.lower() == 'true'))
+        
+        return jsonify({
+            'success': True,
+            'data': Tag.word_facets(query)
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
 @vocabulary_bp.route('/words/<int:word_id>', methods=['GET'])
 @jwt_required()
 def get_word(word_id):
     """获取单词详情"""
     try:
-        word = VocabularyWord.query.get_or_404(word_id)
-        return jsonify({
+        fields = parse_fields(VocabularyWord.FIELD_COLUMNS)
+        query = load_fields(VocabularyWord.query_with_context(), VocabularyWord, fields, extra=('group_id', 'updated_at'))
+        word = query.filter(VocabularyWord.id == word_id).first_or_404()
+        last_modified = latest(word.updated_at, word.group.updated_at, word.group.library.updated_at)
+        etag = make_etag('word', word.id, word.updated_at, word.group.content_version, word.group.library.content_version)
+        not_modified = not_modified_response(etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        
+        response = jsonify({
             'success': True,
-            'data': word.to_dict()
+            'data': word.to_dict(fields=fields)
         })
+        return set_cache_headers(response, etag, last_modified)
+    except InvalidFieldsError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -562,59 +854,256 @@ def batch_create_words(group_id):
         
         if not data.get('words') or not isinstance(data['words'], list):
             return jsonify({'success': False, 'message': '请提供单词列表'}), 400
-        
-        created_words = []
-        errors = []
-        
-        for i, word_data in enumerate(data['words']):
-            try:
-                # 验证必填字段
-                if not word_data.get('word') or not word_data.get('translation'):
-                    errors.append(f'第{i+1}行：单词和翻译为必填项')
-                    continue
-                
-                # 检查单词是否已存在
-                existing = VocabularyWord.query.filter_by(group_id=group_id, word=word_data['word']).first()
-                if existing:
-                    errors.append(f'第{i+1}行：单词"{word_data["word"]}"已存在')
-                    continue
-                
-                word = VocabularyWord(
-                    word=word_data['word'],
-                    translation=word_data['translation'],
-                    pronunciation=word_data.get('pronunciation'),
-                    phonetic=word_data.get('phonetic'),
-                    part_of_speech=word_data.get('part_of_speech'),
-                    difficulty_level=word_data.get('difficulty_level', 1),
-                    example_sentence=word_data.get('example_sentence'),
-                    example_translation=word_data.get('example_translation'),
-                    notes=word_data.get('notes'),
-                    sort_order=word_data.get('sort_order', 0),
-                    group_id=group_id
-                )
-                
-                # 设置标签
-                if word_data.get('tags'):
-                    word.set_tags_list(word_data['tags'])
-                
-                db.session.add(word)
-                created_words.append(word)
-                
-            except Exception as e:
-                errors.append(f'第{i+1}行：{str(e)}')
-        
-        if created_words:
-            db.session.commit()
+        on_conflict = _on_conflict_arg()
+        if on_conflict is None:
+            return jsonify({'success': False, 'message': 'on_conflict 应为 update、skip 或 error'}), 400
+        chunk_size = current_app.config.get('VOCABULARY_IMPORT_CHUNK_SIZE', 1000)
+        
+        # 后台执行：单词列表按 NDJSON 保存后交给导入任务
+        if request.args.get('background', '').lower() == 'true':
+            content = ''.join(json.dumps(word, ensure_ascii=False) + '\n' for word in data['words'])
+            return _create_import_job(io.BytesIO(content.encode('utf-8')), 'ndjson', group.library_id, group_id,
+                                      chunk_size, on_conflict=on_conflict)
+        
+        # 整个列表按块写入：每块一次查询、一条多行 INSERT（update 模式为 INSERT ... ON CONFLICT）
+        importer = WordImporter(group_id=group_id, chunk_size=chunk_size, max_errors=len(data['words']),
+                                on_conflict=on_conflict)
+        result = importer.run((i + 1, word_data) for i, word_data in enumerate(data['words']))
         
         return jsonify({
             'success': True,
-            'message': f'成功创建{len(created_words)}个单词',
+            'message': import_message(result),
             'data': {
-                'created_count': len(created_words),
-                'error_count': len(errors),
-                'errors': errors
+                'created_count': result['created_count'],
+                'updated_count': result['updated_count'],
+                'skipped_count': result['skipped_count'],
+                'error_count': result['error_count'],
+                'errors': [f"第{error['line']}行：{error['message']}" for error in result['errors']]
             }
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+def _on_conflict_arg():
+    """读取 on_conflict 参数，不合法时返回 None"""
+    on_conflict = request.args.get('on_conflict', 'error').lower()
+    return on_conflict if on_conflict in ON_CONFLICT_MODES else None
+
+
+def _import_upload(library_id=None, group_id=None):
+    """
+    流式导入上传的单词文件
+    
+    文件以 multipart 的 file 字段上传，或直接作为请求体；格式由 format 参数、文件扩展名或 Content-Type 确定
+    """
+    upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+    if request.mimetype == 'multipart/form-data' and upload is None:
+        return jsonify({'success': False, 'message': '请上传文件'}), 400
+    if upload is not None:
+        stream, filename = upload.stream, upload.filename
+        import_format = detect_format(upload.filename, upload.mimetype)
+    else:
+        stream, filename = request.stream, None
+        import_format = detect_format(content_type=request.mimetype)
+    import_format = request.args.get('format') or import_format
+    if import_format not in IMPORT_FORMATS:
+        return jsonify({'success': False, 'message': '请指定导入格式（csv、tsv 或 ndjson）'}), 400
+    
+    chunk_size = request.args.get('chunk_size', current_app.config.get('VOCABULARY_IMPORT_CHUNK_SIZE', 1000), type=int)
+    chunk_size = min(max(chunk_size, 1), 10000)
+    on_conflict = _on_conflict_arg()
+    if on_conflict is None:
+        return jsonify({'success': False, 'message': 'on_conflict 应为 update、skip 或 error'}), 400
+    
+    # 后台执行：保存文件后立即返回任务，进度通过 /jobs/<id> 查询
+    if request.args.get('background', '').lower() == 'true':
+        return _create_import_job(stream, import_format, library_id, group_id, chunk_size, filename, on_conflict)
+    
+    try:
+        result = import_words(stream, import_format, library_id=library_id, group_id=group_id, chunk_size=chunk_size,
+                              on_conflict=on_conflict)
+    except LookupError as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'message': f'导入完成，{import_message(result)}',
+        'data': result
+    })
+
+
+def _create_import_job(stream, import_format, library_id, group_id, chunk_size, filename=None, on_conflict='error'):
+    """创建后台导入任务，返回 202 和任务信息"""
+    if group_id is not None:
+        group = db.session.get(WordGroup, group_id)
+        if group is None:
+            return jsonify({'success': False, 'message': '词组不存在'}), 404
+        library_id = group.library_id
+    elif db.session.get(VocabularyLibrary, library_id) is None:
+        return jsonify({'success': False, 'message': '词库不存在'}), 404
+    
+    user_id = get_jwt_identity()
+    try:
+        job = import_jobs.create(stream, import_format, library_id, group_id=group_id, chunk_size=chunk_size,
+                                 filename=filename, user_id=int(user_id) if user_id else None, on_conflict=on_conflict)
+    except JobQueueFullError as e:
+        return jsonify({'success': False, 'message': str(e)}), 429
+    
+    return jsonify({
+        'success': True,
+        'message': '导入任务已创建',
+        'data': db.session.get(ImportJob, job.id).to_dict()
+    }), 202
+
+
+@vocabulary_bp.route('/groups/<int:group_id>/words/import', methods=['POST'])
+@jwt_required()
+def import_group_words(group_id):
+    """从 CSV / TSV / NDJSON 文件导入单词到词组（逐块提交）"""
+    try:
+        return _import_upload(group_id=group_id)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@vocabulary_bp.route('/libraries/<int:library_id>/import', methods=['POST'])
+@jwt_required()
+def import_library_words(library_id):
+    """从文件导入单词到词库，按 group 列找到或创建词组（可导入 export 接口导出的文件）"""
+    try:
+        return _import_upload(library_id=library_id)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+def _bulk_result(message, requested_ids, affected_ids):
+    """批量操作的返回结果，missing_ids 为不存在的记录"""
+    affected = set(affected_ids)
+    return jsonify({
+        'success': True,
+        'message': message,
+        'data': {
+            'count': len(affected_ids),
+            'ids': affected_ids,
+            'missing_ids': [record_id for record_id in requested_ids if record_id not in affected]
+        }
+    })
+
+
+def _bulk_request(operation):
+    """执行批量操作，参数不合法时返回 400"""
+    try:
+        return operation(request.get_json(silent=True) or {})
+    except BulkOperationError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@vocabulary_bp.route('/words/bulk', methods=['PATCH'])
+@jwt_required()
+def bulk_update_words():
+    """批量修改单词：{"ids": [...], "changes": {"is_active": false}}"""
+    def operation(data):
+        word_ids = parse_ids(data.get('ids'))
+        updated = update_words(word_ids, parse_changes(data.get('changes'), WORD_BULK_FIELDS))
+        return _bulk_result(f'成功修改{len(updated)}个单词', word_ids, updated)
+    return _bulk_request(operation)
+
+
+@vocabulary_bp.route('/words/bulk', methods=['DELETE'])
+@jwt_required()
+def bulk_delete_words():
+    """批量删除单词：{"ids": [...]}"""
+    def operation(data):
+        word_ids = parse_ids(data.get('ids'))
+        deleted = delete_words(word_ids)
+        return _bulk_result(f'成功删除{len(deleted)}个单词', word_ids, deleted)
+    return _bulk_request(operation)
+
+
+@vocabulary_bp.route('/words/order', methods=['PUT'])
+@jwt_required()
+def bulk_reorder_words():
+    """重新排序单词：{"items": [{"id": 1, "sort_order": 0}, ...]}"""
+    def operation(data):
+        order = parse_order(data.get('items'))
+        reordered = reorder_words(order)
+        return _bulk_result(f'成功排序{len(reordered)}个单词', list(order), reordered)
+    return _bulk_request(operation)
+
+
+@vocabulary_bp.route('/groups/bulk', methods=['PATCH'])
+@jwt_required()
+def bulk_update_groups():
+    """批量修改词组：{"ids": [...], "changes": {"is_active": false}}"""
+    def operation(data):
+        group_ids = parse_ids(data.get('ids'))
+        updated = update_groups(group_ids, parse_changes(data.get('changes'), GROUP_BULK_FIELDS))
+        return _bulk_result(f'成功修改{len(updated)}个词组', group_ids, updated)
+    return _bulk_request(operation)
+
+
+@vocabulary_bp.route('/groups/bulk', methods=['DELETE'])
+@jwt_required()
+def bulk_delete_groups():
+    """批量删除空词组：{"ids": [...]}"""
+    def operation(data):
+        group_ids = parse_ids(data.get('ids'))
+        deleted = delete_groups(group_ids)
+        return _bulk_result(f'成功删除{len(deleted)}个词组', group_ids, deleted)
+    return _bulk_request(operation)
+
+
+@vocabulary_bp.route('/groups/order', methods=['PUT'])
+@jwt_required()
+def bulk_reorder_groups():
+    """重新排序词组：{"items": [{"id": 1, "sort_order": 0}, ...]}"""
+    def operation(data):
+        order = parse_order(data.get('items'))
+        reordered = reorder_groups(order)
+        return _bulk_result(f'成功排序{len(reordered)}个词组', list(order), reordered)
+    return _bulk_request(operation)
+
+
+@vocabulary_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_import_job(job_id):
+    """查询导入任务的状态、进度和错误"""
+    try:
+        user_id = get_jwt_identity()
+        job = db.session.get(ImportJob, job_id)
+        if job is None or (job.created_by is not None and str(job.created_by) != str(user_id)):
+            return jsonify({'success': False, 'message': '任务不存在'}), 404
+        
+        # 执行任务的进程已退出（心跳超时）时由当前进程接手
+        if not job.is_finished and import_jobs.recover(job_id):
+            job = db.session.get(ImportJob, job_id, populate_existing=True)
+        
+        return jsonify({
+            'success': True,
+            'data': job.to_dict()
+        })
     except Exception as e:
         db.session.rollback()
-        return jsonify({'success': False, 'message': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@vocabulary_bp.route('/cache/stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    """获取当前进程词库目录缓存的命中、未命中、淘汰统计"""
+    return jsonify({
+        'success': True,
+        'data': catalog_cache.stats()
+    })
\ No newline at end of file
@@ -7,18 +7,17 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models.game import Game, GameSession
 from app.models.user import User
-from app.models.vocabulary import VocabularyLibrary, WordGroup, VocabularyWord
+from app.models.vocabulary import VocabularyWord
+from app.utils.fields import InvalidFieldsError, parse_fields, select_fields
+from app.utils.catalog_cache import get_library_data, get_group_data, get_group_words
+from app.utils.live_sessions import live_sessions
+from app.utils.session_codes import session_codes
+from app.utils.user_cache import invalidate_profile
 import random
-import string
 
 vocabulary_game_bp = Blueprint('vocabulary_game', __name__)
 
 
-def generate_session_code():
-    """生成游戏会话代码"""
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-
-
 @vocabulary_game_bp.route('/start', methods=['POST'])
 @jwt_required()
 def start_vocabulary_game():
@@ -36,18 +35,18 @@ def start_vocabulary_game():
         library_id = data['library_id']
         group_id = data['group_id']
         
-        # 验证词库和词组是否存在
-        library = VocabularyLibrary.query.get(library_id)
+        # 验证词库和词组是否存在（元数据和单词列表来自目录缓存）
+        library = get_library_data(library_id)
         if not library:
             return jsonify({'error': '词库不存在'}), 404
         
-        group = WordGroup.query.get(group_id)
-        if not group or group.library_id != library_id:
+        group = get_group_data(group_id)
+        if not group or group['library_id'] != library_id:
             return jsonify({'error': '词组不存在或不属于指定词库'}), 404
         
-        # 获取词组中的单词
-        words = VocabularyWord.query.filter_by(group_id=group_id).all()
-        if not words:
+        # 获取词组中的单词（复制后再打乱，不修改缓存中的列表）
+        words_data = list(get_group_words(group_id, group['version']))
+        if not words_data:
             return jsonify({'error': '词组中没有单词'}), 400
         
         # 创建或获取默认游戏配置
@@ -58,38 +57,17 @@ def start_vocabulary_game():
                 description='基于词库的单词学习游戏',
                 max_players=1,
                 time_limit=300,
-                word_count=len(words),
-                difficulty_level=group.difficulty_level or 1
+                word_count=len(words_data),
+                difficulty_level=group['data']['difficulty_level'] or 1
             )
             db.session.add(game)
             db.session.flush()  # 获取ID
         
-        # 生成唯一的会话代码
-        session_code = generate_session_code()
-        while GameSession.query.filter_by(session_code=session_code).first():
-            session_code = generate_session_code()
-        
-        # 准备单词数据
-        words_data = []
-        for word in words:
-            words_data.append({
-                'id': word.id,
-                'english': word.word,
-                'chinese': word.translation,
-                'pronunciation': word.pronunciation,
-                'difficulty_level': word.difficulty_level,
-                'phonetic': word.phonetic,
-                'part_of_speech': word.part_of_speech,
-                'example_sentence': word.example_sentence,
-                'example_translation': word.example_translation
-            })
-        
         # 随机打乱单词顺序
         random.shuffle(words_data)
         
         # 创建游戏会话
         session = GameSession(
-            session_code=session_code,
             game_id=game.id,
             user_id=user_id,
             status='playing',
@@ -112,21 +90,23 @@ def start_vocabulary_game():
         }]
         session.set_players_data(players_data)
         
-        db.session.add(session)
+        # 分配会话代码（不查询是否已存在，冲突时由唯一索引发现后重试）
+        session_codes.add(session)
         db.session.commit()
+        live_sessions.start(session)
         
         return jsonify({
             'message': '游戏开始',
-            'session_code': session_code,
+            'session_code': session.session_code,
             'session': session.to_dict(),
             'library': {
-                'id': library.id,
-                'name': library.name
+                'id': library['data']['id'],
+                'name': library['data']['name']
             },
             'group': {
-                'id': group.id,
-                'name': group.name,
-                'difficulty_level': group.difficulty_level
+                'id': group['data']['id'],
+                'name': group['data']['name'],
+                'difficulty_level': group['data']['difficulty_level']
             },
             'words_count': len(words_data),
             'game_config': {
@@ -156,13 +136,17 @@ def get_game_words(session_code):
         if session.user_id != user_id:
             return jsonify({'error': '无权访问此游戏会话'}), 403
         
-        words_data = session.get_words_data()
+        # 稀疏字段集（只输出 fields 指定的字段）
+        fields = parse_fields(VocabularyWord.GAME_FIELDS)
+        words_data = [select_fields(word, fields) for word in session.get_words_data()]
         
         return jsonify({
             'words': words_data,
             'total_count': len(words_data)
         }), 200
         
+    except InvalidFieldsError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'获取单词数据失败: {str(e)}'}), 500
 
@@ -177,16 +161,22 @@ def submit_answer(session_code):
         user_id = int(user_id) if user_id else None
         data = request.get_json()
         
-        session = GameSession.query.filter_by(session_code=session_code).first()
-        if not session:
-            return jsonify({'error': '游戏会话不存在'}), 404
-        
-        if session.user_id != user_id:
+        # 进行中的会话从会话存储读取，不查询数据库
+        session = None
+        state = live_sessions.get(session_code)
+        if state is None:
+            session = GameSession.query.filter_by(session_code=session_code).first()
+            if not session:
+                return jsonify({'error': '游戏会话不存在'}), 404
+            
+            if session.user_id != user_id:
+                return jsonify({'error': '无权访问此游戏会话'}), 403
+            
+            if session.status != 'playing':
+                return jsonify({'error': '游戏未在进行中'}), 400
+        elif state['user_id'] != user_id:
             return jsonify({'error': '无权访问此游戏会话'}), 403
         
-        if session.status != 'playing':
-            return jsonify({'error': '游戏未在进行中'}), 400
-        
         # 验证答案数据
         if 'word_id' not in data or 'answer' not in data or 'is_correct' not in data:
             return jsonify({'error': '缺少必填字段'}), 400
@@ -196,28 +186,25 @@ def submit_answer(session_code):
         is_correct = data['is_correct']
         time_used = data.get('time_used', 0)
         
-        # 更新统计数据
-        if is_correct:
-            session.correct_answers += 1
-        else:
-            session.wrong_answers += 1
-        
-        session.time_used += time_used
-        
         # 计算分数（可以根据需要调整计分规则）
+        score = 0
         if is_correct:
             base_score = 100
             time_bonus = max(0, 30 - time_used) * 2  # 时间奖励
-            session.final_score += base_score + time_bonus
+            score = base_score + time_bonus
         
-        db.session.commit()
+        # 记录答题并更新统计数据（按字段原子自增）
+        session_id = state['session_id'] if state is not None else session.id
+        totals = live_sessions.record_answer(session_code, session_id, user_id, word_id, is_correct, score, time_used)
+        if totals is None:
+            return jsonify({'error': '游戏未在进行中'}), 400
         
         return jsonify({
             'message': '答案已提交',
             'is_correct': is_correct,
-            'current_score': session.final_score,
-            'correct_answers': session.correct_answers,
-            'wrong_answers': session.wrong_answers
+            'current_score': totals['final_score'],
+            'correct_answers': totals['correct_answers'],
+            'wrong_answers': totals['wrong_answers']
         }), 200
         
     except Exception as e:
@@ -244,6 +231,9 @@ def finish_game(session_code):
         if session.status != 'playing':
             return jsonify({'error': '游戏未在进行中'}), 400
         
+        # 写回会话存储中的实时状态
+        live_sessions.finalize(session)
+        
         # 更新游戏状态
         session.status = 'finished'
         session.finished_at = datetime.utcnow()
@@ -275,7 +265,9 @@ def finish_game(session_code):
         if accuracy >= 80:  # 80%以上算胜利
             user.total_wins += 1
         
+        invalidate_profile(session.user_id)
         db.session.commit()
+        live_sessions.discard(session_code)
         
         return jsonify({
             'message': '游戏结束',
@@ -305,9 +297,9 @@ def get_game_status(session_code):
             return jsonify({'error': '无权访问此游戏会话'}), 403
         
         return jsonify({
-            'session': session.to_dict(),
+            'session': live_sessions.to_dict(session),
             'words_count': len(session.get_words_data()),
-            'players': session.get_players_data()
+            'players': live_sessions.players(session)
         }), 200
         
     except Exception as e:
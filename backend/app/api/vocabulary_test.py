@@ -5,6 +5,10 @@ from flask import Blueprint, request, jsonify
 from sqlalchemy import or_, and_
 from app import db
 from app.models.vocabulary import VocabularyLibrary, WordGroup, VocabularyWord
+from app.models.search import CjkGram
+from app.models.tag import Tag
+from app.utils.fulltext import apply_fulltext_search
+from app.utils.importer import ON_CONFLICT_MODES, WordImporter, import_message
 from app.utils.validators import validate_required_fields, validate_pagination_params, validate_difficulty_level, validate_tags
 
 vocabulary_test_bp = Blueprint('vocabulary_test', __name__)
@@ -38,11 +42,9 @@ def get_libraries():
                 )
             )
         
-        # 标签筛选
+        # 标签筛选（需同时带有全部标签）
         if tags:
-            tag_list = [tag.strip() for tag in tags.split(',') if tag.strip()]
-            for tag in tag_list:
-                query = query.filter(VocabularyLibrary.tags.contains(tag))
+            query = Tag.filter_tagged(query, VocabularyLibrary, tags)
         
         # 状态筛选
         if is_active is not None:
@@ -59,17 +61,12 @@ def get_libraries():
             error_out=False
         )
         
+        # 一次查询统计本页词库的词组和单词数量
+        counts = VocabularyLibrary.load_counts([library.id for library in pagination.items])
+        
         # 构建返回数据
         libraries = []
         for library in pagination.items:
-            # 统计词组和单词数量
-            groups_count = WordGroup.query.filter_by(library_id=library.id, is_active=True).count()
-            total_words_count = db.session.query(VocabularyWord).join(WordGroup).filter(
-                WordGroup.library_id == library.id,
-                WordGroup.is_active == True,
-                VocabularyWord.is_active == True
-            ).count()
-            
             library_data = {
                 'id': library.id,
                 'name': library.name,
@@ -78,8 +75,8 @@ def get_libraries():
                 'difficulty_level': library.difficulty_level,
                 'is_active': library.is_active,
                 'sort_order': library.sort_order,
-                'groups_count': groups_count,
-                'total_words_count': total_words_count,
+                'groups_count': counts[library.id]['groups_count'],
+                'total_words_count': counts[library.id]['total_words_count'],
                 'created_at': library.created_at.isoformat() if library.created_at else None,
                 'updated_at': library.updated_at.isoformat() if library.updated_at else None
             }
@@ -114,12 +111,7 @@ def get_library(library_id):
         library = VocabularyLibrary.query.get_or_404(library_id)
         
         # 统计词组和单词数量
-        groups_count = WordGroup.query.filter_by(library_id=library.id, is_active=True).count()
-        total_words_count = db.session.query(VocabularyWord).join(WordGroup).filter(
-            WordGroup.library_id == library.id,
-            WordGroup.is_active == True,
-            VocabularyWord.is_active == True
-        ).count()
+        counts = VocabularyLibrary.load_counts([library.id])[library.id]
         
         library_data = {
             'id': library.id,
@@ -129,8 +121,8 @@ def get_library(library_id):
             'difficulty_level': library.difficulty_level,
             'is_active': library.is_active,
             'sort_order': library.sort_order,
-            'groups_count': groups_count,
-            'total_words_count': total_words_count,
+            'groups_count': counts['groups_count'],
+            'total_words_count': counts['total_words_count'],
             'created_at': library.created_at.isoformat() if library.created_at else None,
             'updated_at': library.updated_at.isoformat() if library.updated_at else None
         }
@@ -190,12 +182,12 @@ def get_groups(library_id):
             error_out=False
         )
         
+        # 一次查询统计本页词组的单词数量
+        words_counts = WordGroup.load_words_counts([group.id for group in pagination.items])
+        
         # 构建返回数据
         groups = []
         for group in pagination.items:
-            # 统计单词数量
-            words_count = VocabularyWord.query.filter_by(group_id=group.id, is_active=True).count()
-            
             group_data = {
                 'id': group.id,
                 'name': group.name,
@@ -204,7 +196,7 @@ def get_groups(library_id):
                 'is_active': group.is_active,
                 'sort_order': group.sort_order,
                 'library_id': group.library_id,
-                'words_count': words_count,
+                'words_count': words_counts[group.id],
                 'created_at': group.created_at.isoformat() if group.created_at else None,
                 'updated_at': group.updated_at.isoformat() if group.updated_at else None
             }
@@ -255,15 +247,27 @@ def get_words(group_id):
         # 构建查询
         query = VocabularyWord.query.filter_by(group_id=group_id)
         
-        # 搜索条件
+        # 搜索条件（英文走全文索引、中文走 n-gram 索引并按相关度排序）
         if search:
-            query = query.filter(
-                or_(
-                    VocabularyWord.word.contains(search),
-                    VocabularyWord.translation.contains(search),
-                    VocabularyWord.tags.contains(search)
-                )
+            searched = apply_fulltext_search(
+                query, VocabularyWord, search, db.session,
+                extra_conditions=[Tag.has_tag(VocabularyWord, search)]
             )
+            if searched is None:
+                searched = CjkGram.apply_search(
+                    query, VocabularyWord, search,
+                    extra_conditions=[Tag.has_tag(VocabularyWord, search)]
+                )
+            if searched is not None:
+                query = searched
+            else:
+                query = query.filter(
+                    or_(
+                        VocabularyWord.word.contains(search),
+                        VocabularyWord.translation.contains(search),
+                        Tag.has_tag(VocabularyWord, search)
+                    )
+                )
         
         # 状态筛选
         if is_active is not None:
@@ -329,6 +333,15 @@ def get_words(group_id):
         }), 500
 
 
+def _coerce_difficulty(word_data):
+    """难度等级不是 1-5 的整数时按 1 处理，不记为错误"""
+    if isinstance(word_data, dict) and 'difficulty_level' in word_data:
+        difficulty_level = word_data['difficulty_level']
+        if not isinstance(difficulty_level, int) or difficulty_level < 1 or difficulty_level > 5:
+            return {**word_data, 'difficulty_level': 1}
+    return word_data
+
+
 @vocabulary_test_bp.route('/groups/<int:group_id>/words/batch', methods=['POST'])
 def batch_import_words(group_id):
     """批量导入单词"""
@@ -344,72 +357,35 @@ def batch_import_words(group_id):
                 'message': '请提供单词列表'
             }), 400
         
-        created_words = []
-        errors = []
-        
-        for i, word_data in enumerate(data['words']):
-            try:
-                # 验证必填字段
-                if not word_data.get('word') or not word_data.get('translation'):
-                    errors.append(f'第{i+1}行：单词和翻译为必填项')
-                    continue
-                
-                # 检查单词是否已存在（同一词组下）
-                existing = VocabularyWord.query.filter_by(group_id=group_id, word=word_data['word']).first()
-                if existing:
-                    errors.append(f'第{i+1}行：单词"{word_data["word"]}"已存在')
-                    continue
-                
-                # 处理标签
-                tags_str = ''
-                if word_data.get('tags') and isinstance(word_data['tags'], list):
-                    tags_str = ','.join([str(tag).strip() for tag in word_data['tags'] if str(tag).strip()])
-                
-                # 验证难度等级
-                difficulty_level = word_data.get('difficulty_level', 1)
-                if not isinstance(difficulty_level, int) or difficulty_level < 1 or difficulty_level > 5:
-                    difficulty_level = 1
-                
-                word = VocabularyWord(
-                    word=word_data['word'].strip(),
-                    translation=word_data['translation'].strip(),
-                    pronunciation=word_data.get('pronunciation', '').strip() if word_data.get('pronunciation') else None,
-                    phonetic=word_data.get('phonetic', '').strip() if word_data.get('phonetic') else None,
-                    part_of_speech=word_data.get('part_of_speech', '').strip() if word_data.get('part_of_speech') else None,
-                    difficulty_level=difficulty_level,
-                    example_sentence=word_data.get('example_sentence', '').strip() if word_data.get('example_sentence') else None,
-                    example_translation=word_data.get('example_translation', '').strip() if word_data.get('example_translation') else None,
-                    notes=word_data.get('notes', '').strip() if word_data.get('notes') else None,
-                    tags=tags_str if tags_str else None,
-                    group_id=group_id,
-                    is_active=True
-                )
-                
-                db.session.add(word)
-                created_words.append(word)
-                
-            except Exception as e:
-                errors.append(f'第{i+1}行：{str(e)}')
+        on_conflict = request.args.get('on_conflict', 'error').lower()
+        if on_conflict not in ON_CONFLICT_MODES:
+            return jsonify({
+                'success': False,
+                'message': 'on_conflict 应为 update、skip 或 error'
+            }), 400
         
-        # 提交数据库事务
-        if created_words:
-            db.session.commit()
+        # 与正式接口相同，批量查询已存在的单词并用多行 INSERT 写入；整个列表作为一块，只提交一次
+        importer = WordImporter(group_id=group.id, chunk_size=len(data['words']), on_conflict=on_conflict)
+        result = importer.run((i + 1, _coerce_difficulty(word_data)) for i, word_data in enumerate(data['words']))
+        errors = [f"第{error['line']}行：{error['message']}" for error in result['errors']]
         
         # 构建返回数据
         result_data = {
-            'created_count': len(created_words),
-            'error_count': len(errors),
+            'created_count': result['created_count'],
+            'updated_count': result['updated_count'],
+            'skipped_count': result['skipped_count'],
+            'error_count': result['error_count'],
             'total_count': len(data['words']),
-            'errors': errors[:10] if errors else []  # 最多返回前10个错误
+            'errors': errors[:10]  # 最多返回前10个错误
         }
         
-        if len(errors) > 10:
+        if result['error_count'] > 10:
             result_data['has_more_errors'] = True
-            result_data['remaining_errors'] = len(errors) - 10
+            result_data['remaining_errors'] = result['error_count'] - 10
         
         return jsonify({
             'success': True,
-            'message': f'批量导入完成，成功创建 {len(created_words)} 个单词' + (f'，{len(errors)} 个错误' if errors else ''),
+            'message': f'批量导入完成，{import_message(result)}',
             'data': result_data
         })
         
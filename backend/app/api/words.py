@@ -3,8 +3,13 @@
 """
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
+from sqlalchemy import case
 from app import db
 from app.models.word import Word, WordCategory
+from app.models.search import CjkGram
+from app.utils.fulltext import apply_fulltext_search
+from app.utils.fuzzy import fuzzy_indexes
+from app.utils.fields import InvalidFieldsError, parse_fields, load_fields
 import random
 
 words_bp = Blueprint('words', __name__)
@@ -32,8 +37,11 @@ def get_random_words():
         category_id = request.args.get('category_id', type=int)
         difficulty_level = request.args.get('difficulty_level', type=int)
         
+        # 稀疏字段集（只查询和输出 fields 指定的字段）
+        fields = parse_fields(Word.FIELD_COLUMNS)
+        
         # 构建查询
-        query = Word.query.filter_by(is_active=True)
+        query = load_fields(Word.query.filter_by(is_active=True), Word, fields)
         
         if category_id:
             query = query.filter_by(category_id=category_id)
@@ -53,13 +61,15 @@ def get_random_words():
             min(count, len(all_words))
         )
         
-        words_data = [word.to_dict() for word in selected_words]
+        words_data = [word.to_dict(fields=fields) for word in selected_words]
         
         return jsonify({
             'words': words_data,
             'total_available': len(all_words)
         }), 200
         
+    except InvalidFieldsError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'获取随机单词失败: {str(e)}'}), 500
 
@@ -72,15 +82,33 @@ def search_words():
         category_id = request.args.get('category_id', type=int)
         difficulty_level = request.args.get('difficulty_level', type=int)
         limit = request.args.get('limit', 50, type=int)
+        fuzzy = request.args.get('fuzzy', '').lower() == 'true'
         
-        # 构建查询
-        word_query = Word.query.filter_by(is_active=True)
+        # 稀疏字段集（只查询和输出 fields 指定的字段）
+        fields = parse_fields(Word.FIELD_COLUMNS)
         
-        if query:
-            word_query = word_query.filter(
-                (Word.word.contains(query)) | 
-                (Word.translation.contains(query))
-            )
+        # 构建查询
+        word_query = load_fields(Word.query.filter_by(is_active=True), Word, fields)
+        
+        if query and fuzzy:
+            # 容错搜索（按编辑距离匹配单词，距离近的排在前面）
+            distances = fuzzy_indexes[Word].search(query, request.args.get('distance', type=int),
+                                                   scope=category_id, is_active=True)
+            word_query = word_query.filter(Word.id.in_(list(distances)))
+            if distances:
+                word_query = word_query.order_by(case(distances, value=Word.id))
+        elif query:
+            # 英文走全文索引、中文走 n-gram 索引并按相关度排序
+            searched = apply_fulltext_search(word_query, Word, query, db.session)
+            if searched is None:
+                searched = CjkGram.apply_search(word_query, Word, query)
+            if searched is not None:
+                word_query = searched
+            else:
+                word_query = word_query.filter(
+                    (Word.word.contains(query)) | 
+                    (Word.translation.contains(query))
+                )
         
         if category_id:
             word_query = word_query.filter_by(category_id=category_id)
@@ -89,10 +117,12 @@ def search_words():
             word_query = word_query.filter_by(difficulty_level=difficulty_level)
         
         words = word_query.limit(limit).all()
-        words_data = [word.to_dict() for word in words]
+        words_data = [word.to_dict(fields=fields) for word in words]
         
         return jsonify({'words': words_data}), 200
         
+    except InvalidFieldsError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'搜索单词失败: {str(e)}'}), 500
 
@@ -2,9 +2,12 @@
 数据模型模块
 """
 from .user import User
-from .game import Game, GameSession
+from .game import Game, GameSession, GameAnswer
 from .word import Word, WordCategory
 from .vocabulary import VocabularyLibrary, WordGroup, VocabularyWord
 from .level import Level, LevelRecord, GameHistory
+from .search import CjkGram
+from .tag import Tag
+from .job import ImportJob
 
-__all__ = ['User', 'Game', 'GameSession', 'Word', 'WordCategory', 'Level', 'LevelRecord', 'GameHistory']
\ No newline at end of file
+__all__ = ['User', 'Game', 'GameSession', 'GameAnswer', 'Word', 'WordCategory', 'Level', 'LevelRecord', 'GameHistory', 'CjkGram', 'Tag', 'ImportJob']
\ No newline at end of file
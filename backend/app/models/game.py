@@ -152,4 +152,42 @@ class GameSession(db.Model):
         }
     
     def __repr__(self):
-        return f'<GameSession {self.session_code}>'
\ No newline at end of file
+        return f'<GameSession {self.session_code}>'
+
+
+class GameAnswer(db.Model):
+    """
+    答题记录（只插入不修改）
+    
+    每次答题一行，由写后缓冲批量插入；会话进行中的总分和计数可由这些记录汇总得到
+    """
+    __tablename__ = 'game_answers'
+    __table_args__ = (
+        db.Index('ix_game_answers_session', 'session_id', 'user_id'),
+        db.Index('ix_game_answers_user_word', 'user_id', 'word_id', 'ts'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.Integer, db.ForeignKey('game_sessions.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    word_id = db.Column(db.Integer, nullable=True)  # 单词或词库单词的ID（取决于游戏类型）
+    correct = db.Column(db.Boolean, nullable=False)
+    score = db.Column(db.Integer, nullable=False, default=0)
+    latency_ms = db.Column(db.Integer, nullable=True)  # 答题用时（毫秒）
+    ts = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'session_id': self.session_id,
+            'user_id': self.user_id,
+            'word_id': self.word_id,
+            'correct': self.correct,
+            'score': self.score,
+            'latency_ms': self.latency_ms,
+            'ts': self.ts.isoformat() if self.ts else None
+        }
+    
+    def __repr__(self):
+        return f'<GameAnswer {self.session_id} {self.word_id}>'
@@ -0,0 +1,93 @@
+"""
+后台任务模型
+导入任务持久化在数据库中，工作进程重启后由其他进程从最后提交的位置继续执行
+"""
+from datetime import datetime
+from app import db
+import json
+
+
+class ImportJob(db.Model):
+    """单词导入任务"""
+    __tablename__ = 'import_jobs'
+    
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PENDING, index=True)
+    
+    # 导入目标和参数
+    library_id = db.Column(db.Integer, db.ForeignKey('vocabulary_libraries.id', ondelete='CASCADE'), nullable=False)
+    group_id = db.Column(db.Integer, db.ForeignKey('word_groups.id', ondelete='CASCADE'), nullable=True)
+    import_format = db.Column(db.String(20), nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False, default=1000)
+    on_conflict = db.Column(db.String(20), nullable=False, default='error')  # 单词已存在时的处理方式
+    filename = db.Column(db.String(255), nullable=True)
+    source_path = db.Column(db.String(500), nullable=False)  # 上传文件的保存路径
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    
+    # 进度（与每块单词在同一事务中提交）
+    processed_line = db.Column(db.Integer, nullable=False, default=0)  # 已处理到的行号，恢复时从下一行继续
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    created_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_count = db.Column(db.Integer, nullable=False, default=0)
+    skipped_count = db.Column(db.Integer, nullable=False, default=0)
+    error_count = db.Column(db.Integer, nullable=False, default=0)
+    chunks = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Text, nullable=True)  # 前 100 条错误（JSON）
+    message = db.Column(db.Text, nullable=True)
+    
+    # 执行状态
+    worker = db.Column(db.String(100), nullable=True)  # 主机名:进程号
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def get_errors(self):
+        """获取错误列表"""
+        if self.errors:
+            return json.loads(self.errors)
+        return []
+    
+    def set_errors(self, errors):
+        """设置错误列表"""
+        self.errors = json.dumps(errors, ensure_ascii=False) if errors else None
+    
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'status': self.status,
+            'library_id': self.library_id,
+            'group_id': self.group_id,
+            'format': self.import_format,
+            'on_conflict': self.on_conflict,
+            'filename': self.filename,
+            'processed_line': self.processed_line,
+            'total_count': self.total_count,
+            'created_count': self.created_count,
+            'updated_count': self.updated_count,
+            'skipped_count': self.skipped_count,
+            'error_count': self.error_count,
+            'errors': self.get_errors(),
+            'has_more_errors': self.error_count > len(self.get_errors()),
+            'chunks': self.chunks,
+            'message': self.message,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ImportJob {self.id} {self.status}>'
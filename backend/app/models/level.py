@@ -40,6 +40,7 @@ class Level(db.Model):
     
     # 关系
     level_records = db.relationship('LevelRecord', backref='level', lazy='dynamic')
+    game_histories = db.relationship('GameHistory', backref='level', lazy='dynamic')
     unlock_parent = db.relationship('Level', remote_side=[id], backref='unlock_children')
     
     def get_tasks_config(self):
@@ -0,0 +1,185 @@
+"""
+检索索引模型
+中文等 CJK 文本的 n-gram 倒排索引（单字 + 二元组）
+"""
+import re
+from sqlalchemy import and_, case, delete, event, func, insert, inspect, or_
+from app import db
+from app.models.vocabulary import VocabularyWord
+from app.models.word import Word
+
+# 中日韩连续字符段
+CJK_RUN_PATTERN = re.compile(r'[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]+')
+
+# 模型 -> 建立 n-gram 索引的字段（第一个字段在排序中优先）
+CJK_INDEXED_FIELDS = {
+    VocabularyWord: ['translation', 'example_translation', 'notes'],
+    Word: ['translation'],
+}
+
+
+def extract_cjk_grams(text):
+    """
+    提取文本中 CJK 字符段的单字和二元组
+    
+    Args:
+        text (str): 原始文本
+    
+    Returns:
+        set: n-gram 集合
+    """
+    grams = set()
+    if not text:
+        return grams
+    for run in CJK_RUN_PATTERN.findall(text):
+        grams.update(run)
+        grams.update(run[i:i + 2] for i in range(len(run) - 1))
+    return grams
+
+
+def _query_grams(search):
+    """
+    检索词使用的 n-gram：有二元组时只用二元组，单字检索时用单字
+    """
+    grams = set()
+    for run in CJK_RUN_PATTERN.findall(search):
+        if len(run) == 1:
+            grams.add(run)
+        else:
+            grams.update(run[i:i + 2] for i in range(len(run) - 1))
+    return grams
+
+
+class CjkGram(db.Model):
+    """CJK n-gram 倒排索引"""
+    __tablename__ = 'cjk_grams'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(50), nullable=False)  # 来源表名
+    record_id = db.Column(db.Integer, nullable=False)  # 来源记录ID
+    gram = db.Column(db.String(2), nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_cjk_grams_lookup', 'source', 'gram', 'record_id'),
+        db.Index('ix_cjk_grams_record', 'source', 'record_id'),
+    )
+    
+    @staticmethod
+    def grams_for(obj):
+        """计算记录所有索引字段的 n-gram"""
+        grams = set()
+        for field in CJK_INDEXED_FIELDS[type(obj)]:
+            grams |= extract_cjk_grams(getattr(obj, field))
+        return grams
+    
+    @staticmethod
+    def apply_search(query, model, search, rank=True, extra_conditions=()):
+        """
+        对查询应用 CJK n-gram 检索
+        
+        先用倒排索引求出包含全部 n-gram 的候选记录，再对候选记录做子串校验
+        
+        Args:
+            query: 原始查询
+            model: 已建立 n-gram 索引的模型
+            search (str): 用户输入的检索词
+            rank (bool): 是否按命中字段排序（游标分页时应关闭）
+            extra_conditions: 与 n-gram 匹配取“或”的其他过滤条件
+        
+        Returns:
+            查询对象；检索词不含 CJK 字符时返回 None，由调用方使用原有检索路径
+        """
+        fields = CJK_INDEXED_FIELDS.get(model)
+        grams = _query_grams(search)
+        if not fields or not grams:
+            return None
+        
+        candidates = db.session.query(CjkGram.record_id).filter(
+            CjkGram.source == model.__tablename__,
+            CjkGram.gram.in_(grams)
+        ).group_by(CjkGram.record_id).having(
+            func.count(func.distinct(CjkGram.gram)) == len(grams)
+        )
+        
+        columns = [getattr(model, field) for field in fields]
+        matched = and_(model.id.in_(candidates), or_(*[col.contains(search) for col in columns]))
+        query = query.filter(or_(matched, *extra_conditions))
+        
+        if rank:
+            # 翻译命中的排在例句、备注命中的前面
+            query = query.order_by(case((columns[0].contains(search), 0), else_=1))
+        return query
+    
+    def __repr__(self):
+        return f'<CjkGram {self.source}:{self.record_id} {self.gram}>'
+
+
+def reindex_cjk_grams(model, record_ids=None):
+    """
+    重建指定模型的 n-gram 索引
+    
+    Args:
+        model: 已建立 n-gram 索引的模型
+        record_ids (list): 需要重建的记录ID，为空时重建全部
+    """
+    source = model.__tablename__
+    fields = CJK_INDEXED_FIELDS[model]
+    
+    stmt = delete(CjkGram).where(CjkGram.source == source)
+    if record_ids is not None:
+        stmt = stmt.where(CjkGram.record_id.in_(record_ids))
+    db.session.execute(stmt)
+    
+    query = db.session.query(model.id, *[getattr(model, field) for field in fields])
+    if record_ids is not None:
+        query = query.filter(model.id.in_(record_ids))
+    
+    rows = []
+    for record_id, *values in query.yield_per(1000):
+        grams = set()
+        for value in values:
+            grams |= extract_cjk_grams(value)
+        rows.extend({'source': source, 'record_id': record_id, 'gram': gram} for gram in grams)
+        if len(rows) >= 5000:
+            db.session.execute(insert(CjkGram), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(CjkGram), rows)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _maintain_cjk_grams(session, flush_context):
+    """flush 后同步新增、修改、删除记录的 n-gram 索引"""
+    stale = {}
+    rows = []
+    
+    for obj in session.new:
+        if type(obj) in CJK_INDEXED_FIELDS:
+            rows.extend({'source': obj.__tablename__, 'record_id': obj.id, 'gram': gram}
+                        for gram in CjkGram.grams_for(obj))
+    
+    for obj in session.dirty:
+        if type(obj) not in CJK_INDEXED_FIELDS:
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[field].history.has_changes() for field in CJK_INDEXED_FIELDS[type(obj)]):
+            continue
+        stale.setdefault(obj.__tablename__, set()).add(obj.id)
+        rows.extend({'source': obj.__tablename__, 'record_id': obj.id, 'gram': gram}
+                    for gram in CjkGram.grams_for(obj))
+    
+    for obj in session.deleted:
+        if type(obj) in CJK_INDEXED_FIELDS:
+            stale.setdefault(obj.__tablename__, set()).add(obj.id)
+    
+    if not stale and not rows:
+        return
+    
+    connection = session.connection()
+    for source, record_ids in stale.items():
+        connection.execute(delete(CjkGram.__table__).where(
+            CjkGram.__table__.c.source == source,
+            CjkGram.__table__.c.record_id.in_(record_ids)
+        ))
+    if rows:
+        connection.execute(insert(CjkGram.__table__), rows)
@@ -0,0 +1,210 @@
+"""
+标签模型
+词库和单词的标签存放在标签表和关联表中，原有逗号分隔的 tags 字段保留用于展示，
+关联表由 flush 事件根据 tags 字段同步维护
+"""
+from sqlalchemy import String, cast, delete, event, func, insert, inspect, literal, select, union_all
+from app import db
+from app.models.vocabulary import VocabularyLibrary, VocabularyWord
+
+
+def parse_tags(value):
+    """
+    规范化标签：去掉首尾空白、空标签和重复标签，保持原有顺序
+    
+    Args:
+        value: 逗号分隔的字符串或标签列表
+    
+    Returns:
+        list: 标签列表
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    tags = []
+    for tag in value:
+        tag = str(tag).strip()
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+class Tag(db.Model):
+    """标签"""
+    __tablename__ = 'tags'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False, unique=True)
+    
+    @staticmethod
+    def filter_tagged(query, model, tag_names):
+        """
+        只保留同时带有全部指定标签的记录（通过关联表索引查找）
+        
+        Args:
+            query: 原始查询
+            model: VocabularyLibrary 或 VocabularyWord
+            tag_names (list): 标签名列表
+        """
+        tag_names = parse_tags(tag_names)
+        if not tag_names:
+            return query
+        association = TAGGED_MODELS[model]
+        tagged = select(association.c.record_id).join(
+            Tag, Tag.id == association.c.tag_id
+        ).where(Tag.name.in_(tag_names)).group_by(association.c.record_id).having(
+            func.count(func.distinct(association.c.tag_id)) == len(tag_names)
+        )
+        return query.filter(model.id.in_(tagged))
+    
+    @staticmethod
+    def has_tag(model, tag_name):
+        """记录带有指定标签的过滤条件"""
+        association = TAGGED_MODELS[model]
+        return model.id.in_(select(association.c.record_id).join(
+            Tag, Tag.id == association.c.tag_id
+        ).where(Tag.name == tag_name))
+    
+    @staticmethod
+    def word_facets(query):
+        """
+        用一次查询统计单词的标签、难度、词性分布
+        
+        Args:
+            query: 已按条件过滤的单词查询
+        
+        Returns:
+            dict: {'tags': [...], 'difficulty_level': [...], 'part_of_speech': [...]}，
+                  每项为 {'value': 值, 'count': 数量}，按数量降序
+        """
+        word_ids = query.with_entities(VocabularyWord.id).scalar_subquery()
+        
+        by_tag = select(
+            literal('tags').label('facet'),
+            Tag.name.label('value'),
+            func.count().label('count')
+        ).select_from(word_tags).join(Tag, Tag.id == word_tags.c.tag_id).where(
+            word_tags.c.record_id.in_(word_ids)
+        ).group_by(Tag.name)
+        
+        by_difficulty = select(
+            literal('difficulty_level').label('facet'),
+            cast(VocabularyWord.difficulty_level, String).label('value'),
+            func.count().label('count')
+        ).where(VocabularyWord.id.in_(word_ids)).group_by(VocabularyWord.difficulty_level)
+        
+        by_part_of_speech = select(
+            literal('part_of_speech').label('facet'),
+            VocabularyWord.part_of_speech.label('value'),
+            func.count().label('count')
+        ).where(VocabularyWord.id.in_(word_ids)).group_by(VocabularyWord.part_of_speech)
+        
+        facets = {'tags': [], 'difficulty_level': [], 'part_of_speech': []}
+        for facet, value, count in db.session.execute(union_all(by_tag, by_difficulty, by_part_of_speech)):
+            if facet == 'difficulty_level' and value is not None:
+                value = int(value)
+            facets[facet].append({'value': value, 'count': count})
+        for items in facets.values():
+            items.sort(key=lambda item: (-item['count'], str(item['value'])))
+        return facets
+    
+    def __repr__(self):
+        return f'<Tag {self.name}>'
+
+
+def _association_table(name, record_table):
+    return db.Table(
+        name,
+        db.Column('record_id', db.Integer, db.ForeignKey(f'{record_table}.id', ondelete='CASCADE'), primary_key=True),
+        db.Column('tag_id', db.Integer, db.ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+        db.Index(f'ix_{name}_tag', 'tag_id', 'record_id'),
+    )
+
+
+library_tags = _association_table('vocabulary_library_tags', 'vocabulary_libraries')
+word_tags = _association_table('vocabulary_word_tags', 'vocabulary_words')
+
+# 模型 -> 标签关联表
+TAGGED_MODELS = {
+    VocabularyLibrary: library_tags,
+    VocabularyWord: word_tags,
+}
+
+
+def _tag_ids(connection, names):
+    """查询标签ID，不存在的标签先创建"""
+    if not names:
+        return {}
+    tag_table = Tag.__table__
+    rows = connection.execute(select(tag_table.c.name, tag_table.c.id).where(tag_table.c.name.in_(names)))
+    ids = dict(rows.all())
+    missing = [name for name in names if name not in ids]
+    if missing:
+        connection.execute(insert(tag_table), [{'name': name} for name in missing])
+        rows = connection.execute(select(tag_table.c.name, tag_table.c.id).where(tag_table.c.name.in_(missing)))
+        ids.update(rows.all())
+    return ids
+
+
+def _write_tags(connection, association, tags_by_record, replace=True):
+    """用 {记录ID: 标签列表} 覆盖关联表中对应记录的标签"""
+    if replace:
+        connection.execute(delete(association).where(association.c.record_id.in_(list(tags_by_record))))
+    ids = _tag_ids(connection, sorted({tag for tags in tags_by_record.values() for tag in tags}))
+    rows = [
+        {'record_id': record_id, 'tag_id': ids[tag]}
+        for record_id, tags in tags_by_record.items() for tag in tags
+    ]
+    if rows:
+        connection.execute(insert(association), rows)
+
+
+def reindex_tags(model, record_ids=None):
+    """
+    根据 tags 字段重建标签关联（批量 SQL 修改标签后调用）
+    
+    Args:
+        model: VocabularyLibrary 或 VocabularyWord
+        record_ids (list): 需要重建的记录ID，为空时重建全部
+    """
+    association = TAGGED_MODELS[model]
+    connection = db.session.connection()
+    stmt = delete(association)
+    if record_ids is not None:
+        stmt = stmt.where(association.c.record_id.in_(record_ids))
+    connection.execute(stmt)
+    
+    query = db.session.query(model.id, model.tags)
+    if record_ids is not None:
+        query = query.filter(model.id.in_(record_ids))
+    
+    batch = {}
+    for record_id, tags in query.yield_per(1000):
+        batch[record_id] = parse_tags(tags)
+        if len(batch) >= 1000:
+            _write_tags(connection, association, batch, replace=False)
+            batch = {}
+    if batch:
+        _write_tags(connection, association, batch, replace=False)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _maintain_tags(session, flush_context):
+    """flush 后根据 tags 字段同步新增、修改、删除记录的标签关联"""
+    changed = {}
+    for obj in session.new:
+        if type(obj) in TAGGED_MODELS:
+            changed.setdefault(type(obj), {})[obj.id] = parse_tags(obj.tags)
+    for obj in session.dirty:
+        if type(obj) in TAGGED_MODELS and inspect(obj).attrs.tags.history.has_changes():
+            changed.setdefault(type(obj), {})[obj.id] = parse_tags(obj.tags)
+    for obj in session.deleted:
+        if type(obj) in TAGGED_MODELS:
+            changed.setdefault(type(obj), {})[obj.id] = []
+    
+    if not changed:
+        return
+    connection = session.connection()
+    for model, tags_by_record in changed.items():
+        _write_tags(connection, TAGGED_MODELS[model], tags_by_record)
@@ -2,8 +2,13 @@
 词库管理模型
 包含词库、词组、单词的三层结构
 """
+from collections import defaultdict
 from datetime import datetime
+from sqlalchemy import case, event, func, inspect, select, update
+from sqlalchemy.orm import joinedload
 from app import db
+from app.utils.fulltext import register_fulltext_index
+from app.utils.fields import serialize
 
 
 class VocabularyLibrary(db.Model):
@@ -18,6 +23,13 @@ class VocabularyLibrary(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     sort_order = db.Column(db.Integer, default=0)  # 排序字段
     
+    # 冗余计数（只统计启用的词组及其中启用的单词），由 flush 事件维护
+    groups_count = db.Column(db.Integer, nullable=False, default=0)
+    words_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    # 内容版本号，词库自身或其下任意词组、单词写入时递增，用于 ETag
+    content_version = db.Column(db.Integer, nullable=False, default=1)
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -27,38 +39,81 @@ class VocabularyLibrary(db.Model):
     def get_tags_list(self):
         """获取标签列表"""
         if self.tags:
-            return [tag.strip() for tag in self.tags.split(',')]
+            return [tag.strip() for tag in self.tags.split(',') if tag.strip()]
         return []
     
     def set_tags_list(self, tags_list):
-        """设置标签列表"""
+        """设置标签列表（标签关联表在 flush 时同步）"""
+        tags_list = [str(tag).strip() for tag in tags_list or [] if str(tag).strip()]
         if tags_list:
-            self.tags = ','.join(tags_list)
+            self.tags = ','.join(dict.fromkeys(tags_list))
         else:
             self.tags = None
     
     def get_total_words_count(self):
         """获取词库中总单词数"""
-        total = 0
-        for group in self.word_groups:
-            total += group.vocabulary_words.count()
-        return total
+        return self.words_count or 0
     
-    def to_dict(self):
-        """转换为字典"""
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'tags': self.get_tags_list(),
-            'difficulty_level': self.difficulty_level,
-            'is_active': self.is_active,
-            'sort_order': self.sort_order,
-            'groups_count': self.word_groups.count(),
-            'total_words_count': self.get_total_words_count(),
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+    @staticmethod
+    def load_counts(library_ids):
+        """
+        用一次 GROUP BY 查询统计一页词库的启用词组数和单词数
+        
+        Args:
+            library_ids (list): 词库ID列表
+            
+        Returns:
+            dict: {词库ID: {'groups_count': int, 'total_words_count': int}}
+        """
+        counts = {library_id: {'groups_count': 0, 'total_words_count': 0} for library_id in library_ids}
+        if not counts:
+            return counts
+        
+        rows = db.session.query(
+            WordGroup.library_id,
+            func.count(func.distinct(WordGroup.id)),
+            func.count(VocabularyWord.id)
+        ).outerjoin(
+            VocabularyWord,
+            (VocabularyWord.group_id == WordGroup.id) & (VocabularyWord.is_active == True)
+        ).filter(
+            WordGroup.library_id.in_(list(counts)),
+            WordGroup.is_active == True
+        ).group_by(WordGroup.library_id).all()
+        
+        for library_id, groups_count, words_count in rows:
+            counts[library_id] = {'groups_count': groups_count, 'total_words_count': words_count}
+        return counts
+    
+    # 可输出的字段 -> 依赖的列（fields 参数据此裁剪查询的列）
+    FIELD_COLUMNS = {
+        'id': ('id',),
+        'name': ('name',),
+        'description': ('description',),
+        'tags': ('tags',),
+        'difficulty_level': ('difficulty_level',),
+        'is_active': ('is_active',),
+        'sort_order': ('sort_order',),
+        'groups_count': ('groups_count',),
+        'total_words_count': ('words_count',),
+        'created_at': ('created_at',),
+        'updated_at': ('updated_at',)
+    }
+    
+    def to_dict(self, fields=None):
+        """
+        转换为字典
+        
+        Args:
+            fields (list): 只输出这些字段，为空时输出全部字段
+        """
+        return serialize(self, fields or self.FIELD_COLUMNS, {
+            'tags': self.get_tags_list,
+            'groups_count': lambda: self.groups_count or 0,
+            'total_words_count': self.get_total_words_count,
+            'created_at': lambda: self.created_at.isoformat() if self.created_at else None,
+            'updated_at': lambda: self.updated_at.isoformat() if self.updated_at else None
+        })
     
     def __repr__(self):
         return f'<VocabularyLibrary {self.name}>'
@@ -78,12 +133,44 @@ class WordGroup(db.Model):
     # 外键
     library_id = db.Column(db.Integer, db.ForeignKey('vocabulary_libraries.id'), nullable=False)
     
+    # 冗余计数（只统计启用的单词），由 flush 事件维护
+    words_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    # 内容版本号，词组自身或其下任意单词写入时递增，用于 ETag
+    content_version = db.Column(db.Integer, nullable=False, default=1)
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # 关系
     vocabulary_words = db.relationship('VocabularyWord', backref='group', lazy='dynamic', cascade='all, delete-orphan')
     
+    @staticmethod
+    def load_words_counts(group_ids):
+        """
+        用一次 GROUP BY 查询统计一页词组的启用单词数
+        
+        Args:
+            group_ids (list): 词组ID列表
+            
+        Returns:
+            dict: {词组ID: 单词数}
+        """
+        counts = {group_id: 0 for group_id in group_ids}
+        if not counts:
+            return counts
+        
+        rows = db.session.query(
+            VocabularyWord.group_id,
+            func.count(VocabularyWord.id)
+        ).filter(
+            VocabularyWord.group_id.in_(list(counts)),
+            VocabularyWord.is_active == True
+        ).group_by(VocabularyWord.group_id).all()
+        
+        counts.update(dict(rows))
+        return counts
+    
     def to_dict(self):
         """转换为字典"""
         return {
@@ -95,7 +182,7 @@ class WordGroup(db.Model):
             'sort_order': self.sort_order,
             'library_id': self.library_id,
             'library_name': self.library.name if self.library else None,
-            'words_count': self.vocabulary_words.count(),
+            'words_count': self.words_count or 0,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -107,6 +194,8 @@ class WordGroup(db.Model):
 class VocabularyWord(db.Model):
     """词汇单词模型 - 最小单位"""
     __tablename__ = 'vocabulary_words'
+    # 同一词组下单词唯一，批量导入按此索引做 INSERT ... ON CONFLICT
+    __table_args__ = (db.Index('uq_vocabulary_words_group_word', 'group_id', 'word', unique=True),)
     
     id = db.Column(db.Integer, primary_key=True)
     word = db.Column(db.String(100), nullable=False, index=True)
@@ -134,40 +223,339 @@ class VocabularyWord(db.Model):
     def get_tags_list(self):
         """获取标签列表"""
         if self.tags:
-            return [tag.strip() for tag in self.tags.split(',')]
+            return [tag.strip() for tag in self.tags.split(',') if tag.strip()]
         return []
     
     def set_tags_list(self, tags_list):
-        """设置标签列表"""
+        """设置标签列表（标签关联表在 flush 时同步）"""
+        tags_list = [str(tag).strip() for tag in tags_list or [] if str(tag).strip()]
         if tags_list:
-            self.tags = ','.join(tags_list)
+            self.tags = ','.join(dict.fromkeys(tags_list))
         else:
             self.tags = None
     
-    def to_dict(self):
-        """转换为字典"""
+    @staticmethod
+    def query_with_context():
+        """
+        获取预加载所属词组和词库的查询
+        
+        词组和词库名称与单词在同一条 SQL 中取出，序列化时不再逐行懒加载
+        """
+        return VocabularyWord.query.options(
+            joinedload(VocabularyWord.group).joinedload(WordGroup.library)
+        )
+    
+    def to_game_dict(self):
+        """转换为游戏使用的单词字典"""
         return {
             'id': self.id,
-            'word': self.word,
-            'translation': self.translation,
+            'english': self.word,
+            'chinese': self.translation,
             'pronunciation': self.pronunciation,
+            'difficulty_level': self.difficulty_level,
             'phonetic': self.phonetic,
             'part_of_speech': self.part_of_speech,
-            'difficulty_level': self.difficulty_level,
-            'frequency': self.frequency,
-            'group_id': self.group_id,
-            'group_name': self.group.name if self.group else None,
-            'library_id': self.group.library_id if self.group else None,
-            'library_name': self.group.library.name if self.group and self.group.library else None,
             'example_sentence': self.example_sentence,
-            'example_translation': self.example_translation,
-            'notes': self.notes,
-            'tags': self.get_tags_list(),
-            'is_active': self.is_active,
-            'sort_order': self.sort_order,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'example_translation': self.example_translation
         }
     
+    # 可输出的字段 -> 依赖的列（fields 参数据此裁剪查询的列）
+    FIELD_COLUMNS = {
+        'id': ('id',),
+        'word': ('word',),
+        'translation': ('translation',),
+        'pronunciation': ('pronunciation',),
+        'phonetic': ('phonetic',),
+        'part_of_speech': ('part_of_speech',),
+        'difficulty_level': ('difficulty_level',),
+        'frequency': ('frequency',),
+        'group_id': ('group_id',),
+        'group_name': ('group_id',),
+        'library_id': ('group_id',),
+        'library_name': ('group_id',),
+        'example_sentence': ('example_sentence',),
+        'example_translation': ('example_translation',),
+        'notes': ('notes',),
+        'tags': ('tags',),
+        'is_active': ('is_active',),
+        'sort_order': ('sort_order',),
+        'created_at': ('created_at',),
+        'updated_at': ('updated_at',)
+    }
+    
+    # 需要访问所属词组的字段
+    GROUP_FIELDS = frozenset(['group_name', 'library_id', 'library_name'])
+    
+    # to_game_dict 输出的字段
+    GAME_FIELDS = (
+        'id', 'english', 'chinese', 'pronunciation', 'difficulty_level',
+        'phonetic', 'part_of_speech', 'example_sentence', 'example_translation'
+    )
+    
+    def to_dict(self, group=None, fields=None):
+        """
+        转换为字典
+        
+        Args:
+            group (WordGroup): 已知的所属词组，传入时不再访问 self.group
+            fields (list): 只输出这些字段，为空时输出全部字段
+        """
+        if fields is None:
+            fields = self.FIELD_COLUMNS
+        if group is None and not self.GROUP_FIELDS.isdisjoint(fields):
+            group = self.group
+        return serialize(self, fields, {
+            'group_name': lambda: group.name if group else None,
+            'library_id': lambda: group.library_id if group else None,
+            'library_name': lambda: group.library.name if group and group.library else None,
+            'tags': self.get_tags_list,
+            'created_at': lambda: self.created_at.isoformat() if self.created_at else None,
+            'updated_at': lambda: self.updated_at.isoformat() if self.updated_at else None
+        })
+    
     def __repr__(self):
-        return f'<VocabularyWord {self.word}>'
\ No newline at end of file
+        return f'<VocabularyWord {self.word}>'
+
+
+# 单词和翻译的全文索引
+register_fulltext_index(VocabularyWord.__table__, ['word', 'translation'])
+
+
+# ==================== 冗余计数维护 ====================
+
+def _is_active(value):
+    """is_active 未赋值时按列默认值（启用）处理"""
+    return value is None or bool(value)
+
+
+def _old_value(obj, key):
+    """获取属性在本次 flush 之前的值"""
+    history = inspect(obj).attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(obj, key)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _maintain_vocabulary_counters(session, flush_context, instances):
+    """
+    在 flush 前根据新增、删除、修改的词组和单词计算计数增量，
+    并以 ``count = count + delta`` 的形式写回，避免并发写入时丢失更新
+    """
+    new_words = [obj for obj in session.new if isinstance(obj, VocabularyWord)]
+    new_groups = [obj for obj in session.new if isinstance(obj, WordGroup)]
+    deleted_words = [obj for obj in session.deleted if isinstance(obj, VocabularyWord)]
+    deleted_groups = [obj for obj in session.deleted if isinstance(obj, WordGroup)]
+    deleted_library_ids = {obj.id for obj in session.deleted if isinstance(obj, VocabularyLibrary)}
+    dirty_words = [obj for obj in session.dirty if isinstance(obj, VocabularyWord)]
+    dirty_groups = [obj for obj in session.dirty if isinstance(obj, WordGroup)]
+    
+    if not (new_words or new_groups or deleted_words or deleted_groups or dirty_words or dirty_groups):
+        return
+    
+    with session.no_autoflush:
+        deleted_group_ids = {group.id for group in deleted_groups}
+        # 词组 -> 启用单词数增量（以对象为键，兼容尚未分配 ID 的新词组）
+        group_deltas = defaultdict(int)
+        
+        def add_word(group, group_id, delta):
+            if group is None and group_id is not None:
+                group = session.get(WordGroup, group_id)
+            if group is not None and group not in deleted_groups:
+                group_deltas[group] += delta
+        
+        for word in new_words:
+            if _is_active(word.is_active):
+                add_word(word.group, word.group_id, 1)
+        
+        for word in deleted_words:
+            old_group_id = _old_value(word, 'group_id')
+            if _is_active(_old_value(word, 'is_active')) and old_group_id not in deleted_group_ids:
+                add_word(None, old_group_id, -1)
+        
+        for word in dirty_words:
+            old_active = _is_active(_old_value(word, 'is_active'))
+            new_active = _is_active(word.is_active)
+            old_group_id = _old_value(word, 'group_id')
+            if old_active == new_active and old_group_id == word.group_id:
+                continue
+            if old_active:
+                add_word(None, old_group_id, -1)
+            if new_active:
+                add_word(word.group, word.group_id, 1)
+        
+        # 词库 -> [启用词组数增量, 启用单词数增量]
+        library_deltas = defaultdict(lambda: [0, 0])
+        
+        def add_library(library_id, groups_delta, words_delta):
+            if library_id is not None and library_id not in deleted_library_ids:
+                library_deltas[library_id][0] += groups_delta
+                library_deltas[library_id][1] += words_delta
+        
+        for group in deleted_groups:
+            if _is_active(_old_value(group, 'is_active')):
+                add_library(_old_value(group, 'library_id'), -1, -(group.words_count or 0))
+        
+        new_group_set = set(new_groups)
+        for group in set(group_deltas) | new_group_set | set(dirty_groups):
+            delta = group_deltas.get(group, 0)
+            if group in new_group_set:
+                if _is_active(group.is_active):
+                    add_library(group.library_id, 1, delta)
+                group.words_count = delta
+                continue
+            
+            stored = group.words_count or 0
+            old_active = _is_active(_old_value(group, 'is_active'))
+            old_library_id = _old_value(group, 'library_id')
+            if old_active:
+                add_library(old_library_id, -1, -stored)
+            if _is_active(group.is_active):
+                add_library(group.library_id, 1, stored + delta)
+            if delta:
+                group.words_count = WordGroup.words_count + delta
+        
+        for library_id, (groups_delta, words_delta) in library_deltas.items():
+            if not groups_delta and not words_delta:
+                continue
+            library = session.get(VocabularyLibrary, library_id)
+            if library is None:
+                continue
+            if library in session.new:
+                library.groups_count = (library.groups_count or 0) + groups_delta
+                library.words_count = (library.words_count or 0) + words_delta
+            else:
+                library.groups_count = VocabularyLibrary.groups_count + groups_delta
+                library.words_count = VocabularyLibrary.words_count + words_delta
+
+
+# ==================== 内容版本号维护 ====================
+
+@event.listens_for(db.session, 'before_flush')
+def _bump_content_versions(session, flush_context, instances):
+    """
+    在 flush 前递增受影响词组和词库的内容版本号：
+    单词写入影响所属词组（移动时包括原词组）及词库，词组写入影响自身及所属词库
+    """
+    changed = [obj for obj in session.new | session.dirty | session.deleted
+               if isinstance(obj, (VocabularyLibrary, WordGroup, VocabularyWord))]
+    if not changed:
+        return
+    
+    with session.no_autoflush:
+        groups = set()
+        libraries = set()
+        
+        def add_group(group, group_id):
+            if group is None and group_id is not None:
+                group = session.get(WordGroup, group_id)
+            if group is not None:
+                groups.add(group)
+                add_library(group.library, group.library_id)
+        
+        def add_library(library, library_id):
+            if library is None and library_id is not None:
+                library = session.get(VocabularyLibrary, library_id)
+            if library is not None:
+                libraries.add(library)
+        
+        for obj in changed:
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            if isinstance(obj, VocabularyWord):
+                if obj not in session.new:
+                    add_group(None, _old_value(obj, 'group_id'))
+                if obj not in session.deleted:
+                    add_group(obj.group, obj.group_id)
+            elif isinstance(obj, WordGroup):
+                groups.add(obj)
+                if obj not in session.new:
+                    add_library(None, _old_value(obj, 'library_id'))
+                if obj not in session.deleted:
+                    add_library(obj.library, obj.library_id)
+            else:
+                libraries.add(obj)
+        
+        for group in groups:
+            if group not in session.new and group not in session.deleted:
+                group.content_version = WordGroup.content_version + 1
+        for library in libraries:
+            if library not in session.new and library not in session.deleted:
+                library.content_version = VocabularyLibrary.content_version + 1
+
+
+def rebuild_vocabulary_counters(library_ids=None):
+    """
+    批量重新计算词组和词库的冗余计数，并递增其内容版本号
+    
+    批量 SQL 修改词组或单词后调用
+    
+    Args:
+        library_ids (list): 需要修复的词库ID，为空时修复全部
+    """
+    words_count = select(func.count(VocabularyWord.id)).where(
+        VocabularyWord.group_id == WordGroup.id,
+        VocabularyWord.is_active == True
+    ).scalar_subquery()
+    group_stmt = update(WordGroup).values(
+        words_count=words_count,
+        content_version=WordGroup.content_version + 1
+    )
+    if library_ids:
+        group_stmt = group_stmt.where(WordGroup.library_id.in_(library_ids))
+    db.session.execute(group_stmt.execution_options(synchronize_session=False))
+    
+    groups_count = select(func.count(WordGroup.id)).where(
+        WordGroup.library_id == VocabularyLibrary.id,
+        WordGroup.is_active == True
+    ).scalar_subquery()
+    library_words_count = select(func.coalesce(func.sum(WordGroup.words_count), 0)).where(
+        WordGroup.library_id == VocabularyLibrary.id,
+        WordGroup.is_active == True
+    ).scalar_subquery()
+    library_stmt = update(VocabularyLibrary).values(
+        groups_count=groups_count,
+        words_count=library_words_count,
+        content_version=VocabularyLibrary.content_version + 1
+    )
+    if library_ids:
+        library_stmt = library_stmt.where(VocabularyLibrary.id.in_(library_ids))
+    db.session.execute(library_stmt.execution_options(synchronize_session=False))
+    db.session.expire_all()
+
+
+def apply_word_count_deltas(deltas):
+    """
+    按增量更新词组和词库的冗余计数，并递增其内容版本号
+    
+    批量 SQL 插入或删除单词后调用，只涉及变化的词组，比 rebuild_vocabulary_counters 重新统计整个词库开销小
+    
+    Args:
+        deltas (dict): {词组ID: 启用单词数增量}
+    """
+    if not deltas:
+        return
+    groups = db.session.execute(
+        select(WordGroup.id, WordGroup.library_id, WordGroup.is_active).where(WordGroup.id.in_(list(deltas)))
+    ).all()
+    
+    library_deltas = defaultdict(int)
+    for group_id, library_id, is_active in groups:
+        library_deltas[library_id] += deltas[group_id] if _is_active(is_active) else 0
+    
+    # 每张表只执行一条 UPDATE，用 CASE 按ID取各自的增量
+    group_ids = [group_id for group_id, _, _ in groups]
+    if group_ids:
+        db.session.execute(update(WordGroup).where(WordGroup.id.in_(group_ids)).values(
+            words_count=WordGroup.words_count + case({group_id: deltas[group_id] for group_id in group_ids},
+                                                     value=WordGroup.id, else_=0),
+            content_version=WordGroup.content_version + 1
+        ).execution_options(synchronize_session=False))
+    if library_deltas:
+        db.session.execute(update(VocabularyLibrary).where(VocabularyLibrary.id.in_(list(library_deltas))).values(
+            words_count=VocabularyLibrary.words_count + case(dict(library_deltas), value=VocabularyLibrary.id, else_=0),
+            content_version=VocabularyLibrary.content_version + 1
+        ).execution_options(synchronize_session=False))
+    db.session.expire_all()
@@ -3,6 +3,8 @@
 """
 from datetime import datetime
 from app import db
+from app.utils.fulltext import register_fulltext_index
+from app.utils.fields import serialize
 
 
 class WordCategory(db.Model):
@@ -71,21 +73,36 @@ class Word(db.Model):
         else:
             self.tags = None
     
-    def to_dict(self):
-        """转换为字典"""
-        return {
-            'id': self.id,
-            'word': self.word,
-            'translation': self.translation,
-            'pronunciation': self.pronunciation,
-            'difficulty_level': self.difficulty_level,
-            'frequency': self.frequency,
-            'category_id': self.category_id,
-            'category_name': self.category.name if self.category else None,
-            'example_sentence': self.example_sentence,
-            'tags': self.get_tags_list(),
-            'is_active': self.is_active
-        }
+    # 可输出的字段 -> 依赖的列（fields 参数据此裁剪查询的列）
+    FIELD_COLUMNS = {
+        'id': ('id',),
+        'word': ('word',),
+        'translation': ('translation',),
+        'pronunciation': ('pronunciation',),
+        'difficulty_level': ('difficulty_level',),
+        'frequency': ('frequency',),
+        'category_id': ('category_id',),
+        'category_name': ('category_id',),
+        'example_sentence': ('example_sentence',),
+        'tags': ('tags',),
+        'is_active': ('is_active',)
+    }
+    
+    def to_dict(self, fields=None):
+        """
+        转换为字典
+        
+        Args:
+            fields (list): 只输出这些字段，为空时输出全部字段
+        """
+        return serialize(self, fields or self.FIELD_COLUMNS, {
+            'category_name': lambda: self.category.name if self.category else None,
+            'tags': self.get_tags_list
+        })
     
     def __repr__(self):
-        return f'<Word {self.word}>'
\ No newline at end of file
+        return f'<Word {self.word}>'
+
+
+# 单词和翻译的全文索引
+register_fulltext_index(Word.__table__, ['word', 'translation'])
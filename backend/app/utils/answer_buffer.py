@@ -0,0 +1,189 @@
+"""
+答题写后缓冲
+答题记录先追加到工作进程的缓冲区，由后台线程每隔 ANSWER_BUFFER_INTERVAL_MS 毫秒或累计
+ANSWER_BUFFER_MAX_EVENTS 条后，用一条多行 INSERT 写入 game_answers。只插入不更新，答题不争用会话行的锁。
+工作进程崩溃时最多丢失一个刷新间隔内的答题；正常退出时（gunicorn 重启工作进程等）先刷新缓冲区。
+缓冲区只用于启用了会话存储的部署（计数和得分在会话存储中），会话结束后才刷新到的记录照常写入；
+未启用会话存储时答题记录与会话计数的自增在同一事务中插入，不经过缓冲区（见 live_sessions）。
+永远无法写入的记录（会话或用户已删除等完整性错误）逐条隔离后丢弃并记录日志，不阻塞其他记录；
+数据库暂时不可用时记录留在缓冲区重试，缓冲区最多保留 ANSWER_BUFFER_MAX_PENDING 条
+"""
+import atexit
+import logging
+import os
+import threading
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from app import db
+from app.models.game import GameAnswer
+
+logger = logging.getLogger(__name__)
+
+INSERT_BATCH_SIZE = 500  # 每条多行 INSERT 的行数（受数据库绑定参数个数限制）
+
+
+class AnswerBuffer:
+    """
+    答题记录的写后缓冲
+    
+    interval_ms 为 0 时在请求中立即写入（测试环境）
+    """
+    
+    def __init__(self):
+        self.app = None
+        self.interval_ms = 200
+        self.max_events = 100
+        self.max_pending = 10000
+        self._lock = threading.Lock()
+        self._events = []  # game_answers 的行
+        self._wake = threading.Event()
+        self._pid = None
+        self._exit_registered = False
+    
+    def init_app(self, app):
+        self.app = app
+        self.interval_ms = app.config.get('ANSWER_BUFFER_INTERVAL_MS', 200)
+        self.max_events = app.config.get('ANSWER_BUFFER_MAX_EVENTS', 100)
+        self.max_pending = app.config.get('ANSWER_BUFFER_MAX_PENDING', 10000)
+        with self._lock:
+            self._events = []
+    
+    def add(self, session_id, user_id, word_id, correct, score=0, latency_ms=None, immediate=False):
+        """
+        追加一条答题记录
+        
+        Args:
+            immediate (bool): 在调用方的事务中插入这一条（由调用方提交），不经过缓冲区
+        
+        interval_ms 为 0 时在请求中写入这一条，失败时抛出异常且不留在缓冲区，客户端重试不会重复记录
+        """
+        event = {
+            'session_id': session_id,
+            'user_id': int(user_id),
+            'word_id': word_id if isinstance(word_id, int) and not isinstance(word_id, bool) else None,
+            'correct': bool(correct),
+            'score': score,
+            'latency_ms': latency_ms,
+            'ts': datetime.utcnow()
+        }
+        if immediate:
+            self._write([event])
+            return
+        if not self.interval_ms:
+            try:
+                self._write([event])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            return
+        with self._lock:
+            self._events.append(event)
+            self._trim()
+            full = len(self._events) >= self.max_events
+        self.ensure_started()
+        if full:
+            self._wake.set()
+    
+    def pending(self, session_id):
+        """本进程中尚未写入的指定会话的答题记录"""
+        with self._lock:
+            return [event for event in self._events if event['session_id'] == session_id]
+    
+    def flush(self):
+        """
+        把缓冲区写入数据库（在应用上下文中调用）
+        
+        有记录违反完整性约束时逐条写入并丢弃失败的记录；其他错误（数据库不可用等）时记录放回缓冲区，下次重试
+        
+        Returns:
+            int: 写入的记录数
+        """
+        with self._lock:
+            batch, self._events = self._events, []
+        if not batch:
+            return 0
+        try:
+            written = self._write(batch)
+            db.session.commit()
+        except (IntegrityError, DataError):
+            db.session.rollback()
+            return self._write_each(batch)
+        except Exception:
+            db.session.rollback()
+            self._requeue(batch)
+            raise
+        return written
+    
+    def _write_each(self, batch):
+        """逐条写入，丢弃无法写入的记录"""
+        written = 0
+        for i, event in enumerate(batch):
+            try:
+                written += self._write([event])
+                db.session.commit()
+            except (IntegrityError, DataError) as e:
+                db.session.rollback()
+                logger.error('丢弃无法写入的答题记录（会话 %s，用户 %s）: %s', event['session_id'], event['user_id'], e.orig)
+            except Exception:
+                db.session.rollback()
+                self._requeue(batch[i:])
+                raise
+        return written
+    
+    def _requeue(self, batch):
+        """写入失败的记录放回缓冲区开头"""
+        with self._lock:
+            self._events[:0] = batch
+            self._trim()
+    
+    def _trim(self):
+        """缓冲区超过上限时丢弃最早的记录（调用方持有锁）"""
+        overflow = len(self._events) - self.max_pending
+        if overflow > 0:
+            del self._events[:overflow]
+            logger.error('答题缓冲区已满，丢弃最早的 %s 条答题记录', overflow)
+    
+    @staticmethod
+    def _write(batch):
+        """
+        插入一批答题记录（由调用方提交）
+        
+        Returns:
+            int: 插入的记录数
+        """
+        for start in range(0, len(batch), INSERT_BATCH_SIZE):
+            db.session.execute(insert(GameAnswer).values(batch[start:start + INSERT_BATCH_SIZE]))
+        return len(batch)
+    
+    def ensure_started(self):
+        """在当前进程中启动刷新线程（fork 后的进程不继承父进程的线程）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, args=(self._pid,), name='answer-buffer', daemon=True).start()
+            if not self._exit_registered:
+                atexit.register(self._flush_in_context)
+                self._exit_registered = True
+    
+    def _run(self, pid):
+        while self._pid == pid:
+            self._wake.wait(self.interval_ms / 1000)
+            self._wake.clear()
+            self._flush_in_context()
+    
+    def _flush_in_context(self):
+        with self.app.app_context():
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning('写入答题缓冲区失败: %s', e)
+            finally:
+                db.session.remove()
+
+
+answer_buffer = AnswerBuffer()
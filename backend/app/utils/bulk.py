@@ -0,0 +1,434 @@
+"""
+单词和词组的批量操作
+每个操作在一个事务中用集合式 UPDATE / DELETE 完成（重新排序用 CASE 表达式），不逐条加载和序列化记录。
+这些语句不经过 flush 事件，冗余计数、内容版本号、标签关联、n-gram 索引、进程内索引和目录缓存在这里同步。
+强制删除词库或词组时同样用 DELETE 语句删除子记录，不加载 ORM 对象，内存占用与词库大小无关
+"""
+from datetime import datetime
+from sqlalchemy import case, delete, func, select, update
+from app import db
+from app.models.vocabulary import (
+    VocabularyLibrary, WordGroup, VocabularyWord, apply_word_count_deltas, rebuild_vocabulary_counters
+)
+from app.models.job import ImportJob
+from app.models.search import CjkGram, reindex_cjk_grams
+from app.models.tag import library_tags, parse_tags, reindex_tags, word_tags
+from app.utils.catalog_cache import catalog_cache
+from app.utils.fuzzy import fuzzy_indexes
+from app.utils.word_index import word_index
+
+MAX_BULK_IDS = 1000
+DELETE_BATCH_GROUPS = 50  # 强制删除词库时每个事务删除的词组数
+
+
+class BulkOperationError(ValueError):
+    """批量操作参数不合法"""
+
+
+class ActiveJobError(BulkOperationError):
+    """有进行中的导入任务，暂不能删除"""
+
+
+def _boolean(field, value):
+    if not isinstance(value, bool):
+        raise BulkOperationError(f'{field} 应为布尔值')
+    return value
+
+
+def _integer(low=None, high=None):
+    def validate(field, value):
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise BulkOperationError(f'{field} 应为整数')
+        if (low is not None and value < low) or (high is not None and value > high):
+            raise BulkOperationError(f'{field} 超出范围')
+        return value
+    return validate
+
+
+def _text(max_length):
+    def validate(field, value):
+        if value is None:
+            return None
+        if not isinstance(value, str) or len(value.strip()) > max_length:
+            raise BulkOperationError(f'{field} 应为不超过{max_length}个字符的字符串')
+        return value.strip() or None
+    return validate
+
+
+def _tags(field, value):
+    if value is not None and not isinstance(value, (list, str)):
+        raise BulkOperationError(f'{field} 应为列表')
+    return ','.join(parse_tags(value)) or None
+
+
+# 可批量修改的字段 -> 校验函数
+WORD_BULK_FIELDS = {
+    'is_active': _boolean,
+    'difficulty_level': _integer(1, 5),
+    'frequency': _integer(0),
+    'sort_order': _integer(),
+    'part_of_speech': _text(50),
+    'tags': _tags
+}
+
+GROUP_BULK_FIELDS = {
+    'is_active': _boolean,
+    'difficulty_level': _integer(1, 5),
+    'sort_order': _integer()
+}
+
+
+def parse_ids(values):
+    """校验ID列表，去掉重复的ID"""
+    if not isinstance(values, list) or not values:
+        raise BulkOperationError('请提供ID列表')
+    if len(values) > MAX_BULK_IDS:
+        raise BulkOperationError(f'一次最多操作{MAX_BULK_IDS}条记录')
+    if any(isinstance(value, bool) or not isinstance(value, int) for value in values):
+        raise BulkOperationError('ID 应为整数')
+    return list(dict.fromkeys(values))
+
+
+def parse_changes(changes, allowed):
+    """
+    校验要修改的字段
+    
+    Args:
+        changes (dict): {字段: 新值}
+        allowed (dict): WORD_BULK_FIELDS 或 GROUP_BULK_FIELDS
+    """
+    if not isinstance(changes, dict) or not changes:
+        raise BulkOperationError('请提供要修改的字段')
+    unsupported = sorted(set(changes) - set(allowed))
+    if unsupported:
+        raise BulkOperationError(f'不支持批量修改的字段: {", ".join(unsupported)}')
+    return {field: allowed[field](field, value) for field, value in changes.items()}
+
+
+def parse_order(items):
+    """
+    校验排序列表
+    
+    Args:
+        items (list): [{"id": 1, "sort_order": 0}, ...] 或 [[1, 0], ...]
+    
+    Returns:
+        dict: {ID: 排序值}
+    """
+    if not isinstance(items, list) or not items:
+        raise BulkOperationError('请提供排序列表')
+    if len(items) > MAX_BULK_IDS:
+        raise BulkOperationError(f'一次最多操作{MAX_BULK_IDS}条记录')
+    order = {}
+    for item in items:
+        if isinstance(item, dict):
+            item = (item.get('id'), item.get('sort_order'))
+        if not isinstance(item, (list, tuple)) or len(item) != 2:
+            raise BulkOperationError('排序列表的每一项应包含 id 和 sort_order')
+        record_id, sort_order = item
+        if any(isinstance(value, bool) or not isinstance(value, int) for value in (record_id, sort_order)):
+            raise BulkOperationError('id 和 sort_order 应为整数')
+        order[record_id] = sort_order
+    return order
+
+
+def _catalog_keys(group_ids):
+    """受影响的词组及其词库对应的目录缓存键"""
+    library_ids = db.session.execute(
+        select(WordGroup.library_id).where(WordGroup.id.in_(group_ids)).distinct()
+    ).scalars().all()
+    return [('library', library_id) for library_id in library_ids] + [('group', group_id) for group_id in group_ids]
+
+
+def _bump_libraries(library_ids):
+    """递增词库的内容版本号（词组排序等不影响计数的修改）"""
+    db.session.execute(update(VocabularyLibrary).where(VocabularyLibrary.id.in_(library_ids)).values(
+        content_version=VocabularyLibrary.content_version + 1
+    ).execution_options(synchronize_session=False))
+
+
+def _commit(keys):
+    """提交事务，再失效目录缓存"""
+    db.session.commit()
+    if keys:
+        catalog_cache.invalidate(*keys)
+
+
+def update_words(word_ids, changes):
+    """
+    批量修改单词
+    
+    Args:
+        word_ids (list): 单词ID列表
+        changes (dict): parse_changes 校验过的 {字段: 新值}
+    
+    Returns:
+        list: 实际修改的单词ID
+    """
+    rows = db.session.execute(select(VocabularyWord.id, VocabularyWord.group_id, VocabularyWord.is_active).where(
+        VocabularyWord.id.in_(word_ids)
+    )).all()
+    if not rows:
+        return []
+    ids = [row.id for row in rows]
+    
+    # 修改的词组即使计数不变也递增内容版本号
+    deltas = {row.group_id: 0 for row in rows}
+    if 'is_active' in changes:
+        for row in rows:
+            old_active = row.is_active is None or bool(row.is_active)
+            deltas[row.group_id] += int(changes['is_active']) - int(old_active)
+    
+    db.session.execute(update(VocabularyWord).where(VocabularyWord.id.in_(ids)).values(
+        **changes, updated_at=datetime.utcnow()
+    ).execution_options(synchronize_session=False))
+    apply_word_count_deltas(deltas)
+    if 'tags' in changes:
+        reindex_tags(VocabularyWord, ids)
+    _commit(_catalog_keys(list(deltas)))
+    if 'is_active' in changes:
+        word_index.refresh(ids)
+        fuzzy_indexes[VocabularyWord].refresh(ids)
+    return ids
+
+
+def delete_words(word_ids):
+    """
+    批量删除单词，同时删除其标签关联和 n-gram 索引
+    
+    Returns:
+        list: 实际删除的单词ID
+    """
+    rows = db.session.execute(select(VocabularyWord.id, VocabularyWord.group_id, VocabularyWord.is_active).where(
+        VocabularyWord.id.in_(word_ids)
+    )).all()
+    if not rows:
+        return []
+    ids = [row.id for row in rows]
+    
+    deltas = {row.group_id: 0 for row in rows}
+    for row in rows:
+        if row.is_active is None or bool(row.is_active):
+            deltas[row.group_id] -= 1
+    
+    keys = _catalog_keys(list(deltas))
+    db.session.execute(delete(VocabularyWord).where(VocabularyWord.id.in_(ids)).execution_options(
+        synchronize_session=False
+    ))
+    # 记录已删除，按ID重建即清空其标签关联和 n-gram
+    reindex_tags(VocabularyWord, ids)
+    reindex_cjk_grams(VocabularyWord, ids)
+    apply_word_count_deltas(deltas)
+    _commit(keys)
+    
+    word_index.refresh(ids)
+    fuzzy_indexes[VocabularyWord].refresh(ids)
+    return ids
+
+
+def reorder_words(order):
+    """
+    用一条 ``UPDATE ... SET sort_order = CASE id ... END`` 重新排序单词
+    
+    Args:
+        order (dict): parse_order 校验过的 {单词ID: 排序值}
+    
+    Returns:
+        list: 实际修改的单词ID
+    """
+    rows = db.session.execute(select(VocabularyWord.id, VocabularyWord.group_id).where(
+        VocabularyWord.id.in_(list(order))
+    )).all()
+    if not rows:
+        return []
+    ids = [row.id for row in rows]
+    
+    db.session.execute(update(VocabularyWord).where(VocabularyWord.id.in_(ids)).values(
+        sort_order=case({word_id: order[word_id] for word_id in ids}, value=VocabularyWord.id),
+        updated_at=datetime.utcnow()
+    ).execution_options(synchronize_session=False))
+    group_ids = list({row.group_id for row in rows})
+    apply_word_count_deltas(dict.fromkeys(group_ids, 0))
+    _commit(_catalog_keys(group_ids))
+    return ids
+
+
+def update_groups(group_ids, changes):
+    """
+    批量修改词组，启用状态变化时重新统计所属词库的计数
+    
+    Returns:
+        list: 实际修改的词组ID
+    """
+    rows = db.session.execute(select(WordGroup.id, WordGroup.library_id).where(WordGroup.id.in_(group_ids))).all()
+    if not rows:
+        return []
+    ids = [row.id for row in rows]
+    library_ids = list({row.library_id for row in rows})
+    
+    db.session.execute(update(WordGroup).where(WordGroup.id.in_(ids)).values(
+        **changes, content_version=WordGroup.content_version + 1, updated_at=datetime.utcnow()
+    ).execution_options(synchronize_session=False))
+    if 'is_active' in changes:
+        rebuild_vocabulary_counters(library_ids)
+    else:
+        _bump_libraries(library_ids)
+    _commit(_catalog_keys(ids))
+    return ids
+
+
+def delete_groups(group_ids):
+    """
+    批量删除空词组；任一词组下还有单词时不删除任何词组
+    
+    Returns:
+        list: 实际删除的词组ID
+    
+    Raises:
+        BulkOperationError: 有词组下还有单词
+    """
+    rows = db.session.execute(select(WordGroup.id, WordGroup.library_id).where(WordGroup.id.in_(group_ids))).all()
+    if not rows:
+        return []
+    ids = [row.id for row in rows]
+    
+    non_empty = db.session.execute(
+        select(VocabularyWord.group_id).where(VocabularyWord.group_id.in_(ids)).distinct()
+    ).scalars().all()
+    if non_empty:
+        raise BulkOperationError(f'词组 {", ".join(map(str, sorted(non_empty)))} 下还有单词，无法删除')
+    
+    keys = _catalog_keys(ids)
+    db.session.execute(delete(WordGroup).where(WordGroup.id.in_(ids)).execution_options(synchronize_session=False))
+    rebuild_vocabulary_counters(list({row.library_id for row in rows}))
+    _commit(keys)
+    return ids
+
+
+def reorder_groups(order):
+    """
+    用一条 CASE 更新重新排序词组
+    
+    Returns:
+        list: 实际修改的词组ID
+    """
+    rows = db.session.execute(select(WordGroup.id, WordGroup.library_id).where(WordGroup.id.in_(list(order)))).all()
+    if not rows:
+        return []
+    ids = [row.id for row in rows]
+    
+    db.session.execute(update(WordGroup).where(WordGroup.id.in_(ids)).values(
+        sort_order=case({group_id: order[group_id] for group_id in ids}, value=WordGroup.id),
+        content_version=WordGroup.content_version + 1,
+        updated_at=datetime.utcnow()
+    ).execution_options(synchronize_session=False))
+    _bump_libraries(list({row.library_id for row in rows}))
+    _commit(_catalog_keys(ids))
+    return ids
+
+
+def ensure_no_active_jobs(library_id=None, group_id=None):
+    """
+    检查词库或词组没有进行中的导入任务
+    
+    Raises:
+        ActiveJobError: 有进行中的导入任务
+    """
+    query = db.session.query(ImportJob.id).filter(
+        ImportJob.status.in_((ImportJob.STATUS_PENDING, ImportJob.STATUS_RUNNING))
+    )
+    if group_id is not None:
+        query = query.filter(ImportJob.group_id == group_id)
+    else:
+        query = query.filter(ImportJob.library_id == library_id)
+    if query.first() is not None:
+        raise ActiveJobError('有进行中的导入任务，请等待任务结束后再删除')
+
+
+def _subtract_groups(library_id, group_ids):
+    """从词库计数中减去即将删除的启用词组及其单词"""
+    groups_count, words_count = db.session.execute(
+        select(func.count(WordGroup.id), func.coalesce(func.sum(WordGroup.words_count), 0)).where(
+            WordGroup.id.in_(group_ids), WordGroup.is_active == True
+        )
+    ).one()
+    db.session.execute(update(VocabularyLibrary).where(VocabularyLibrary.id == library_id).values(
+        groups_count=VocabularyLibrary.groups_count - groups_count,
+        words_count=VocabularyLibrary.words_count - words_count,
+        content_version=VocabularyLibrary.content_version + 1
+    ).execution_options(synchronize_session=False))
+
+
+def _delete_group_rows(group_ids):
+    """删除词组及其全部单词、单词的标签关联和 n-gram 索引、导入任务记录（不提交）"""
+    word_ids = select(VocabularyWord.id).where(VocabularyWord.group_id.in_(group_ids))
+    db.session.execute(delete(word_tags).where(word_tags.c.record_id.in_(word_ids)))
+    db.session.execute(delete(CjkGram).where(
+        CjkGram.source == VocabularyWord.__tablename__, CjkGram.record_id.in_(word_ids)
+    ).execution_options(synchronize_session=False))
+    for stmt in (delete(VocabularyWord).where(VocabularyWord.group_id.in_(group_ids)),
+                 delete(ImportJob).where(ImportJob.group_id.in_(group_ids)),
+                 delete(WordGroup).where(WordGroup.id.in_(group_ids))):
+        db.session.execute(stmt.execution_options(synchronize_session=False))
+
+
+def _invalidate_word_indexes():
+    """进程内单词索引按需重建（删除的单词数量不定，不逐个移除）"""
+    word_index.invalidate()
+    fuzzy_indexes[VocabularyWord].invalidate()
+
+
+def force_delete_group(group_id):
+    """
+    删除词组及其全部单词，更新所属词库的计数
+    
+    Raises:
+        LookupError: 词组不存在
+        ActiveJobError: 有进行中的导入任务
+    """
+    library_id = db.session.execute(select(WordGroup.library_id).where(WordGroup.id == group_id)).scalar()
+    if library_id is None:
+        raise LookupError('词组不存在')
+    ensure_no_active_jobs(group_id=group_id)
+    
+    _subtract_groups(library_id, [group_id])
+    _delete_group_rows([group_id])
+    db.session.commit()
+    db.session.expire_all()
+    catalog_cache.invalidate(('library', library_id), ('group', group_id))
+    _invalidate_word_indexes()
+
+
+def force_delete_library(library_id, batch_size=DELETE_BATCH_GROUPS):
+    """
+    删除词库及其全部词组和单词
+    
+    每批词组在一个事务中删除并提交，中途失败时已删除的部分保持一致，重新执行即可继续
+    
+    Raises:
+        LookupError: 词库不存在
+        ActiveJobError: 有进行中的导入任务
+    """
+    if db.session.execute(select(VocabularyLibrary.id).where(VocabularyLibrary.id == library_id)).first() is None:
+        raise LookupError('词库不存在')
+    ensure_no_active_jobs(library_id=library_id)
+    
+    while True:
+        group_ids = db.session.execute(select(WordGroup.id).where(
+            WordGroup.library_id == library_id
+        ).order_by(WordGroup.id).limit(batch_size)).scalars().all()
+        if not group_ids:
+            break
+        _subtract_groups(library_id, group_ids)
+        _delete_group_rows(group_ids)
+        db.session.commit()
+        catalog_cache.invalidate(*[('group', group_id) for group_id in group_ids])
+    
+    db.session.execute(delete(library_tags).where(library_tags.c.record_id == library_id))
+    for stmt in (delete(ImportJob).where(ImportJob.library_id == library_id),
+                 delete(VocabularyLibrary).where(VocabularyLibrary.id == library_id)):
+        db.session.execute(stmt.execution_options(synchronize_session=False))
+    db.session.commit()
+    db.session.expire_all()
+    catalog_cache.invalidate(('library', library_id))
+    _invalidate_word_indexes()
@@ -0,0 +1,627 @@
+"""
+缓存
+- LRUCache: 进程内缓存，按字节数限制容量，支持过期时间和命中率统计
+- RedisBackend: 多个工作进程共享的 Redis 缓存（redis-py）
+- Cache: 按命名空间使用的缓存，进程内缓存 + 可选的共享缓存，
+  失效时通过发布订阅通知所有工作进程删除各自的进程内副本
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_size(value):
+    """
+    估算对象占用的内存字节数（递归统计 dict/list/tuple/set 中的元素）
+    
+    Args:
+        value: 缓存的值，一般为 JSON 风格的数据
+    """
+    seen = set()
+    stack = [value]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+    return total
+
+
+class LRUCache:
+    """
+    线程安全的 LRU 缓存
+    
+    容量按估算的字节数限制，超出时淘汰最久未使用的条目；条目超过 ttl 秒后视为未命中。
+    未命中时的加载用 begin_load / finish_load 包围：加载期间该键被删除或缓存被清空时，
+    加载到的可能是失效前的数据，不写入缓存
+    """
+    
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=300):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._version = 0  # 每次删除或清空时递增
+        self._cleared_version = 0
+        self._deleted_versions = {}  # 键 -> 删除时的版本号，只在有加载进行中时记录
+        self._loads = 0
+    
+    def configure(self, max_bytes=None, ttl=None):
+        """修改容量和过期时间，并清空缓存"""
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if ttl is not None:
+                self.ttl = ttl
+            self._clear()
+            self._mark_cleared()
+    
+    def get(self, key, default=None):
+        """读取缓存，未命中或已过期时返回 default"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._pop(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value, ttl=None):
+        """
+        写入缓存
+        
+        Args:
+            key: 缓存键（需可哈希）
+            value: 缓存值，调用方不应再修改
+            ttl (int): 过期秒数，为空时使用默认值，0 表示不过期
+        
+        Returns:
+            bool: 是否写入（单个值超过容量上限时不缓存）
+        """
+        size = estimate_size(value)
+        with self._lock:
+            return self._store(key, value, size, ttl)
+    
+    def begin_load(self):
+        """
+        开始加载未命中的键，之后必须调用 finish_load
+        
+        Returns:
+            int: 当前版本号，传给 finish_load
+        """
+        with self._lock:
+            self._loads += 1
+            return self._version
+    
+    def finish_load(self, key, value, since, ttl=None):
+        """
+        结束加载：自 begin_load 以来该键没有被删除、缓存没有被清空时写入 value（value 为 None 时不写入）
+        
+        Args:
+            since (int): begin_load 返回的版本号
+        
+        Returns:
+            bool: 加载的值是否仍然有效（未被删除或清空）
+        """
+        size = estimate_size(value) if value is not None else 0
+        with self._lock:
+            self._loads -= 1
+            fresh = self._cleared_version <= since and self._deleted_versions.get(key, since) <= since
+            if not self._loads:
+                self._deleted_versions.clear()
+            if fresh and value is not None:
+                self._store(key, value, size, ttl)
+            return fresh
+    
+    def get_or_set(self, key, loader, ttl=None):
+        """读取缓存，未命中时调用 loader 加载并写入（loader 返回 None 或加载期间该键失效时不缓存）"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            since = self.begin_load()
+            value = None
+            try:
+                value = loader()
+            finally:
+                self.finish_load(key, value, since, ttl)
+        return value
+    
+    def delete(self, key):
+        """删除一个条目（进行中的加载不会再写入该键）"""
+        with self._lock:
+            self._version += 1
+            if self._loads:
+                self._deleted_versions[key] = self._version
+            return self._pop(key)
+    
+    def delete_where(self, predicate):
+        """
+        删除满足条件的条目
+        
+        Args:
+            predicate (callable): 接收 (key, value)，返回 True 时删除
+        
+        Returns:
+            int: 删除的条目数
+        """
+        with self._lock:
+            keys = [key for key, (value, _, _) in self._entries.items() if predicate(key, value)]
+            self._version += 1
+            for key in keys:
+                if self._loads:
+                    self._deleted_versions[key] = self._version
+                self._pop(key)
+            return len(keys)
+    
+    def clear(self):
+        """清空缓存（不重置统计；进行中的加载都不会再写入）"""
+        with self._lock:
+            self._clear()
+            self._mark_cleared()
+    
+    def stats(self):
+        """命中率等统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+    
+    def _store(self, key, value, size, ttl):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._pop(key)
+        if size > self.max_bytes:
+            return False
+        self._entries[key] = (value, size, expires_at)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+            self.evictions += 1
+        return True
+    
+    def _mark_cleared(self):
+        self._version += 1
+        self._cleared_version = self._version
+    
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._bytes -= entry[1]
+        return True
+    
+    def _clear(self):
+        self._entries.clear()
+        self._bytes = 0
+    
+    def __len__(self):
+        return len(self._entries)
+
+
+class CacheError(Exception):
+    """共享缓存不可用或返回错误"""
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f'无法序列化的类型: {type(value).__name__}')
+
+
+def redis_client(url, timeout=0.5):
+    """
+    创建 Redis 客户端（redis-py，连接池线程安全，fork 后的进程自动使用新连接）
+    
+    Args:
+        url (str): 如 redis://:password@localhost:6379/0
+        timeout (float): 连接和读写的超时秒数，超时后调用方降级为直接查询数据库
+    """
+    return redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout, protocol=2)
+
+
+@contextmanager
+def redis_errors():
+    """把 redis-py 的异常转换为 CacheError"""
+    try:
+        yield
+    except redis.RedisError as e:
+        raise CacheError(str(e)) from e
+
+
+class RedisBackend:
+    """
+    Redis 共享缓存，值以 JSON 存储
+    
+    删除键或前缀时递增对应的失效代数；加载得到的值连同加载前读到的代数一起写入，
+    读取时代数已变化的值视为未命中，加载期间发生的失效不会被旧数据覆盖
+    """
+    
+    GENERATION_PREFIX = 'generation@'
+    GENERATION_TTL = 86400  # 代数键的过期秒数，过期后代数归零，按代数写入的旧值随之失效
+    
+    def __init__(self, client):
+        self.client = client
+    
+    @classmethod
+    def generation_key(cls, key):
+        """代数键（不在任何命名空间的前缀下，清空命名空间时不会被删除）"""
+        return f'{cls.GENERATION_PREFIX}{key}'
+    
+    def get(self, key, scope=None):
+        """
+        读取缓存
+        
+        Args:
+            key (str): 完整的缓存键
+            scope (str): 键所在命名空间的前缀，其代数同样参与判断
+        
+        Returns:
+            tuple: (值，未命中时为 None, 当前代数)，代数传给 set 的 generation
+        """
+        with redis_errors():
+            pipe = self.client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.get(self.generation_key(key))
+            if scope is not None:
+                pipe.get(self.generation_key(scope))
+            raw, *generations = pipe.execute()
+        generation = [int(value or 0) for value in generations]
+        if raw is None:
+            return None, generation
+        entry = json.loads(raw)
+        if not isinstance(entry, dict) or 'value' not in entry:
+            return None, generation
+        if entry.get('generation') is not None and entry['generation'] != generation:
+            return None, generation
+        return entry['value'], generation
+    
+    def set(self, key, value, ttl=None, generation=None):
+        """
+        写入缓存
+        
+        Args:
+            generation (list): 加载前 get 返回的代数；为空时不检查代数（调用方确认值是最新的）
+        """
+        raw = json.dumps({'generation': generation, 'value': value}, ensure_ascii=False, default=_json_default)
+        with redis_errors():
+            self.client.set(key, raw, ex=int(ttl) if ttl else None)
+    
+    def _bump(self, pipe, key):
+        generation_key = self.generation_key(key)
+        pipe.incr(generation_key)
+        pipe.expire(generation_key, self.GENERATION_TTL)
+    
+    def delete(self, *keys):
+        if keys:
+            with redis_errors():
+                pipe = self.client.pipeline(transaction=False)
+                pipe.delete(*keys)
+                for key in keys:
+                    self._bump(pipe, key)
+                pipe.execute()
+    
+    def delete_prefix(self, prefix):
+        """删除指定前缀的全部键"""
+        with redis_errors():
+            pipe = self.client.pipeline(transaction=False)
+            self._bump(pipe, prefix)
+            pipe.execute()
+            keys = []
+            for key in self.client.scan_iter(match=prefix + '*', count=500):
+                keys.append(key)
+                if len(keys) >= 500:
+                    self.client.delete(*keys)
+                    keys = []
+            if keys:
+                self.client.delete(*keys)
+
+
+class InvalidationBus:
+    """
+    缓存失效广播
+    
+    通过 Redis PUBLISH/SUBSCRIBE 通知其他工作进程删除各自的进程内副本。
+    订阅线程在每个进程首次使用时启动（gunicorn preload 后 fork 出的进程不会继承父进程的线程），
+    断线重连后（再次收到订阅确认）清空进程内缓存，避免漏掉断线期间的失效消息
+    """
+    
+    READY_TIMEOUT = 2  # 首次使用时等待订阅完成的秒数
+    
+    def __init__(self, client, channel):
+        self.client = client
+        self.channel = channel
+        self.origin = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._ready = threading.Event()
+    
+    def add_listener(self, callback):
+        """注册失效回调，参数为完整键列表，None 表示清空"""
+        self._listeners.append(callback)
+    
+    def ensure_started(self):
+        """在当前进程中启动订阅线程"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.origin = f'{uuid.uuid4().hex}-{self._pid}'
+            self._ready = threading.Event()
+            threading.Thread(target=self._run, args=(self._pid,), name='cache-invalidation', daemon=True).start()
+        self._ready.wait(self.READY_TIMEOUT)
+    
+    def publish(self, keys):
+        """广播需要删除的键（None 表示清空）"""
+        self.ensure_started()
+        message = json.dumps({'origin': self.origin, 'keys': keys}, ensure_ascii=False)
+        with redis_errors():
+            self.client.publish(self.channel, message)
+    
+    def _run(self, pid):
+        subscribed_before = False
+        while self._pid == pid:
+            pubsub = self.client.pubsub()
+            try:
+                pubsub.subscribe(self.channel)
+                while self._pid == pid:
+                    # 按间隔轮询，进程 fork 后旧线程能及时退出
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    if message['type'] == 'subscribe':
+                        # redis-py 断线后自动重连并重新订阅，断线期间的消息已丢失
+                        if subscribed_before:
+                            self._dispatch(None)
+                        subscribed_before = True
+                        self._ready.set()
+                    elif message['type'] == 'message':
+                        self._handle(message['data'])
+            except Exception as e:
+                logger.warning('缓存失效订阅中断: %s', e)
+                self._ready.set()
+                time.sleep(1)
+            finally:
+                pubsub.close()
+    
+    def _handle(self, raw):
+        try:
+            payload = json.loads(raw)
+        except ValueError:
+            return
+        if payload.get('origin') != self.origin:
+            self._dispatch(payload.get('keys'))
+    
+    def _dispatch(self, keys):
+        for callback in self._listeners:
+            callback(keys)
+
+
+_MISSING = object()
+
+# 命名空间 -> Cache
+caches = {}
+
+# 订阅失效广播的其他进程内数据（如单词前缀索引），需实现 configure(bus=...)
+bus_subscribers = []
+
+
+class Cache:
+    """
+    按命名空间使用的缓存
+    
+    读取顺序：进程内 LRU → 共享缓存（配置了 CACHE_REDIS_URL 时）→ 调用方的 loader；
+    失效时同时删除两级缓存，并广播给其他工作进程删除它们的进程内副本。
+    共享缓存不可用时只记录错误，按未命中处理
+    """
+    
+    def __init__(self, namespace, max_bytes=32 * 1024 * 1024, ttl=300):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = LRUCache(max_bytes, ttl)
+        self.remote = None
+        self.bus = None
+        self.prefix = f'{namespace}:'
+        self.remote_hits = 0
+        self.remote_misses = 0
+        self.remote_errors = 0
+        caches[namespace] = self
+    
+    def configure(self, max_bytes=None, ttl=None, remote=None, bus=None, key_prefix=''):
+        """设置容量、过期时间和共享缓存，并清空进程内缓存"""
+        if ttl is not None:
+            self.ttl = ttl
+        self.local.configure(max_bytes=max_bytes, ttl=ttl)
+        self.remote = remote
+        self.bus = bus
+        self.prefix = f'{key_prefix}{self.namespace}:'
+        if bus is not None:
+            bus.add_listener(self._on_invalidate)
+    
+    def make_key(self, key):
+        """生成完整的缓存键，元组各部分用冒号连接"""
+        if isinstance(key, tuple):
+            key = ':'.join(str(part) for part in key)
+        return f'{self.prefix}{key}'
+    
+    def get(self, key, default=None):
+        value, _ = self._lookup(self.make_key(key))
+        return default if value is _MISSING else value
+    
+    def _lookup(self, full_key):
+        """
+        依次读取进程内缓存和共享缓存
+        
+        Returns:
+            tuple: (值，未命中时为 _MISSING, 共享缓存的代数，未读取或读取失败时为 None)
+        """
+        if self.bus is not None:
+            # 进程内副本依赖失效广播，读取前确保本进程已订阅
+            self.bus.ensure_started()
+        value = self.local.get(full_key, _MISSING)
+        if value is not _MISSING or self.remote is None:
+            return value, None
+        
+        # 共享缓存的值复制到进程内时同样不能覆盖读取期间收到的失效
+        since = self.local.begin_load()
+        value, generation = None, None
+        try:
+            value, generation = self.remote.get(full_key, self.prefix)
+        except CacheError as e:
+            self._remote_failed('读取', e)
+        finally:
+            self.local.finish_load(full_key, value, since)
+        if value is None:
+            if generation is not None:
+                self.remote_misses += 1
+            return _MISSING, generation
+        self.remote_hits += 1
+        return value, generation
+    
+    def set(self, key, value, ttl=None):
+        full_key = self.make_key(key)
+        self.local.set(full_key, value, ttl)
+        if self.remote is not None:
+            try:
+                self.remote.set(full_key, value, self.ttl if ttl is None else ttl)
+            except CacheError as e:
+                self._remote_failed('写入', e)
+    
+    def get_or_set(self, key, loader, ttl=None):
+        """
+        读取缓存，未命中时调用 loader 加载并写入（loader 返回 None 时不缓存）
+        
+        加载期间本进程收到该键的失效时不写入；写入共享缓存的值带有加载前的代数，
+        其他进程在写入之前失效该键时，这个值在读取时视为未命中
+        """
+        full_key = self.make_key(key)
+        value, generation = self._lookup(full_key)
+        if value is not _MISSING:
+            return value
+        since = self.local.begin_load()
+        value, fresh = None, False
+        try:
+            value = loader()
+        finally:
+            fresh = self.local.finish_load(full_key, value, since, ttl)
+        if fresh and value is not None and generation is not None:
+            try:
+                self.remote.set(full_key, value, self.ttl if ttl is None else ttl, generation)
+            except CacheError as e:
+                self._remote_failed('写入', e)
+        return value
+    
+    def invalidate(self, *keys):
+        """删除指定键（所有工作进程）"""
+        full_keys = [self.make_key(key) for key in keys]
+        if not full_keys:
+            return
+        for full_key in full_keys:
+            self.local.delete(full_key)
+        self._broadcast(full_keys, lambda: self.remote.delete(*full_keys))
+    
+    def clear(self):
+        """清空本命名空间的缓存（所有工作进程）"""
+        self.local.clear()
+        self._broadcast(None, lambda: self.remote.delete_prefix(self.prefix))
+    
+    def stats(self):
+        """进程内缓存的命中、淘汰统计及共享缓存的命中统计"""
+        return {
+            **self.local.stats(),
+            'namespace': self.namespace,
+            'shared': self.remote is not None,
+            'remote_hits': self.remote_hits,
+            'remote_misses': self.remote_misses,
+            'remote_errors': self.remote_errors
+        }
+    
+    def _broadcast(self, full_keys, delete_remote):
+        if self.remote is not None:
+            try:
+                delete_remote()
+            except CacheError as e:
+                self._remote_failed('删除', e)
+        if self.bus is not None:
+            try:
+                self.bus.publish(full_keys)
+            except CacheError as e:
+                self._remote_failed('广播', e)
+    
+    def _on_invalidate(self, full_keys):
+        if full_keys is None:
+            self.local.clear()
+            return
+        for full_key in full_keys:
+            if full_key.startswith(self.prefix):
+                self.local.delete(full_key)
+    
+    def _remote_failed(self, action, error):
+        self.remote_errors += 1
+        logger.warning('共享缓存%s失败（%s）: %s', action, self.namespace, error)
+
+
+def init_app(app):
+    """
+    按应用配置初始化所有命名空间的缓存，并把失效广播交给 bus_subscribers
+    
+    配置项：CACHE_REDIS_URL（为空时只使用进程内缓存）、CACHE_KEY_PREFIX、
+    <命名空间>_CACHE_MAX_BYTES、<命名空间>_CACHE_TTL
+    """
+    redis_url = app.config.get('CACHE_REDIS_URL')
+    key_prefix = app.config.get('CACHE_KEY_PREFIX', '')
+    client = redis_client(redis_url) if redis_url else None
+    bus = InvalidationBus(client, f'{key_prefix}invalidate') if client else None
+    for namespace, cache in caches.items():
+        name = namespace.upper()
+        cache.configure(
+            max_bytes=app.config.get(f'{name}_CACHE_MAX_BYTES'),
+            ttl=app.config.get(f'{name}_CACHE_TTL'),
+            remote=RedisBackend(client) if client else None,
+            bus=bus,
+            key_prefix=key_prefix
+        )
+    for subscriber in bus_subscribers:
+        subscriber.configure(bus=bus)
@@ -0,0 +1,134 @@
+"""
+词库目录缓存
+缓存词库、词组的元数据和词组的游戏单词列表，相关写入提交后在所有工作进程中失效
+"""
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import load_only
+from app import db
+from app.models.vocabulary import VocabularyLibrary, WordGroup, VocabularyWord
+from app.utils.cache import Cache
+from app.utils.http_cache import latest
+
+PENDING_KEY = 'catalog_cache_changes'
+
+catalog_cache = Cache('catalog', max_bytes=32 * 1024 * 1024, ttl=300)
+
+
+def _with_datetime(entry):
+    """缓存中的修改时间以 ISO 字符串保存，读取时转换为 datetime（返回副本，不修改缓存）"""
+    if entry is None or entry['updated_at'] is None:
+        return entry
+    return dict(entry, updated_at=datetime.fromisoformat(entry['updated_at']))
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def get_library_data(library_id):
+    """
+    获取词库元数据
+    
+    Returns:
+        dict: {'version': 内容版本号, 'updated_at': 修改时间, 'data': 词库字典}，词库不存在时返回 None
+    """
+    def load():
+        library = db.session.get(VocabularyLibrary, library_id)
+        if library is None:
+            return None
+        return {
+            'version': library.content_version,
+            'updated_at': _isoformat(library.updated_at),
+            'data': library.to_dict()
+        }
+    return _with_datetime(catalog_cache.get_or_set(('library', library_id), load))
+
+
+def get_group_data(group_id):
+    """
+    获取词组元数据
+    
+    词组数据中包含词库名称，缓存时记录词库的内容版本号，与当前词库版本不一致时重新加载
+    
+    Returns:
+        dict: {'version', 'library_id', 'library_version', 'updated_at', 'data'}，词组不存在时返回 None
+    """
+    def load():
+        group = db.session.get(WordGroup, group_id)
+        if group is None:
+            return None
+        return {
+            'version': group.content_version,
+            'library_id': group.library_id,
+            'library_version': group.library.content_version,
+            'updated_at': _isoformat(latest(group.updated_at, group.library.updated_at)),
+            'data': group.to_dict()
+        }
+    
+    entry = catalog_cache.get_or_set(('group', group_id), load)
+    if entry is not None:
+        library = get_library_data(entry['library_id'])
+        if library is None or library['version'] != entry['library_version']:
+            entry = load()
+            if entry is not None:
+                catalog_cache.set(('group', group_id), entry)
+    return _with_datetime(entry)
+
+
+def get_group_words(group_id, version):
+    """
+    获取词组的游戏单词列表
+    
+    Args:
+        group_id (int): 词组ID
+        version (int): 词组的内容版本号，作为缓存键的一部分
+    
+    Returns:
+        list: 单词字典（调用方不应修改）
+    """
+    def load():
+        # 只读取游戏用到的列，跳过备注、标签等字段
+        words = VocabularyWord.query.options(load_only(
+            VocabularyWord.word, VocabularyWord.translation, VocabularyWord.pronunciation,
+            VocabularyWord.difficulty_level, VocabularyWord.phonetic, VocabularyWord.part_of_speech,
+            VocabularyWord.example_sentence, VocabularyWord.example_translation
+        )).filter_by(group_id=group_id).order_by(VocabularyWord.id).all()
+        return [word.to_game_dict() for word in words]
+    return catalog_cache.get_or_set(('group_words', group_id, version), load)
+
+
+def invalidate_catalog():
+    """清空目录缓存（批量 SQL 修改数据后调用）"""
+    catalog_cache.clear()
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_catalog_changes(session, flush_context):
+    """
+    记录被修改或删除的词库和词组，提交后再失效缓存
+    
+    子记录写入时 flush 前已递增了词库和词组的内容版本号，它们同样出现在 dirty 中
+    """
+    keys = set()
+    for obj in session.dirty | session.deleted:
+        if isinstance(obj, VocabularyLibrary):
+            keys.add(('library', obj.id))
+        elif isinstance(obj, WordGroup):
+            keys.add(('group', obj.id))
+    if keys:
+        session.info.setdefault(PENDING_KEY, set()).update(keys)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_catalog_changes(session):
+    """事务提交后失效相关缓存（单词列表以内容版本号为键，旧版本随 LRU 淘汰）"""
+    keys = session.info.pop(PENDING_KEY, None)
+    if keys:
+        catalog_cache.invalidate(*keys)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_catalog_changes(session):
+    """事务回滚时丢弃未提交的变更"""
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,108 @@
+"""
+词库复制
+在数据库内用 INSERT ... SELECT 复制词组、单词、单词的标签关联和 n-gram 索引，数据不经过应用进程；
+词组按ID顺序插入，新旧词组ID按顺序一一对应，单词按 (词组, 单词) 唯一索引对应
+"""
+from sqlalchemy import case, insert, literal, select
+from sqlalchemy.orm import aliased
+from app import db
+from app.models.vocabulary import VocabularyLibrary, WordGroup, VocabularyWord
+from app.models.search import CjkGram
+from app.models.tag import word_tags
+from app.utils.fuzzy import fuzzy_indexes
+from app.utils.word_index import word_index
+
+# 不复制的列（新记录重新生成）
+SKIPPED_COLUMNS = ('id', 'created_at', 'updated_at')
+
+
+def clone_name(name):
+    """生成不重复的副本名称：xxx（副本）、xxx（副本2）……"""
+    candidate = f'{name}（副本）'
+    number = 1
+    while db.session.query(VocabularyLibrary.id).filter_by(name=candidate).first() is not None:
+        number += 1
+        candidate = f'{name}（副本{number}）'
+    return candidate
+
+
+def _copied_columns(model, *excluded):
+    return [column.name for column in model.__table__.c if column.name not in SKIPPED_COLUMNS + excluded]
+
+
+def clone_library(library_id, name=None):
+    """
+    复制词库及其全部词组和单词
+    
+    Args:
+        library_id (int): 源词库ID
+        name (str): 新词库名称，为空时自动生成
+    
+    Returns:
+        VocabularyLibrary: 新词库
+    """
+    source = db.session.get(VocabularyLibrary, library_id)
+    if source is None:
+        raise LookupError('词库不存在')
+    
+    library = VocabularyLibrary(
+        name=name or clone_name(source.name),
+        description=source.description,
+        tags=source.tags,
+        difficulty_level=source.difficulty_level,
+        is_active=source.is_active,
+        sort_order=source.sort_order,
+        groups_count=source.groups_count,
+        words_count=source.words_count
+    )
+    db.session.add(library)
+    db.session.flush()
+    
+    # 词组：按源词组ID顺序插入，自增ID保持同样的顺序
+    group_columns = _copied_columns(WordGroup, 'library_id', 'content_version')
+    db.session.execute(insert(WordGroup).from_select(
+        group_columns + ['library_id'],
+        select(*[WordGroup.__table__.c[column] for column in group_columns], literal(library.id))
+        .where(WordGroup.library_id == library_id).order_by(WordGroup.id)
+    ))
+    old_group_ids = db.session.execute(
+        select(WordGroup.id).where(WordGroup.library_id == library_id).order_by(WordGroup.id)
+    ).scalars().all()
+    new_group_ids = db.session.execute(
+        select(WordGroup.id).where(WordGroup.library_id == library.id).order_by(WordGroup.id)
+    ).scalars().all()
+    if not old_group_ids:
+        db.session.commit()
+        return library
+    group_map = case(dict(zip(old_group_ids, new_group_ids)), value=VocabularyWord.group_id)
+    
+    # 单词：一条语句复制全部词组的单词
+    word_columns = _copied_columns(VocabularyWord, 'group_id')
+    db.session.execute(insert(VocabularyWord).from_select(
+        word_columns + ['group_id'],
+        select(*[VocabularyWord.__table__.c[column] for column in word_columns], group_map)
+        .where(VocabularyWord.group_id.in_(old_group_ids)).order_by(VocabularyWord.id)
+    ))
+    
+    # 源单词 -> 新单词
+    cloned = aliased(VocabularyWord, name='cloned')
+    word_pairs = select(VocabularyWord.id.label('old_id'), cloned.id.label('new_id')).join(
+        cloned, (cloned.group_id == group_map) & (cloned.word == VocabularyWord.word)
+    ).where(VocabularyWord.group_id.in_(old_group_ids)).subquery()
+    
+    db.session.execute(insert(word_tags).from_select(
+        ['record_id', 'tag_id'],
+        select(word_pairs.c.new_id, word_tags.c.tag_id).join(word_pairs, word_pairs.c.old_id == word_tags.c.record_id)
+    ))
+    db.session.execute(insert(CjkGram).from_select(
+        ['source', 'record_id', 'gram'],
+        select(CjkGram.source, word_pairs.c.new_id, CjkGram.gram).join(
+            word_pairs, word_pairs.c.old_id == CjkGram.record_id
+        ).where(CjkGram.source == VocabularyWord.__tablename__)
+    ))
+    db.session.commit()
+    
+    # 进程内索引按需重建，比逐个插入上万个单词快
+    word_index.invalidate()
+    fuzzy_indexes[VocabularyWord].invalidate()
+    return library
@@ -0,0 +1,106 @@
+"""
+词库导出
+按批读取单词（yield_per，MySQL 使用服务端游标），逐批生成 NDJSON 或 CSV 内容，
+内存占用与词库大小无关
+"""
+import csv
+import io
+import json
+import zlib
+from sqlalchemy import select
+from app import db
+from app.models.vocabulary import WordGroup, VocabularyWord
+from app.models.tag import parse_tags
+
+# 导出格式 -> MIME 类型
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+# 导出的字段（group 为词组名称，导入时按名称找到或创建词组）
+EXPORT_FIELDS = (
+    'group', 'word', 'translation', 'pronunciation', 'phonetic', 'part_of_speech',
+    'difficulty_level', 'frequency', 'example_sentence', 'example_translation',
+    'notes', 'tags', 'is_active', 'sort_order'
+)
+
+
+def iter_library_rows(library_id, batch_size=1000):
+    """
+    按批读取词库的全部单词
+    
+    Args:
+        library_id (int): 词库ID
+        batch_size (int): 每批行数
+    
+    Yields:
+        list: 一批行，每行按 EXPORT_FIELDS 的顺序
+    """
+    columns = [WordGroup.name] + [getattr(VocabularyWord, field) for field in EXPORT_FIELDS[1:]]
+    stmt = select(*columns).join(
+        WordGroup, WordGroup.id == VocabularyWord.group_id
+    ).where(WordGroup.library_id == library_id).order_by(
+        WordGroup.sort_order, WordGroup.id, VocabularyWord.sort_order, VocabularyWord.id
+    ).execution_options(yield_per=batch_size)
+    
+    result = db.session.execute(stmt)
+    try:
+        for rows in result.partitions():
+            yield rows
+    finally:
+        result.close()
+
+
+def ndjson_chunks(batches):
+    """每行一个 JSON 对象"""
+    for rows in batches:
+        lines = []
+        for row in rows:
+            item = dict(zip(EXPORT_FIELDS, row))
+            item['tags'] = parse_tags(item['tags'])
+            lines.append(json.dumps(item, ensure_ascii=False) + '\n')
+        yield ''.join(lines).encode('utf-8')
+
+
+def csv_chunks(batches):
+    """首行为表头；带 BOM 以便 Excel 正确识别中文"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_FIELDS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    """逐块 gzip 压缩"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_library(library_id, export_format, compress=False, batch_size=1000):
+    """
+    生成词库导出内容
+    
+    Args:
+        library_id (int): 词库ID
+        export_format (str): ndjson 或 csv
+        compress (bool): 是否 gzip 压缩
+        batch_size (int): 每批读取的行数
+    
+    Returns:
+        generator: bytes 块
+    """
+    encode = ndjson_chunks if export_format == 'ndjson' else csv_chunks
+    chunks = encode(iter_library_rows(library_id, batch_size))
+    return gzip_chunks(chunks) if compress else chunks
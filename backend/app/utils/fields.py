@@ -0,0 +1,69 @@
+"""
+稀疏字段集（fields 查询参数）
+按请求的字段同时裁剪查询的列和序列化结果，不需要的 Text 列不会从数据库读取
+"""
+from flask import request
+from sqlalchemy.orm import load_only
+
+
+class InvalidFieldsError(ValueError):
+    """fields 参数包含未知字段"""
+
+
+def parse_fields(allowed, value=None):
+    """
+    解析逗号分隔的 fields 参数
+    
+    Args:
+        allowed: 允许的字段名（有序，决定输出顺序）
+        value (str): 参数值，为空时读取当前请求的 fields 参数
+    
+    Returns:
+        list: 字段列表（总是包含 id），未指定 fields 时返回 None 表示全部字段
+    """
+    if value is None:
+        value = request.args.get('fields', '')
+    requested = {field.strip() for field in value.split(',') if field.strip()}
+    if not requested:
+        return None
+    unknown = sorted(requested.difference(allowed))
+    if unknown:
+        raise InvalidFieldsError(f'未知字段: {", ".join(unknown)}')
+    requested.add('id')
+    return [field for field in allowed if field in requested]
+
+
+def load_fields(query, model, fields, extra=()):
+    """
+    只查询字段依赖的列
+    
+    Args:
+        query: 原始查询
+        model: 定义了 FIELD_COLUMNS（字段 -> 依赖的列名）的模型
+        fields (list): parse_fields 的结果，为 None 时不裁剪
+        extra: 额外需要加载的列名，如游标分页的排序列
+    """
+    if fields is None:
+        return query
+    columns = {column for field in fields for column in model.FIELD_COLUMNS[field]}
+    columns.update(extra)
+    return query.options(load_only(*[getattr(model, column) for column in sorted(columns)]))
+
+
+def serialize(obj, fields, computed):
+    """
+    按字段顺序生成字典，只访问需要的属性
+    
+    Args:
+        obj: 模型实例
+        fields: 字段列表
+        computed (dict): 不能直接读取同名属性的字段 -> 取值函数
+    """
+    return {field: computed[field]() if field in computed else getattr(obj, field) for field in fields}
+
+
+def select_fields(data, fields):
+    """从已序列化的字典中挑选字段（用于缓存或 JSON 中保存的数据）"""
+    if fields is None:
+        return data
+    return {field: data[field] for field in fields if field in data}
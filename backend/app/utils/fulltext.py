@@ -0,0 +1,150 @@
+"""
+全文检索工具
+SQLite 使用 FTS5 外部内容表（trigram 分词，触发器同步），MySQL 使用 FULLTEXT 索引（ngram 分词）。
+两种数据库都把整个检索词当作短语做子串匹配（不区分大小写），结果与原来的 LIKE '%检索词%' 一致；
+trigram 分词无法匹配不足 3 个字符的检索词，这类检索仍由 LIKE 处理
+"""
+import re
+from sqlalchemy import DDL, column, event, or_, select, table, text
+from sqlalchemy.dialects import mysql
+
+# 中日韩字符，FTS5 默认分词器无法切分，交给其他检索路径处理
+CJK_PATTERN = re.compile(r'[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]')
+MIN_FULLTEXT_LENGTH = 3
+
+# 表名 -> 建立全文索引的列
+FULLTEXT_COLUMNS = {}
+
+
+def fts_table_name(table_name):
+    """SQLite FTS5 虚拟表名"""
+    return f'{table_name}_fts'
+
+
+def fulltext_ddl(dialect_name, table_name, columns):
+    """
+    生成建立全文索引的DDL语句
+    
+    Args:
+        dialect_name (str): 数据库方言名称（sqlite/mysql）
+        table_name (str): 原始表名
+        columns (list): 建立索引的列名
+    
+    Returns:
+        list: 需要依次执行的SQL语句
+    """
+    if dialect_name == 'sqlite':
+        fts = fts_table_name(table_name)
+        cols = ', '.join(columns)
+        new_values = ', '.join(f'new.{col}' for col in columns)
+        old_values = ', '.join(f'old.{col}' for col in columns)
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{cols}, content='{table_name}', content_rowid='id', tokenize='trigram')",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table_name} BEGIN "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table_name} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table_name} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END",
+            f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+        ]
+    if dialect_name == 'mysql':
+        return [
+            f"ALTER TABLE {table_name} ADD FULLTEXT INDEX ft_{table_name} ({', '.join(columns)}) WITH PARSER ngram"
+        ]
+    return []
+
+
+def fulltext_drop_ddl(dialect_name, table_name):
+    """生成删除全文索引的DDL语句"""
+    if dialect_name == 'sqlite':
+        fts = fts_table_name(table_name)
+        return [f'DROP TABLE IF EXISTS {fts}'] + [
+            f'DROP TRIGGER IF EXISTS {fts}_{suffix}' for suffix in ('ai', 'ad', 'au')
+        ]
+    if dialect_name == 'mysql':
+        return [f'ALTER TABLE {table_name} DROP INDEX ft_{table_name}']
+    return []
+
+
+def register_fulltext_index(target_table, columns):
+    """
+    为表注册全文索引，随 db.create_all() / db.drop_all() 一起创建和删除
+    
+    Args:
+        target_table: SQLAlchemy Table 对象
+        columns (list): 建立索引的列名
+    """
+    FULLTEXT_COLUMNS[target_table.name] = list(columns)
+    
+    for dialect_name in ('sqlite', 'mysql'):
+        for statement in fulltext_ddl(dialect_name, target_table.name, columns):
+            event.listen(target_table, 'after_create', DDL(statement).execute_if(dialect=dialect_name))
+    for statement in fulltext_drop_ddl('sqlite', target_table.name):
+        event.listen(target_table, 'before_drop', DDL(statement).execute_if(dialect='sqlite'))
+
+
+def _phrase(search):
+    """去掉首尾空白和双引号（短语的定界符），其余字符在短语中按原样匹配"""
+    return search.replace('"', ' ').strip()
+
+
+def is_fulltext_searchable(search):
+    """判断检索词能否走全文索引（过短的检索词和中日韩文本由其他检索路径处理）"""
+    return len(_phrase(search)) >= MIN_FULLTEXT_LENGTH and not CJK_PATTERN.search(search)
+
+
+def apply_fulltext_search(query, model, search, session, rank=True, extra_conditions=()):
+    """
+    对查询应用全文检索
+    
+    Args:
+        query: 原始查询
+        model: 已注册全文索引的模型
+        search (str): 用户输入的检索词
+        session: 数据库会话，用于判断方言
+        rank (bool): 是否按相关度排序（游标分页时应关闭）
+        extra_conditions: 与全文匹配取“或”的其他过滤条件
+    
+    Returns:
+        查询对象；无法走全文索引时返回 None，由调用方使用原有的 LIKE 检索
+    """
+    table_name = model.__table__.name
+    columns = FULLTEXT_COLUMNS.get(table_name)
+    if not columns or not is_fulltext_searchable(search):
+        return None
+    
+    phrase = _phrase(search)
+    dialect_name = session.get_bind().dialect.name
+    
+    if dialect_name == 'sqlite':
+        fts_name = fts_table_name(table_name)
+        fts = table(fts_name, column('rowid'), column('rank'))
+        match_query = '"%s"' % phrase
+        matches = select(
+            fts.c.rowid.label('id'),
+            fts.c.rank.label('score')
+        ).where(text(f'{fts_name} MATCH :fts_query').bindparams(fts_query=match_query)).subquery()
+        
+        if extra_conditions:
+            query = query.outerjoin(matches, matches.c.id == model.id).filter(
+                or_(matches.c.id.isnot(None), *extra_conditions)
+            )
+        else:
+            query = query.join(matches, matches.c.id == model.id)
+        if rank:
+            # bm25 分数越小越相关，只命中其他条件的记录排在最后
+            query = query.order_by(matches.c.score.is_(None), matches.c.score.asc())
+        return query
+    
+    if dialect_name == 'mysql':
+        against = '"%s"' % phrase
+        relevance = mysql.match(*[getattr(model, col) for col in columns], against=against).in_boolean_mode()
+        query = query.filter(or_(relevance, *extra_conditions))
+        if rank:
+            query = query.order_by(relevance.desc())
+        return query
+    
+    return None
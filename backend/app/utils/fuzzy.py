@@ -0,0 +1,293 @@
+"""
+容错（模糊）单词检索
+进程内 BK 树索引 + 编辑距离，查询只访问树中满足三角不等式的分支
+"""
+import logging
+import threading
+from sqlalchemy import event, inspect
+from app import db
+from app.models.vocabulary import VocabularyWord
+from app.models.word import Word
+from app.utils.cache import CacheError, bus_subscribers
+from app.utils.word_index import MAX_REFRESH_IDS, normalize_word
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'fuzzy_index_changes'
+MAX_DISTANCE = 3
+MAX_CANDIDATES = 500
+TOMBSTONE_MIN = 1000  # 已删除单词的树节点超过该数量且超过树的 TOMBSTONE_RATIO 时重建
+TOMBSTONE_RATIO = 0.25
+
+
+def levenshtein(a, b, limit=None):
+    """
+    计算两个字符串的编辑距离
+    
+    Args:
+        a (str): 字符串
+        b (str): 字符串
+        limit (int): 距离上限，超过时提前结束并返回 limit + 1
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def default_distance(search):
+    """根据检索词长度给出默认允许的编辑距离"""
+    return 1 if len(search) <= 4 else 2
+
+
+class BKTree:
+    """BK 树，节点为 [单词, {距离: 子节点}]"""
+    
+    def __init__(self):
+        self._root = None
+        self.size = 0
+    
+    def add(self, word):
+        if self._root is None:
+            self._root = [word, {}]
+            self.size = 1
+            return
+        node = self._root
+        while True:
+            distance = levenshtein(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [word, {}]
+                self.size += 1
+                return
+            node = child
+    
+    def search(self, word, max_distance):
+        """返回 [(距离, 单词)]，只包含编辑距离不超过 max_distance 的单词"""
+        if self._root is None:
+            return []
+        results = []
+        stack = [self._root]
+        while stack:
+            node_word, children = stack.pop()
+            # 距离超过 最大子节点边 + max_distance 时既不命中也没有可访问的子节点
+            limit = max_distance + (max(children) if children else 0)
+            distance = levenshtein(word, node_word, limit)
+            if distance <= max_distance:
+                results.append((distance, node_word))
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for d, child in children.items() if low <= d <= high)
+        return results
+
+
+class FuzzyWordIndex:
+    """
+    某个模型 word 字段的容错索引
+    
+    BK 树按规范化单词建立，每条记录另存其范围（词组、分类）和启用状态，检索时先按它们过滤再截取候选数。
+    单词被删除时只从 单词 -> ID 映射中移除，树节点保留；这类节点超过树的 TOMBSTONE_RATIO 时重建。
+    单词写入提交后按ID标记待刷新，配置了 CACHE_REDIS_URL 时通过失效广播通知其他工作进程
+    """
+    
+    def __init__(self, model, scope_column):
+        self.model = model
+        self.scope_column = scope_column
+        self.message_prefix = f'fuzzy:{model.__tablename__}:'
+        self.bus = None
+        self._lock = threading.Lock()
+        self._tree = None
+        self._ids_by_word = {}
+        self._records = {}  # 记录ID -> (规范化单词, 范围, 是否启用)
+        self._stale_ids = set()
+    
+    def configure(self, bus=None):
+        """设置失效广播（cache.init_app 调用），并丢弃已构建的索引"""
+        self.bus = bus
+        if bus is not None:
+            bus.add_listener(self._on_invalidate)
+        self._reset()
+    
+    def _columns(self):
+        return self.model.id, self.model.word, getattr(self.model, self.scope_column), self.model.is_active
+    
+    def _build(self):
+        rows = db.session.query(*self._columns()).all()
+        self._tree = BKTree()
+        self._ids_by_word = {}
+        self._records = {}
+        self._stale_ids = set()
+        for record_id, word, scope, is_active in rows:
+            self._add(record_id, word, scope, is_active)
+    
+    def _refresh(self):
+        """重新读取待刷新的记录（已删除的从索引中移除）"""
+        ids, self._stale_ids = list(self._stale_ids), set()
+        for record_id in ids:
+            self._remove(record_id)
+        for record_id, word, scope, is_active in db.session.query(*self._columns()).filter(self.model.id.in_(ids)):
+            self._add(record_id, word, scope, is_active)
+        if self._tree.size - len(self._ids_by_word) > max(TOMBSTONE_MIN, self._tree.size * TOMBSTONE_RATIO):
+            self._build()
+    
+    def _add(self, record_id, word, scope, is_active):
+        normalized = normalize_word(word)
+        self._records[record_id] = (normalized, scope, is_active is None or bool(is_active))
+        ids = self._ids_by_word.get(normalized)
+        if ids is None:
+            ids = self._ids_by_word[normalized] = set()
+            self._tree.add(normalized)
+        ids.add(record_id)
+    
+    def _remove(self, record_id):
+        record = self._records.pop(record_id, None)
+        if record is not None:
+            ids = self._ids_by_word.get(record[0])
+            if ids is not None:
+                ids.discard(record_id)
+                if not ids:
+                    del self._ids_by_word[record[0]]
+    
+    def search(self, search, max_distance=None, scope=None, is_active=None):
+        """
+        容错检索
+        
+        Args:
+            search (str): 检索词
+            max_distance (int): 允许的最大编辑距离，为空时按检索词长度决定
+            scope: 只返回该范围（词组ID、分类ID）的记录，为空时不限
+            is_active (bool): 只返回该启用状态的记录，为空时不限
+        
+        Returns:
+            dict: {记录ID: 编辑距离}，过滤后按距离取最近的 MAX_CANDIDATES 条
+        """
+        normalized = normalize_word(search)
+        if not normalized:
+            return {}
+        if max_distance is None:
+            max_distance = default_distance(normalized)
+        max_distance = max(0, min(max_distance, MAX_DISTANCE))
+        if self.bus is not None:
+            # 索引依赖失效广播，读取前确保本进程已订阅
+            self.bus.ensure_started()
+        
+        with self._lock:
+            if self._tree is None:
+                self._build()
+            elif self._stale_ids:
+                self._refresh()
+            matches = sorted(self._tree.search(normalized, max_distance))
+            distances = {}
+            for distance, word in matches:
+                for record_id in self._ids_by_word.get(word, ()):
+                    _, record_scope, record_active = self._records[record_id]
+                    if scope is not None and record_scope != scope:
+                        continue
+                    if is_active is not None and record_active != is_active:
+                        continue
+                    distances[record_id] = distance
+                if len(distances) >= MAX_CANDIDATES:
+                    break
+            return distances
+    
+    def refresh(self, record_ids):
+        """标记记录需要重新读取，并通知其他工作进程（写入提交后调用）"""
+        record_ids = list(record_ids)
+        if not record_ids:
+            return
+        if len(record_ids) > MAX_REFRESH_IDS:
+            self.invalidate()
+            return
+        self._mark_stale(record_ids)
+        self._publish([f'{self.message_prefix}{record_id}' for record_id in record_ids])
+    
+    def invalidate(self):
+        """丢弃所有工作进程的索引，下次查询时重新构建（批量 SQL 修改单词后调用）"""
+        self._reset()
+        self._publish([f'{self.message_prefix}*'])
+    
+    def _mark_stale(self, record_ids):
+        with self._lock:
+            if self._tree is None:
+                return
+            self._stale_ids.update(record_ids)
+            if len(self._stale_ids) > MAX_REFRESH_IDS:
+                self._tree = None
+    
+    def _reset(self):
+        with self._lock:
+            self._tree = None
+            self._ids_by_word = {}
+            self._records = {}
+            self._stale_ids = set()
+    
+    def _publish(self, keys):
+        if self.bus is None:
+            return
+        try:
+            self.bus.publish(keys)
+        except CacheError as e:
+            logger.warning('广播容错索引失效失败: %s', e)
+    
+    def _on_invalidate(self, keys):
+        """其他工作进程的失效消息（None 表示订阅断线重连，可能漏掉了消息）"""
+        if keys is None or f'{self.message_prefix}*' in keys:
+            self._reset()
+            return
+        record_ids = [int(key[len(self.message_prefix):]) for key in keys if key.startswith(self.message_prefix)]
+        if record_ids:
+            self._mark_stale(record_ids)
+
+
+fuzzy_indexes = {
+    VocabularyWord: FuzzyWordIndex(VocabularyWord, 'group_id'),
+    Word: FuzzyWordIndex(Word, 'category_id'),
+}
+bus_subscribers.extend(fuzzy_indexes.values())
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_fuzzy_changes(session, flush_context):
+    """记录本次事务中单词的增删改，提交后再同步到索引"""
+    changes = set()
+    for obj in session.new | session.deleted:
+        if type(obj) in fuzzy_indexes:
+            changes.add((type(obj), obj.id))
+    for obj in session.dirty:
+        index = fuzzy_indexes.get(type(obj))
+        if index is not None:
+            attrs = inspect(obj).attrs
+            if any(attrs[name].history.has_changes() for name in ('word', index.scope_column, 'is_active')):
+                changes.add((type(obj), obj.id))
+    if changes:
+        session.info.setdefault(PENDING_KEY, set()).update(changes)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_fuzzy_changes(session):
+    """事务提交后刷新索引中被修改的单词（包括其他工作进程）"""
+    changes = session.info.pop(PENDING_KEY, None)
+    if not changes:
+        return
+    for model, index in fuzzy_indexes.items():
+        index.refresh(record_id for changed_model, record_id in changes if changed_model is model)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_fuzzy_changes(session):
+    """事务回滚时丢弃未提交的单词变更"""
+    session.info.pop(PENDING_KEY, None)
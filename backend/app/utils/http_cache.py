@@ -0,0 +1,62 @@
+"""
+HTTP 条件请求工具
+根据内容版本号生成 ETag，命中 If-None-Match / If-Modified-Since 时直接返回 304，
+不再执行列表查询和序列化
+"""
+import hashlib
+from flask import current_app, request
+
+
+def make_etag(*parts):
+    """
+    根据内容版本号等信息生成 ETag，请求参数一并计入
+    
+    Args:
+        *parts: 决定响应内容的值，如资源类型、ID、内容版本号
+    """
+    args = sorted(request.args.items(multi=True))
+    raw = repr((request.path, parts, args)).encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()[:20]
+
+
+def latest(*values):
+    """取多个修改时间中最晚的一个（忽略空值）"""
+    return max((value for value in values if value is not None), default=None)
+
+
+def is_not_modified(etag, last_modified=None):
+    """判断客户端缓存是否仍然有效"""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        since = request.if_modified_since.replace(tzinfo=None)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def set_cache_headers(response, etag, last_modified=None):
+    """
+    为响应设置 ETag / Last-Modified
+    
+    Args:
+        response: Flask 响应对象
+        etag (str): make_etag 生成的 ETag
+        last_modified (datetime): 内容最后修改时间（UTC），可为空
+    """
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # 接口需要登录，只允许客户端私有缓存且每次使用前重新验证
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified_response(etag, last_modified=None):
+    """
+    客户端缓存仍然有效时返回 304 响应，否则返回 None
+    
+    应在执行列表查询和序列化之前调用
+    """
+    if not is_not_modified(etag, last_modified):
+        return None
+    return set_cache_headers(current_app.response_class(status=304), etag, last_modified)
@@ -0,0 +1,489 @@
+"""
+单词流式导入
+逐行解析 CSV / TSV / NDJSON 文件，按块批量插入并逐块提交：
+每块用一次查询找出已存在的单词，用一条多行 INSERT 写入，不缓存整个文件。
+已存在的单词按 on_conflict 处理：error 记为错误，skip 跳过，update 用数据库原生的
+INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE 按 (group_id, word) 唯一索引更新。
+判断单词是否已存在时按唯一索引的比较规则比较：MySQL 的 utf8mb4_unicode_ci 不区分大小写和重音
+"""
+import csv
+import io
+import json
+import unicodedata
+from datetime import datetime
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from app import db
+from app.models.vocabulary import VocabularyLibrary, WordGroup, VocabularyWord, apply_word_count_deltas
+from app.models.search import reindex_cjk_grams
+from app.models.tag import parse_tags, reindex_tags
+from app.utils.catalog_cache import catalog_cache
+from app.utils.fuzzy import fuzzy_indexes
+from app.utils.word_index import word_index
+
+IMPORT_FORMATS = ('csv', 'tsv', 'ndjson')
+
+# 单词已存在时的处理方式
+ON_CONFLICT_MODES = ('error', 'skip', 'update')
+
+# 文件扩展名 -> 导入格式
+IMPORT_EXTENSIONS = {
+    'csv': 'csv',
+    'tsv': 'tsv',
+    'txt': 'tsv',
+    'ndjson': 'ndjson',
+    'jsonl': 'ndjson'
+}
+
+# 可选的文本字段及长度上限（与列定义一致）
+TEXT_FIELDS = {
+    'pronunciation': 100,
+    'phonetic': 100,
+    'part_of_speech': 50,
+    'example_sentence': None,
+    'example_translation': None,
+    'notes': None
+}
+
+# update 模式下可更新的字段（只更新记录中出现的字段）
+UPDATE_FIELDS = ('translation', *TEXT_FIELDS, 'difficulty_level', 'frequency', 'sort_order', 'is_active', 'tags')
+
+# 各方言的 INSERT 构造（支持冲突处理子句）
+UPSERT_DIALECTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+    'mysql': mysql.insert
+}
+
+# 字符串比较不区分大小写和重音的方言（列排序规则为 utf8mb4_unicode_ci）
+CASE_INSENSITIVE_DIALECTS = ('mysql',)
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportRowError(ValueError):
+    """单行数据不合法"""
+
+
+def detect_format(filename=None, content_type=None):
+    """根据文件名或 Content-Type 推断导入格式，无法判断时返回 None"""
+    if filename and '.' in filename:
+        extension = filename.rsplit('.', 1)[1].lower()
+        if extension in IMPORT_EXTENSIONS:
+            return IMPORT_EXTENSIONS[extension]
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in ('application/x-ndjson', 'application/jsonl'):
+        return 'ndjson'
+    if content_type == 'text/tab-separated-values':
+        return 'tsv'
+    if content_type == 'text/csv':
+        return 'csv'
+    return None
+
+
+def iter_records(stream, import_format):
+    """
+    逐行解析导入文件
+    
+    Args:
+        stream: 二进制文件流
+        import_format (str): csv、tsv 或 ndjson
+    
+    Yields:
+        tuple: (行号, 记录字典)，解析失败的行为 (行号, ImportRowError)
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if import_format == 'ndjson':
+        for line_no, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_no, ImportRowError('JSON 格式错误')
+                continue
+            if not isinstance(record, dict):
+                yield line_no, ImportRowError('每行应为一个 JSON 对象')
+                continue
+            yield line_no, record
+        return
+    
+    reader = csv.DictReader(text, delimiter='\t' if import_format == 'tsv' else ',')
+    for record in reader:
+        if None in record:
+            yield reader.line_num, ImportRowError('列数多于表头')
+            continue
+        if not any(value for value in record.values()):
+            continue
+        yield reader.line_num, record
+
+
+def _text(value, max_length=None):
+    value = str(value).strip() if value is not None else ''
+    if max_length and len(value) > max_length:
+        raise ImportRowError(f'"{value[:20]}"超过{max_length}个字符')
+    return value or None
+
+
+def normalize_record(record):
+    """
+    校验并转换一行数据为单词列值
+    
+    Returns:
+        dict: 单词列值，另含 group（词组名称）和 fields（记录中出现的可更新字段）
+    """
+    if not isinstance(record, dict):
+        raise ImportRowError('每行应为一个对象')
+    word = _text(record.get('word'), 100)
+    translation = _text(record.get('translation'), 200)
+    if not word or not translation:
+        raise ImportRowError('单词和翻译为必填项')
+    
+    values = {'word': word, 'translation': translation, 'group': _text(record.get('group'), 100)}
+    for field, max_length in TEXT_FIELDS.items():
+        values[field] = _text(record.get(field), max_length)
+    
+    for field, default, low, high in (('difficulty_level', 1, 1, 5), ('frequency', 0, 0, None), ('sort_order', 0, None, None)):
+        value = record.get(field)
+        if value in (None, ''):
+            values[field] = default
+            continue
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ImportRowError(f'{field} 应为整数')
+        if (low is not None and value < low) or (high is not None and value > high):
+            raise ImportRowError(f'{field} 超出范围')
+        values[field] = value
+    
+    is_active = record.get('is_active')
+    if isinstance(is_active, str):
+        is_active = is_active.strip().lower() not in ('0', 'false', 'no', '')
+    values['is_active'] = True if is_active is None else bool(is_active)
+    
+    tags = parse_tags(record.get('tags'))
+    values['tags'] = ','.join(tags) if tags else None
+    values['fields'] = frozenset(field for field in UPDATE_FIELDS if field in record)
+    return values
+
+
+def fold_word(word):
+    """去掉重音并折叠大小写，得到与 utf8mb4_unicode_ci 比较规则一致的比较键"""
+    decomposed = unicodedata.normalize('NFKD', word)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def upsert_dialect(on_conflict):
+    """
+    返回当前数据库方言名称，on_conflict 为 skip/update 而方言不支持冲突处理子句时抛出 ValueError
+    """
+    dialect = db.session.get_bind().dialect.name
+    if on_conflict != 'error' and dialect not in UPSERT_DIALECTS:
+        raise ValueError(f'数据库 {dialect} 不支持 on_conflict={on_conflict}（支持 {"、".join(UPSERT_DIALECTS)}）')
+    return dialect
+
+
+def upsert_statement(model, on_conflict, index_elements, update_fields=()):
+    """
+    构造带冲突处理的 INSERT 语句
+    
+    Args:
+        model: 模型
+        on_conflict (str): error（不处理，冲突时报错）、skip（忽略冲突行）或 update（更新冲突行）
+        index_elements (tuple): 唯一索引的列
+        update_fields (iterable): update 模式下更新的列
+    """
+    if on_conflict == 'error':
+        return insert(model)
+    
+    dialect = upsert_dialect(on_conflict)
+    stmt = UPSERT_DIALECTS[dialect](model)
+    
+    if dialect == 'mysql':
+        # ON DUPLICATE KEY UPDATE 没有 DO NOTHING，用把列赋值为自身代替
+        values = {field: stmt.inserted[field] for field in update_fields} if on_conflict == 'update' else {}
+        return stmt.on_duplicate_key_update(values or {index_elements[0]: model.__table__.c[index_elements[0]]})
+    if on_conflict == 'skip':
+        return stmt.on_conflict_do_nothing(index_elements=index_elements)
+    return stmt.on_conflict_do_update(index_elements=index_elements,
+                                      set_={field: stmt.excluded[field] for field in update_fields})
+
+
+class WordImporter:
+    """
+    单词导入器
+    
+    导入到指定词组（group_id），或导入到词库（library_id）并按每行的 group 列找到或创建词组。
+    on_conflict 决定已存在的单词（同一词组下同名）如何处理：error 记为错误，skip 跳过，
+    update 更新记录中出现的字段。
+    on_commit 在每块提交前调用（与该块在同一事务中），后台任务据此保存进度；
+    start_line 之前的行视为已处理，用于中断后继续导入
+    """
+    
+    def __init__(self, library_id=None, group_id=None, chunk_size=DEFAULT_CHUNK_SIZE, max_errors=MAX_REPORTED_ERRORS,
+                 start_line=0, on_commit=None, on_conflict='error'):
+        if on_conflict not in ON_CONFLICT_MODES:
+            raise ValueError('on_conflict 应为 update、skip 或 error')
+        dialect = upsert_dialect(on_conflict)
+        if group_id is not None:
+            group = db.session.get(WordGroup, group_id)
+            if group is None:
+                raise LookupError('词组不存在')
+            library_id = group.library_id
+        elif library_id is None or db.session.get(VocabularyLibrary, library_id) is None:
+            raise LookupError('词库不存在')
+        
+        self.library_id = library_id
+        self.group_id = group_id
+        self.chunk_size = max(1, chunk_size)
+        self.max_errors = max_errors
+        self.on_conflict = on_conflict
+        self.fold_case = dialect in CASE_INSENSITIVE_DIALECTS
+        self.group_ids = {}  # 词组名称 -> 词组ID
+        self.total = 0
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.error_count = 0
+        self.errors = []
+        self.chunks = 0
+        self.start_line = start_line
+        self.line_no = start_line  # 已读取到的行号
+        self.on_commit = on_commit
+    
+    def key(self, group_id, word):
+        """单词在 (group_id, word) 唯一索引中的比较键"""
+        return group_id, fold_word(word) if self.fold_case else word
+    
+    def add_error(self, line_no, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line_no, 'message': message})
+    
+    def run(self, records):
+        """
+        导入记录
+        
+        Args:
+            records: iter_records 生成的 (行号, 记录) 序列
+        
+        Returns:
+            dict: 导入结果
+        """
+        chunk = []
+        for line_no, record in records:
+            if line_no <= self.start_line:
+                continue
+            self.line_no = line_no
+            self.total += 1
+            if isinstance(record, Exception):
+                self.add_error(line_no, str(record))
+                continue
+            try:
+                chunk.append((line_no, normalize_record(record)))
+            except ImportRowError as e:
+                self.add_error(line_no, str(e))
+                continue
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk)
+        return self.result()
+    
+    def result(self):
+        return {
+            'total_count': self.total,
+            'created_count': self.created,
+            'updated_count': self.updated,
+            'skipped_count': self.skipped,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'has_more_errors': self.error_count > len(self.errors),
+            'chunks': self.chunks
+        }
+    
+    def resolve_groups(self, chunk):
+        """确定每行的词组ID，按名称批量查询，缺少的词组一次创建"""
+        if self.group_id is not None:
+            return [(line_no, self.group_id, values) for line_no, values in chunk]
+        
+        names = {values['group'] for _, values in chunk if values['group']} - set(self.group_ids)
+        if names:
+            rows = db.session.execute(select(WordGroup.name, WordGroup.id).where(
+                WordGroup.library_id == self.library_id, WordGroup.name.in_(names)
+            )).all()
+            for name, group_id in rows:
+                self.group_ids.setdefault(name, group_id)
+            missing = [name for name in sorted(names) if name not in self.group_ids]
+            groups = [WordGroup(name=name, library_id=self.library_id) for name in missing]
+            if groups:
+                db.session.add_all(groups)
+                db.session.flush()
+                self.group_ids.update((group.name, group.id) for group in groups)
+        
+        resolved = []
+        for line_no, values in chunk:
+            if not values['group']:
+                self.add_error(line_no, '导入到词库时 group（词组名称）为必填项')
+                continue
+            resolved.append((line_no, self.group_ids[values['group']], values))
+        return resolved
+    
+    def import_chunk(self, chunk):
+        """导入一块数据并提交，失败时回滚本块"""
+        self.chunks += 1
+        state = (self.created, self.updated, self.skipped, self.error_count, len(self.errors))
+        try:
+            rows, existing = self.split_existing(self.resolve_groups(chunk))
+            created, updated_ids = self.upsert_rows(rows, existing) if rows else ([], [])
+            if self.on_commit is not None:
+                self.on_commit(self)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.created, self.updated, self.skipped, self.error_count, errors_kept = state
+            del self.errors[errors_kept:]
+            self.group_ids = {}
+            for line_no, _ in chunk:
+                self.add_error(line_no, f'写入失败: {e}')
+            return
+        
+        # 批量 INSERT 不经过 flush 事件，提交后手动同步进程内索引和目录缓存
+        changed_ids = [row.id for row in created] + updated_ids
+        word_index.refresh(changed_ids)
+        fuzzy_indexes[VocabularyWord].refresh(changed_ids)
+        if rows:
+            catalog_cache.invalidate(('library', self.library_id),
+                                     *[('group', group_id) for group_id in {group_id for _, group_id, _ in rows}])
+    
+    def split_existing(self, rows):
+        """
+        用一次查询找出已存在的单词，按 on_conflict 处理已存在的行；
+        文件内重复的单词视同已存在（update 模式下后出现的覆盖先出现的）
+        
+        Returns:
+            tuple: (待写入的行, {(词组ID, 单词比较键): 是否启用})
+        """
+        words = {values['word'] for _, _, values in rows}
+        group_ids = {group_id for _, group_id, _ in rows}
+        existing = {
+            self.key(group_id, word): is_active
+            for group_id, word, is_active in db.session.execute(select(
+                VocabularyWord.group_id, VocabularyWord.word, VocabularyWord.is_active
+            ).where(VocabularyWord.group_id.in_(group_ids), VocabularyWord.word.in_(words))).all()
+        }
+        
+        kept = {}
+        for line_no, group_id, values in rows:
+            key = self.key(group_id, values['word'])
+            if key in existing or key in kept:
+                if self.on_conflict == 'error':
+                    self.add_error(line_no, f'单词"{values["word"]}"已存在')
+                    continue
+                if self.on_conflict == 'skip':
+                    self.skipped += 1
+                    continue
+                if key in kept:
+                    # 先出现的行已计入创建或更新，合并字段后由本行覆盖
+                    self.updated += 1
+                    previous = kept.pop(key)[2]
+                    values = {**previous, **{field: values[field] for field in values['fields']},
+                              'fields': previous['fields'] | values['fields']}
+            kept[key] = (line_no, group_id, values)
+        return list(kept.values()), existing
+    
+    def upsert_rows(self, rows, existing):
+        """
+        写入单词（update 模式下用一条 INSERT ... ON CONFLICT 同时更新已存在的单词），
+        再同步冗余计数、内容版本号、n-gram 索引和标签关联
+        
+        Returns:
+            tuple: (新单词的 (id, group_id, word) 列表, 更新的单词ID列表)
+        """
+        now = datetime.utcnow()
+        # 同一条多行语句的行需要相同的列；update 模式按出现的字段分组，每组一条语句
+        statements = {}
+        for _, group_id, values in rows:
+            fields = values['fields'] if self.on_conflict == 'update' else frozenset()
+            row = {key: value for key, value in values.items() if key not in ('group', 'fields')}
+            row['group_id'] = group_id
+            if self.on_conflict == 'update':
+                row['updated_at'] = now
+            statements.setdefault(fields, []).append(row)
+        for fields, payload in statements.items():
+            stmt = upsert_statement(VocabularyWord, self.on_conflict, ('group_id', 'word'),
+                                    [*sorted(fields), 'updated_at'])
+            db.session.execute(stmt, payload)
+        
+        keys = {self.key(group_id, values['word']) for _, group_id, values in rows}
+        current = {self.key(row.group_id, row.word): row for row in db.session.execute(
+            select(VocabularyWord.id, VocabularyWord.group_id, VocabularyWord.word).where(
+                VocabularyWord.group_id.in_({group_id for _, group_id, _ in rows}),
+                VocabularyWord.word.in_({values['word'] for _, _, values in rows})
+            )
+        ).all() if self.key(row.group_id, row.word) in keys}
+        
+        created = []
+        updated_ids = []
+        tagged_ids = []
+        deltas = {group_id: 0 for group_id, _ in keys}  # 更新的词组即使计数不变也递增内容版本号
+        for _, group_id, values in rows:
+            key = self.key(group_id, values['word'])
+            row = current.get(key)
+            if row is None:
+                continue
+            if key in existing:
+                # 只有 update 模式会写入已存在的单词
+                updated_ids.append(row.id)
+                if 'is_active' in values['fields']:
+                    old_active = existing[key] is None or bool(existing[key])
+                    deltas[group_id] += int(values['is_active']) - int(old_active)
+                if 'tags' in values['fields']:
+                    tagged_ids.append(row.id)
+                continue
+            created.append(row)
+            if values['is_active']:
+                deltas[group_id] += 1
+            if values['tags']:
+                tagged_ids.append(row.id)
+        self.created += len(created)
+        self.updated += len(updated_ids)
+        
+        apply_word_count_deltas(deltas)
+        reindex_cjk_grams(VocabularyWord, [row.id for row in created] + updated_ids)
+        reindex_tags(VocabularyWord, tagged_ids)
+        return created, updated_ids
+
+
+def import_message(result):
+    """导入结果的提示信息"""
+    parts = [f"成功创建{result['created_count']}个单词"]
+    if result['updated_count']:
+        parts.append(f"更新{result['updated_count']}个")
+    if result['skipped_count']:
+        parts.append(f"跳过{result['skipped_count']}个已存在的单词")
+    if result['error_count']:
+        parts.append(f"{result['error_count']}个错误")
+    return '，'.join(parts)
+
+
+def import_words(stream, import_format, library_id=None, group_id=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 on_conflict='error'):
+    """
+    从文件流导入单词
+    
+    Args:
+        stream: 二进制文件流
+        import_format (str): csv、tsv 或 ndjson
+        library_id (int): 导入到词库（按 group 列分配词组）
+        group_id (int): 导入到词组
+        chunk_size (int): 每块行数，每块提交一次
+        on_conflict (str): 单词已存在时的处理方式（error、skip 或 update）
+    
+    Returns:
+        dict: 导入结果
+    """
+    importer = WordImporter(library_id=library_id, group_id=group_id, chunk_size=chunk_size, on_conflict=on_conflict)
+    return importer.run(iter_records(stream, import_format))
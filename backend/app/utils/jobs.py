@@ -0,0 +1,330 @@
+"""
+后台导入任务
+上传文件先保存到 IMPORT_JOB_DIR，任务记录写入数据库后交给进程内的有界线程池执行；
+每块单词提交时保存进度，执行期间另有线程定时刷新心跳。工作进程被重启（gunicorn max_requests、超时等）后，
+心跳超时的任务由其他进程接手，从最后提交的行继续导入
+"""
+import logging
+import os
+import shutil
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_, update
+from app import db
+from app.models.job import ImportJob
+from app.utils.importer import WordImporter, import_message, iter_records
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = (ImportJob.STATUS_PENDING, ImportJob.STATUS_RUNNING)
+
+
+class JobQueueFullError(Exception):
+    """进行中的任务数已达上限"""
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def save_upload(stream, directory, suffix=''):
+    """把上传的文件流分块写入任务目录，返回文件路径"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{uuid.uuid4().hex}{suffix}')
+    with open(path, 'wb') as target:
+        shutil.copyfileobj(stream, target, 1024 * 1024)
+    return path
+
+
+def _remove_source(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class JobHeartbeat:
+    """
+    任务执行期间定时刷新心跳
+    
+    单块导入耗时超过心跳超时时，任务也不会被其他进程当作中断接手；
+    使用独立的连接更新，不影响导入块的事务。任务已被其他进程接手（执行者或次数变化）时停止
+    """
+    
+    def __init__(self, app, job_id, worker, attempts, interval):
+        self.app = app
+        self.job_id = job_id
+        self.worker = worker
+        self.attempts = attempts
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'import-job-heartbeat-{job_id}', daemon=True)
+    
+    def __enter__(self):
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+    
+    def beat(self):
+        """刷新一次心跳，返回任务是否仍由本次执行持有"""
+        table = ImportJob.__table__
+        with self.app.app_context():
+            with db.engine.begin() as connection:
+                return connection.execute(update(table).where(
+                    table.c.id == self.job_id,
+                    table.c.status == ImportJob.STATUS_RUNNING,
+                    table.c.worker == self.worker,
+                    table.c.attempts == self.attempts
+                ).values(heartbeat_at=datetime.utcnow())).rowcount > 0
+    
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                if not self.beat():
+                    return
+            except Exception as e:
+                logger.warning('刷新导入任务 %s 的心跳失败: %s', self.job_id, e)
+
+
+class ImportJobQueue:
+    """
+    导入任务队列
+    
+    workers 为每个进程的线程数；为 0 时在请求中同步执行（测试环境）
+    """
+    
+    def __init__(self):
+        self.app = None
+        self.workers = 2
+        self.max_active = 20
+        self.heartbeat_timeout = 120
+        self.max_attempts = 3
+        self.directory = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._running = set()  # 本进程正在执行的任务
+    
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('IMPORT_JOB_WORKERS', 2)
+        self.max_active = app.config.get('IMPORT_JOB_MAX_ACTIVE', 20)
+        self.heartbeat_timeout = app.config.get('IMPORT_JOB_HEARTBEAT_TIMEOUT', 120)
+        self.max_attempts = app.config.get('IMPORT_JOB_MAX_ATTEMPTS', 3)
+        self.directory = app.config.get('IMPORT_JOB_DIR')
+        self._executor = None
+        self._pid = None
+    
+    def executor(self):
+        """当前进程的线程池（fork 后的进程不继承父进程的线程，首次使用时创建并接手中断的任务）"""
+        if self._pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='import-job')
+                self._pid = os.getpid()
+                self._executor.submit(self._recover_all)
+        return self._executor
+    
+    def create(self, stream, import_format, library_id, group_id=None, chunk_size=1000, filename=None, user_id=None,
+               on_conflict='error'):
+        """
+        保存上传文件并创建任务
+        
+        Raises:
+            JobQueueFullError: 进行中的任务数已达上限
+        """
+        active = db.session.query(func.count(ImportJob.id)).filter(ImportJob.status.in_(ACTIVE_STATUSES)).scalar()
+        if active >= self.max_active:
+            raise JobQueueFullError('导入任务过多，请稍后再试')
+        
+        path = save_upload(stream, self.directory, f'.{import_format}')
+        job = ImportJob(
+            library_id=library_id,
+            group_id=group_id,
+            import_format=import_format,
+            chunk_size=chunk_size,
+            on_conflict=on_conflict,
+            filename=filename,
+            source_path=path,
+            created_by=user_id,
+            heartbeat_at=datetime.utcnow()
+        )
+        try:
+            db.session.add(job)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            _remove_source(path)
+            raise
+        self.submit(job.id)
+        return job
+    
+    def submit(self, job_id):
+        """交给线程池执行（同步模式下直接执行）"""
+        if not self.workers:
+            self.run(job_id)
+            return
+        self.executor().submit(self._run_in_context, job_id)
+    
+    def run_task(self, func, *args):
+        """
+        在线程池中执行不需要持久化的后台操作（同步模式下直接执行）
+        
+        操作应可重复执行，工作进程退出后由调用方重新发起
+        """
+        if not self.workers:
+            func(*args)
+            return
+        self.executor().submit(self._run_task_in_context, func, *args)
+    
+    def _run_task_in_context(self, func, *args):
+        with self.app.app_context():
+            try:
+                func(*args)
+            except Exception:
+                db.session.rollback()
+                logger.exception('后台操作 %s%s 失败', func.__name__, args)
+            finally:
+                db.session.remove()
+    
+    def _run_in_context(self, job_id):
+        with self.app.app_context():
+            try:
+                self.run(job_id)
+            finally:
+                db.session.remove()
+    
+    def _recover_all(self):
+        with self.app.app_context():
+            try:
+                for job_id in self.stale_job_ids():
+                    self.recover(job_id)
+            except Exception as e:
+                logger.warning('接手中断的导入任务失败: %s', e)
+            finally:
+                db.session.remove()
+    
+    def stale_job_ids(self):
+        """心跳超时的待执行或执行中任务"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.heartbeat_timeout)
+        return [job_id for job_id, in db.session.query(ImportJob.id).filter(
+            ImportJob.status.in_(ACTIVE_STATUSES),
+            or_(ImportJob.heartbeat_at.is_(None), ImportJob.heartbeat_at < cutoff)
+        ).order_by(ImportJob.id)]
+    
+    def recover(self, job_id):
+        """
+        接手心跳超时的任务：改回待执行并在本进程排队
+        
+        用带旧心跳时间的条件更新抢占，多个进程同时发现时只有一个成功；
+        本进程仍在执行的任务（心跳线程因数据库繁忙等未能及时刷新）不接手
+        """
+        job = db.session.get(ImportJob, job_id, populate_existing=True)
+        cutoff = datetime.utcnow() - timedelta(seconds=self.heartbeat_timeout)
+        if job is None or job.is_finished or (job.heartbeat_at is not None and job.heartbeat_at >= cutoff):
+            return False
+        if job.worker == worker_name() and job_id in self._running:
+            return False
+        
+        values = {'status': ImportJob.STATUS_PENDING, 'heartbeat_at': datetime.utcnow()}
+        if job.attempts >= self.max_attempts:
+            values = {
+                'status': ImportJob.STATUS_FAILED,
+                'message': f'任务已中断 {job.attempts} 次，不再重试',
+                'finished_at': datetime.utcnow()
+            }
+        claimed = db.session.execute(update(ImportJob).where(
+            ImportJob.id == job_id,
+            ImportJob.status == job.status,
+            ImportJob.heartbeat_at == job.heartbeat_at if job.heartbeat_at is not None else ImportJob.heartbeat_at.is_(None)
+        ).values(**values).execution_options(synchronize_session=False)).rowcount
+        db.session.commit()
+        if not claimed:
+            return False
+        if values['status'] == ImportJob.STATUS_FAILED:
+            _remove_source(job.source_path)
+            return False
+        logger.warning('接手中断的导入任务 %s（第 %s 次执行）', job_id, job.attempts + 1)
+        self.submit(job_id)
+        return True
+    
+    def run(self, job_id):
+        """执行任务（先把状态从待执行改为执行中，已被其他进程领取时跳过）"""
+        now = datetime.utcnow()
+        worker = worker_name()
+        claimed = db.session.execute(update(ImportJob).where(
+            ImportJob.id == job_id, ImportJob.status == ImportJob.STATUS_PENDING
+        ).values(
+            status=ImportJob.STATUS_RUNNING,
+            worker=worker,
+            attempts=ImportJob.attempts + 1,
+            started_at=func.coalesce(ImportJob.started_at, now),
+            heartbeat_at=now
+        ).execution_options(synchronize_session=False)).rowcount
+        db.session.commit()
+        if not claimed:
+            return
+        
+        job = db.session.get(ImportJob, job_id)
+        heartbeat = JobHeartbeat(self.app, job_id, worker, job.attempts, max(self.heartbeat_timeout / 3, 1))
+        self._running.add(job_id)
+        try:
+            self._execute(job, heartbeat)
+        finally:
+            self._running.discard(job_id)
+        _remove_source(job.source_path)
+    
+    def _execute(self, job, heartbeat):
+        try:
+            importer = WordImporter(
+                library_id=job.library_id,
+                group_id=job.group_id,
+                chunk_size=job.chunk_size,
+                start_line=job.processed_line,
+                on_commit=lambda importer: self.save_progress(job, importer),
+                on_conflict=job.on_conflict
+            )
+            # 恢复上次执行保存的进度
+            importer.total = job.total_count
+            importer.created = job.created_count
+            importer.updated = job.updated_count
+            importer.skipped = job.skipped_count
+            importer.error_count = job.error_count
+            importer.errors = job.get_errors()
+            importer.chunks = job.chunks
+            
+            with heartbeat, open(job.source_path, 'rb') as stream:
+                importer.run(iter_records(stream, job.import_format))
+            self.save_progress(job, importer)
+            job.status = ImportJob.STATUS_SUCCEEDED
+            job.message = import_message(importer.result())
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('导入任务 %s 失败', job.id)
+            job.status = ImportJob.STATUS_FAILED
+            job.message = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    
+    @staticmethod
+    def save_progress(job, importer):
+        """保存进度并刷新心跳（在导入块的事务中调用）"""
+        job.processed_line = importer.line_no
+        job.total_count = importer.total
+        job.created_count = importer.created
+        job.updated_count = importer.updated
+        job.skipped_count = importer.skipped
+        job.error_count = importer.error_count
+        job.set_errors(importer.errors)
+        job.chunks = importer.chunks
+        job.heartbeat_at = datetime.utcnow()
+
+
+import_jobs = ImportJobQueue()
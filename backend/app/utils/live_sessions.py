@@ -0,0 +1,563 @@
+"""
+进行中游戏会话的实时状态
+会话状态为 playing 时，分数、答题计数和玩家得分保存在会话存储中，每次答题只做按字段的原子自增，
+不读写 game_sessions 行；结束游戏或空闲超时后把最终状态一次写回数据库。
+- MemorySessionBackend: 进程内存储，只适用于单进程部署（开发、测试）
+- RedisSessionBackend: Redis 存储，每个会话一个哈希，多个工作进程共享
+答题记录由写后缓冲（answer_buffer）批量插入 game_answers。
+未配置存储时（LIVE_SESSION_STORE 为 database）每次答题在一个事务中对会话行做 col = col + 增量 的原子自增
+并插入答题记录，所有工作进程看到同一份计数；玩家得分由答题记录汇总，结束游戏时写回
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import func, select, update
+from app import db
+from app.models.game import GameAnswer, GameSession
+from app.utils.answer_buffer import answer_buffer
+import redis
+from app.utils.cache import CacheError, redis_client, redis_errors
+
+logger = logging.getLogger(__name__)
+
+# 每次答题自增的会话计数
+COUNTERS = ('final_score', 'correct_answers', 'wrong_answers', 'time_used')
+# 玩家得分字段：score:<用户ID>
+SCORE_PREFIX = 'score:'
+
+
+def player_key(user_id):
+    """玩家得分字段名（players_data 中的用户ID可能是字符串，统一按字符串比较）"""
+    return f'{SCORE_PREFIX}{user_id}'
+
+
+class MemorySessionBackend:
+    """进程内会话存储，所有操作在同一把锁内完成"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hashes = {}  # 会话代码 -> {字段: 整数}
+        self._deadlines = {}  # 会话代码 -> 空闲超时时间
+    
+    def save(self, code, fields, deadline, replace=True):
+        """写入会话；replace 为 False 时存储中已有该会话则不覆盖，返回是否写入"""
+        with self._lock:
+            if not replace and code in self._hashes:
+                return False
+            self._hashes[code] = dict(fields)
+            self._deadlines[code] = deadline
+            return True
+    
+    def load(self, code):
+        with self._lock:
+            fields = self._hashes.get(code)
+            return None if fields is None else dict(fields)
+    
+    def increment(self, code, increments, deadline):
+        """按字段自增，返回自增后的值；会话不在存储中时返回 None"""
+        with self._lock:
+            fields = self._hashes.get(code)
+            if fields is None:
+                return None
+            for field, amount in increments.items():
+                fields[field] = fields.get(field, 0) + amount
+            self._deadlines[code] = deadline
+            return {field: fields[field] for field in increments}
+    
+    def due(self, now, limit):
+        """空闲超时的会话代码"""
+        with self._lock:
+            return [code for code, deadline in self._deadlines.items() if deadline <= now][:limit]
+    
+    def claim(self, code):
+        """从超时队列中取出会话，多个调用方同时取时只有一个成功"""
+        with self._lock:
+            return self._deadlines.pop(code, None) is not None
+    
+    def requeue(self, code, deadline):
+        """把会话放回超时队列"""
+        with self._lock:
+            if code in self._hashes:
+                self._deadlines[code] = deadline
+    
+    def delete_if_unchanged(self, code, fields):
+        """会话仍为 fields 时删除，返回是否删除（写回期间又有答题时保留）"""
+        with self._lock:
+            if self._hashes.get(code) != fields:
+                return False
+            self._hashes.pop(code, None)
+            self._deadlines.pop(code, None)
+            return True
+    
+    def delete(self, code):
+        with self._lock:
+            self._hashes.pop(code, None)
+            self._deadlines.pop(code, None)
+
+
+class RedisSessionBackend:
+    """
+    Redis 会话存储
+    
+    每个会话一个哈希（HINCRBY 按字段原子自增），另用一个有序集合按空闲超时时间索引会话；
+    哈希本身的过期时间 key_ttl 只是兜底，应明显长于空闲超时。
+    自增、恢复和清理都在 WATCH/MULTI/EXEC 事务中执行：只自增已存在且完整（含 session_id）的哈希，
+    清理只删除写回数据库后未再变化的哈希，键在事务期间被修改时重试
+    """
+    
+    MAX_RETRIES = 50
+    
+    def __init__(self, client, key_prefix='', key_ttl=86400):
+        self.client = client
+        self.prefix = f'{key_prefix}live_session:'
+        self.index = f'{key_prefix}live_sessions'
+        self.key_ttl = key_ttl
+    
+    def key(self, code):
+        return f'{self.prefix}{code}'
+    
+    def _transaction(self, key, check, queue):
+        """
+        WATCH 键后调用 check(pipe)，返回真值时在 MULTI/EXEC 中执行 queue(pipe) 排入的命令
+        
+        Returns:
+            tuple: (check 的结果, EXEC 的结果)；check 返回假值时 EXEC 的结果为 None
+        """
+        with redis_errors(), self.client.pipeline() as pipe:
+            for _ in range(self.MAX_RETRIES):
+                try:
+                    pipe.watch(key)
+                    checked = check(pipe)
+                    if not checked:
+                        return checked, None
+                    pipe.multi()
+                    queue(pipe)
+                    return checked, pipe.execute()
+                except redis.WatchError:
+                    continue
+        raise CacheError(f'更新会话 {key} 冲突次数过多')
+    
+    def _queue_save(self, pipe, code, fields, deadline):
+        key = self.key(code)
+        pipe.delete(key)
+        pipe.hset(key, mapping=fields)
+        pipe.expire(key, self.key_ttl)
+        pipe.zadd(self.index, {code: deadline})
+    
+    def save(self, code, fields, deadline, replace=True):
+        """写入会话；replace 为 False 时存储中已有该会话则不覆盖，返回是否写入"""
+        key = self.key(code)
+        if replace:
+            with redis_errors(), self.client.pipeline() as pipe:
+                self._queue_save(pipe, code, fields, deadline)
+                pipe.execute()
+            return True
+        missing, _ = self._transaction(key, lambda pipe: not pipe.hexists(key, 'session_id'),
+                                       lambda pipe: self._queue_save(pipe, code, fields, deadline))
+        return missing
+    
+    @staticmethod
+    def _decode(raw):
+        return {field.decode('utf-8'): int(value) for field, value in raw.items()} if raw else None
+    
+    def load(self, code):
+        with redis_errors():
+            return self._decode(self.client.hgetall(self.key(code)))
+    
+    def increment(self, code, increments, deadline):
+        """按字段自增，返回自增后的值；会话不在存储中时返回 None（不会新建残缺的哈希）"""
+        key = self.key(code)
+        fields = list(increments)
+        
+        def queue(pipe):
+            pipe.expire(key, self.key_ttl)
+            for field in fields:
+                pipe.hincrby(key, field, increments[field])
+            pipe.zadd(self.index, {code: deadline})
+        
+        complete, replies = self._transaction(key, lambda pipe: pipe.hexists(key, 'session_id'), queue)
+        if not complete:
+            return None
+        return dict(zip(fields, replies[1:-1]))
+    
+    def due(self, now, limit):
+        with redis_errors():
+            codes = self.client.zrangebyscore(self.index, '-inf', now, start=0, num=limit)
+        return [code.decode('utf-8') for code in codes]
+    
+    def claim(self, code):
+        with redis_errors():
+            return self.client.zrem(self.index, code) == 1
+    
+    def requeue(self, code, deadline):
+        with redis_errors():
+            self.client.zadd(self.index, {code: deadline})
+    
+    def delete_if_unchanged(self, code, fields):
+        key = self.key(code)
+        
+        def queue(pipe):
+            pipe.delete(key)
+            pipe.zrem(self.index, code)
+        
+        unchanged, _ = self._transaction(key, lambda pipe: self._decode(pipe.hgetall(key)) == fields, queue)
+        return unchanged
+    
+    def delete(self, code):
+        with redis_errors():
+            pipe = self.client.pipeline(transaction=False)
+            pipe.delete(self.key(code))
+            pipe.zrem(self.index, code)
+            pipe.execute()
+
+
+class LiveSessionStore:
+    """
+    进行中会话的状态存储
+    
+    状态字典包含 session_id、user_id（房主）、COUNTERS 中的计数和 scores（用户ID字符串 -> 得分）。
+    存储中没有某个进行中的会话时（重启、空闲超时已写回）从数据库行恢复
+    """
+    
+    def __init__(self):
+        self.app = None
+        self.backend = None
+        self.idle_timeout = 900
+        self.sweep_interval = 30
+        self.sweep_batch = 100
+        self.background_sweep = False
+        self._last_sweep = 0
+        self._lock = threading.Lock()
+        self._sweeper_pid = None
+    
+    def init_app(self, app):
+        """
+        配置项：LIVE_SESSION_STORE（memory / redis / database，为空时配置了 Redis 地址则用 redis，否则 database）、
+        LIVE_SESSION_REDIS_URL（默认使用 CACHE_REDIS_URL）、LIVE_SESSION_IDLE_TIMEOUT、LIVE_SESSION_SWEEP_INTERVAL
+        
+        Redis 中的哈希有过期时间，一段时间没有请求时也要写回，因此 redis 模式下另有后台线程定时清理
+        """
+        redis_url = app.config.get('LIVE_SESSION_REDIS_URL') or app.config.get('CACHE_REDIS_URL')
+        mode = app.config.get('LIVE_SESSION_STORE') or ('redis' if redis_url else 'database')
+        self.app = app
+        self.idle_timeout = app.config.get('LIVE_SESSION_IDLE_TIMEOUT', 900)
+        self.sweep_interval = app.config.get('LIVE_SESSION_SWEEP_INTERVAL', 30)
+        self.background_sweep = mode == 'redis'
+        self._last_sweep = 0
+        if mode == 'memory':
+            self.backend = MemorySessionBackend()
+        elif mode == 'redis':
+            self.backend = RedisSessionBackend(
+                redis_client(redis_url),
+                app.config.get('CACHE_KEY_PREFIX', ''),
+                max(self.idle_timeout * 4, app.config.get('LIVE_SESSION_KEY_TTL', 86400))
+            )
+        else:
+            self.backend = None
+    
+    @property
+    def enabled(self):
+        return self.backend is not None
+    
+    def _deadline(self):
+        return int(time.time()) + self.idle_timeout
+    
+    @staticmethod
+    def _fields(session):
+        fields = {'session_id': session.id, 'user_id': int(session.user_id)}
+        for counter in COUNTERS:
+            fields[counter] = getattr(session, counter) or 0
+        for player in session.get_players_data():
+            fields[player_key(player['user_id'])] = player.get('score') or 0
+        return fields
+    
+    @staticmethod
+    def _state(fields):
+        state = {'scores': {}}
+        for field, value in fields.items():
+            if field.startswith(SCORE_PREFIX):
+                state['scores'][field[len(SCORE_PREFIX):]] = value
+            else:
+                state[field] = value
+        return state
+    
+    def start(self, session):
+        """
+        开始游戏后把会话放入存储（存储不可用时只记录日志，第一次答题时再从数据库恢复）
+        
+        Returns:
+            dict: 状态，未启用或写入失败时为 None
+        """
+        if not self.enabled:
+            return None
+        fields = self._fields(session)
+        try:
+            self.backend.save(session.session_code, fields, self._deadline())
+        except CacheError as e:
+            logger.warning('写入进行中会话 %s 失败: %s', session.session_code, e)
+            return None
+        self.maybe_sweep()
+        return self._state(fields)
+    
+    def get(self, code):
+        """进行中会话的状态，不在存储中（或未启用存储）时返回 None"""
+        if not self.enabled:
+            return None
+        fields = self.backend.load(code)
+        return None if fields is None else self._state(fields)
+    
+    def resume(self, session):
+        """
+        从数据库行恢复进行中会话的状态（未启用存储时直接返回数据库中的值）
+        
+        其他请求已先恢复时不覆盖存储中的状态（否则会丢掉它之后记录的答题）
+        """
+        fields = self._fields(session)
+        if self.enabled:
+            self.backend.save(session.session_code, fields, self._deadline(), replace=False)
+        return self._state(fields)
+    
+    def record_answer(self, code, session_id, user_id, word_id, is_correct, score, time_used=0):
+        """
+        记录一次答题：计数、总分和答题玩家的得分按字段原子自增，答题记录追加到写后缓冲
+        （未启用存储时与会话行的自增在同一事务中插入）
+        
+        Args:
+            session_id (int): 会话ID
+            word_id (int): 答题的单词ID
+            time_used: 答题用时（秒）
+        
+        Returns:
+            dict: 答题后的 COUNTERS 计数，会话已不在进行中时返回 None
+        """
+        increments = {
+            'final_score': int(score),
+            'correct_answers': 1 if is_correct else 0,
+            'wrong_answers': 0 if is_correct else 1,
+            'time_used': int(time_used)
+        }
+        answer = (session_id, user_id, word_id, is_correct, int(score), int(time_used * 1000) if time_used else None)
+        if not self.enabled:
+            return self._record_in_database(session_id, increments, answer)
+        totals = self._record_in_store(code, user_id, increments)
+        if totals is None:
+            return None
+        try:
+            answer_buffer.add(*answer)
+        except Exception:
+            # 答题记录未写入（立即写入模式），撤销计数，客户端重试时不会重复计分
+            self.backend.increment(code, {field: -amount for field, amount in
+                                          self._store_increments(user_id, increments).items()}, self._deadline())
+            raise
+        return totals
+    
+    @staticmethod
+    def _store_increments(user_id, increments):
+        # 不是玩家的用户的得分字段写回时忽略
+        return {**increments, player_key(user_id): increments['final_score']}
+    
+    def _record_in_store(self, code, user_id, increments):
+        increments = self._store_increments(user_id, increments)
+        totals = self.backend.increment(code, increments, self._deadline())
+        if totals is None:
+            # 刚被空闲清理写回数据库（或存储已重启），从数据库恢复后再记
+            session = GameSession.query.filter_by(session_code=code).first()
+            if session is None or session.status != 'playing':
+                return None
+            self.resume(session)
+            totals = self.backend.increment(code, increments, self._deadline())
+        self.maybe_sweep()
+        return None if totals is None else {counter: totals[counter] for counter in COUNTERS}
+    
+    @staticmethod
+    def _record_in_database(session_id, increments, answer):
+        """
+        未启用存储：在一个事务中自增会话行的计数（col = col + 增量，只更新进行中的会话）、插入答题记录并读回计数
+        
+        自增由数据库原子执行，各工作进程的答题都计入同一行，返回的计数包含此前所有已确认的答题
+        """
+        try:
+            result = db.session.execute(
+                update(GameSession)
+                .where(GameSession.id == session_id, GameSession.status == 'playing')
+                .values({counter: func.coalesce(getattr(GameSession, counter), 0) + increments[counter]
+                         for counter in COUNTERS})
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 0:
+                db.session.rollback()
+                return None
+            answer_buffer.add(*answer, immediate=True)
+            totals = db.session.execute(
+                select(*(getattr(GameSession, counter) for counter in COUNTERS)).where(GameSession.id == session_id)
+            ).one()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return dict(zip(COUNTERS, totals))
+    
+    @staticmethod
+    def derive(session, lock=False):
+        """
+        数据库模式下会话的状态：计数取自会话行（答题时已原子自增），玩家得分为会话行中已保存的得分
+        加上 game_answers 中该玩家答题得分的和
+        
+        Args:
+            lock (bool): 用锁定读取（FOR UPDATE）重新读取会话行和答题记录，读到最新提交的数据（结束游戏时使用）
+        
+        Returns:
+            dict: 状态，格式同 get()
+        """
+        answers = select(GameAnswer.user_id, GameAnswer.score).where(GameAnswer.session_id == session.id)
+        if lock:
+            db.session.query(GameSession).filter(GameSession.id == session.id) \
+                .with_for_update().populate_existing().one()
+            answers = answers.with_for_update()
+        
+        state = {'session_id': session.id, 'user_id': session.user_id, 'scores': {
+            str(player['user_id']): player.get('score') or 0 for player in session.get_players_data()
+        }}
+        for counter in COUNTERS:
+            state[counter] = getattr(session, counter) or 0
+        for user_id, score in db.session.execute(answers):
+            state['scores'][str(user_id)] = state['scores'].get(str(user_id), 0) + score
+        return state
+    
+    @staticmethod
+    def apply(session, state):
+        """把状态写回会话对象（由调用方提交）"""
+        for counter in COUNTERS:
+            setattr(session, counter, state[counter])
+        if state['scores']:
+            players_data = session.get_players_data()
+            for player in players_data:
+                player['score'] = state['scores'].get(str(player['user_id']), player.get('score', 0))
+            session.set_players_data(players_data)
+    
+    def finalize(self, session):
+        """
+        结束游戏前把实时状态（未启用存储时为会话行的计数和答题记录的汇总）写到会话对象上（由调用方提交）
+        
+        未启用存储时先更新会话行取得写锁（MySQL 等为行锁，SQLite 为数据库写锁），再用锁定读取汇总：
+        并发的答题要等结束游戏提交后才能自增，届时发现会话已结束而返回 None（客户端收到“游戏未在进行中”），
+        已确认的答题都已随计数提交，都会计入汇总
+        """
+        if not self.enabled:
+            db.session.execute(
+                update(GameSession).where(GameSession.id == session.id).values(updated_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            self.apply(session, self.derive(session, lock=True))
+            return
+        state = self.get(session.session_code)
+        if state is not None:
+            self.apply(session, state)
+    
+    def discard(self, code):
+        """游戏结束（已写回数据库）后删除状态"""
+        if self.enabled:
+            self.backend.delete(code)
+    
+    def _live_state(self, session):
+        """进行中会话的实时状态；未启用存储时取自会话行和答题记录"""
+        if session.status != 'playing':
+            return None
+        if self.enabled:
+            return self.get(session.session_code)
+        return self.derive(session)
+    
+    def to_dict(self, session):
+        """会话的 to_dict()，进行中时计数和准确率取自实时状态（不修改会话对象）"""
+        data = session.to_dict()
+        state = self._live_state(session)
+        if state is not None:
+            for counter in COUNTERS:
+                data[counter] = state[counter]
+            total = state['correct_answers'] + state['wrong_answers']
+            data['accuracy'] = round(state['correct_answers'] / total * 100, 2) if total else 0
+        return data
+    
+    def players(self, session):
+        """玩家列表，进行中时得分取自实时状态"""
+        players_data = session.get_players_data()
+        state = self._live_state(session)
+        if state is not None:
+            for player in players_data:
+                player['score'] = state['scores'].get(str(player['user_id']), player.get('score', 0))
+        return players_data
+    
+    def maybe_sweep(self):
+        """每个进程每隔 sweep_interval 秒最多清理一次空闲超时的会话"""
+        self.ensure_sweeper()
+        now = time.time()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        try:
+            self.sweep()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning('清理空闲游戏会话失败: %s', e)
+    
+    def ensure_sweeper(self):
+        """在当前进程中启动定时清理线程（fork 后的进程不继承父进程的线程）"""
+        if not self.background_sweep or self._sweeper_pid == os.getpid():
+            return
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+            threading.Thread(target=self._run_sweeper, args=(self._sweeper_pid,), name='live-session-sweeper',
+                             daemon=True).start()
+    
+    def _run_sweeper(self, pid):
+        while self._sweeper_pid == pid:
+            time.sleep(self.sweep_interval)
+            self._last_sweep = time.time()
+            with self.app.app_context():
+                try:
+                    self.sweep()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.warning('清理空闲游戏会话失败: %s', e)
+                finally:
+                    db.session.remove()
+    
+    def sweep(self, now=None):
+        """
+        把空闲超时的会话写回数据库并从存储中删除（游戏状态保持 playing，再次答题时重新载入）
+        
+        写回期间又有答题时保留存储中的状态（答题时已重新加入超时队列），不会丢失这次答题
+        
+        Returns:
+            int: 写回的会话数
+        """
+        if not self.enabled:
+            return 0
+        now = int(time.time()) if now is None else now
+        persisted = 0
+        for code in self.backend.due(now, self.sweep_batch):
+            if not self.backend.claim(code):
+                continue
+            fields = self.backend.load(code)
+            if fields is None:
+                continue
+            try:
+                session = GameSession.query.filter_by(session_code=code).first()
+                if session is not None and session.status == 'playing':
+                    self.apply(session, self._state(fields))
+                    db.session.commit()
+                    persisted += 1
+            except Exception:
+                db.session.rollback()
+                # 放回超时队列，下次清理时重试
+                self.backend.requeue(code, now)
+                raise
+            self.backend.delete_if_unchanged(code, fields)
+        return persisted
+
+
+live_sessions = LiveSessionStore()
@@ -0,0 +1,119 @@
+"""
+游标（keyset）分页工具
+按排序列的值定位下一页，避免 OFFSET 扫描和每页的 COUNT(*)
+"""
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, func, literal, or_
+
+
+# 可为空的排序列按类型的默认值比较和排序（NULL 与任何值比较都不成立，翻页时会漏掉整段记录）
+NULL_SORT_VALUES = {int: 0, float: 0, str: '', datetime: datetime(1970, 1, 1)}
+
+
+class InvalidCursorError(ValueError):
+    """游标格式不正确"""
+
+
+def encode_cursor(values):
+    """把排序列的值编码为不透明游标"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """
+    解码游标
+
+    Args:
+        cursor (str): encode_cursor 生成的游标
+        columns (list): (列, 是否降序) 列表，用于还原值的类型
+
+    Returns:
+        list: 排序列的值
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursorError('无效的分页游标')
+
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise InvalidCursorError('无效的分页游标')
+
+    decoded = []
+    for value, (column, _) in zip(values, columns):
+        if value is not None and column.type.python_type is datetime:
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise InvalidCursorError('无效的分页游标')
+        decoded.append(value)
+    return decoded
+
+
+def _sort_key(column):
+    """
+    排序和比较使用的表达式
+
+    Returns:
+        tuple: (表达式, NULL 的替代值)；不可为空的列替代值为 None
+    """
+    if not column.nullable:
+        return column, None
+    try:
+        fallback = NULL_SORT_VALUES[column.type.python_type]
+    except KeyError:
+        raise ValueError(f'可为空的列 {column.key} 不能作为游标分页的排序列')
+    return func.coalesce(column, literal(fallback, column.type)), fallback
+
+
+def _after(columns, values):
+    """构造“排在游标之后”的过滤条件，支持升降序混合"""
+    clauses = []
+    for i, (column, descending) in enumerate(columns):
+        equals = [columns[j][0] == values[j] for j in range(i)]
+        step = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equals, step))
+    return or_(*clauses)
+
+
+def keyset_paginate(query, columns, cursor, per_page):
+    """
+    游标分页
+
+    Args:
+        query: 未排序的查询
+        columns (list): (列, 是否降序) 列表，最后一列必须唯一（通常是主键）
+        cursor (str): 上一页返回的游标，空字符串表示第一页
+        per_page (int): 每页数量（至少为 1）
+
+    Returns:
+        tuple: (本页记录, 分页信息字典)
+    """
+    per_page = max(per_page, 1)
+    keys = [_sort_key(column) for column, _ in columns]
+    sort_columns = [(key, descending) for (key, _), (_, descending) in zip(keys, columns)]
+    if cursor:
+        query = query.filter(_after(sort_columns, decode_cursor(cursor, columns)))
+
+    query = query.order_by(*[key.desc() if descending else key.asc() for key, descending in sort_columns])
+    items = query.limit(per_page + 1).all()
+
+    has_next = len(items) > per_page
+    items = items[:per_page]
+    next_cursor = None
+    if has_next:
+        last = items[-1]
+        values = [getattr(last, column.key) for column, _ in columns]
+        next_cursor = encode_cursor([fallback if value is None else value
+                                     for value, (_, fallback) in zip(values, keys)])
+
+    return items, {
+        'per_page': per_page,
+        'cursor': cursor or None,
+        'next_cursor': next_cursor,
+        'has_next': has_next
+    }
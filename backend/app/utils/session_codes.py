@@ -0,0 +1,112 @@
+"""
+游戏会话代码分配
+会话代码由进程内生成的序号经带密钥的置换（Feistel 网络 + 循环行走）得到：不同序号的代码一定不同，
+没有密钥无法从一个代码推出相邻的代码，分配时不需要查询数据库。
+每个进程从 [0, CODE_SPACE) 中随机选择起点后依次递增：同一进程内不会重复，两个进程的序号区间
+重叠的概率约为（两者分配的代码数之和 / CODE_SPACE），远小于固定位数的进程标识相撞的概率；
+偶尔的冲突由 session_code 的唯一索引兜底，只在写入冲突时换一个代码重试
+"""
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import string
+import threading
+from sqlalchemy.exc import IntegrityError
+from app import db
+
+logger = logging.getLogger(__name__)
+
+ALPHABET = string.ascii_uppercase + string.digits
+CODE_LENGTH = 8
+CODE_SPACE = len(ALPHABET) ** CODE_LENGTH  # 约 2^41.4
+
+# 配置文件中 SECRET_KEY 的默认值（公开在仓库中，不能作为置换的密钥）
+PUBLIC_SECRET_KEYS = ('explode-word-secret-key-2024',)
+
+HALF_BITS = 21  # Feistel 网络每半的位数（2 × 21 位覆盖 CODE_SPACE）
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 4
+
+
+def encode(number):
+    """整数 -> 定长的大写字母数字代码"""
+    chars = []
+    for _ in range(CODE_LENGTH):
+        number, index = divmod(number, len(ALPHABET))
+        chars.append(ALPHABET[index])
+    return ''.join(reversed(chars))
+
+
+def permute(key, number):
+    """
+    [0, CODE_SPACE) 上的带密钥置换
+    
+    42 位的 Feistel 网络本身是一一映射，结果超出 CODE_SPACE 时继续置换（循环行走），平均不到两次
+    """
+    while True:
+        left, right = number >> HALF_BITS, number & HALF_MASK
+        for round_no in range(ROUNDS):
+            digest = hmac.new(key, b'%d:%d' % (round_no, right), hashlib.sha256).digest()
+            left, right = right, left ^ (int.from_bytes(digest[:4], 'big') & HALF_MASK)
+        number = (left << HALF_BITS) | right
+        if number < CODE_SPACE:
+            return number
+
+
+class SessionCodeAllocator:
+    """会话代码分配器（每个进程一个序号生成器，fork 后重新选择起点）"""
+    
+    def __init__(self):
+        self.key = b''
+        self.max_attempts = 5
+        self._lock = threading.Lock()
+        self._pid = None
+        self._next = 0
+    
+    def init_app(self, app):
+        """
+        配置项：SESSION_CODE_KEY（默认使用 SECRET_KEY）
+        
+        两者都未配置（SECRET_KEY 为公开的默认值）时每个进程使用随机密钥，并记录警告
+        """
+        key = app.config.get('SESSION_CODE_KEY') or app.config['SECRET_KEY']
+        if key in PUBLIC_SECRET_KEYS:
+            logger.warning('未配置 SESSION_CODE_KEY 或 SECRET_KEY，游戏会话代码使用随机生成的密钥')
+            self.key = secrets.token_bytes(32)
+        else:
+            self.key = key.encode('utf-8')
+    
+    def _sequence(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._next = secrets.randbelow(CODE_SPACE)
+            sequence = self._next
+            self._next = (self._next + 1) % CODE_SPACE
+            return sequence
+    
+    def next_code(self):
+        """分配一个会话代码"""
+        return encode(permute(self.key, self._sequence()))
+    
+    def add(self, session):
+        """
+        为会话分配代码并写入（在保存点中 flush，由调用方提交）
+        
+        只在写入冲突（唯一索引）时换一个代码重试，不影响同一事务中的其他修改
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            session.session_code = self.next_code()
+            try:
+                with db.session.begin_nested():
+                    db.session.add(session)
+            except IntegrityError:
+                if attempt == self.max_attempts:
+                    raise
+                continue
+            return session
+
+
+session_codes = SessionCodeAllocator()
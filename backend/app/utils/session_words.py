@@ -0,0 +1,38 @@
+"""
+游戏会话单词缓存
+开始游戏后会话的单词列表不再变化，按单词ID建立索引后缓存在每个工作进程中（配置了共享缓存时也写入 Redis），
+答题校验按ID直接查找，不再每次解析整个 words_data 并逐个比较
+"""
+from app.utils.cache import Cache
+
+session_words_cache = Cache('session_words', max_bytes=16 * 1024 * 1024, ttl=3600)
+
+
+def _key(session):
+    # 会话ID可能在删除后被复用，加上会话代码区分
+    return (session.id, session.session_code)
+
+
+def index_words(words_data):
+    """单词ID -> 单词（键为字符串，与共享缓存中 JSON 的键一致）"""
+    return {str(word['id']): word for word in words_data}
+
+
+def cache_session_words(session, words_data):
+    """开始游戏时直接缓存已有的单词列表"""
+    session_words_cache.set(_key(session), index_words(words_data))
+
+
+def get_session_word(session, word_id):
+    """
+    按ID查找会话中的单词
+    
+    缓存未命中时才读取并解析 words_data（查询会话时可 defer 该列）
+    
+    Returns:
+        dict: 单词，不在会话中时返回 None
+    """
+    if isinstance(word_id, bool) or not isinstance(word_id, int):
+        return None
+    words = session_words_cache.get_or_set(_key(session), lambda: index_words(session.get_words_data()))
+    return words.get(str(word_id))
@@ -0,0 +1,59 @@
+"""
+用户数据缓存
+缓存排行榜和用户档案，用户统计写入或游戏结束的事务提交后在所有工作进程中失效
+"""
+from sqlalchemy import event
+from app import db
+from app.models.user import User
+from app.utils.cache import Cache
+
+PENDING_KEY = 'user_cache_changes'
+
+# 排行榜排序方式，每种只缓存前 LEADERBOARD_CACHE_SIZE 名
+LEADERBOARD_SORTS = ('best_score', 'total_wins', 'win_rate')
+LEADERBOARD_CACHE_SIZE = 100
+
+user_cache = Cache('users', max_bytes=16 * 1024 * 1024, ttl=60)
+
+
+def leaderboard_key(sort_by):
+    return ('leaderboard', sort_by)
+
+
+def profile_key(user_id):
+    return ('profile', user_id)
+
+
+def invalidate_profile(user_id):
+    """
+    游戏结束时调用（提交前）：事务提交后失效该用户的档案缓存
+    
+    档案只统计已结束的游戏，进行中的会话写入答题时不需要失效
+    """
+    db.session.info.setdefault(PENDING_KEY, set()).add(profile_key(user_id))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_user_changes(session, flush_context):
+    """记录统计发生变化的用户，提交后再失效排行榜和档案缓存"""
+    keys = set()
+    for obj in session.dirty | session.deleted:
+        if isinstance(obj, User):
+            keys.add(profile_key(obj.id))
+            keys.update(leaderboard_key(sort_by) for sort_by in LEADERBOARD_SORTS)
+    if keys:
+        session.info.setdefault(PENDING_KEY, set()).update(keys)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_user_changes(session):
+    """事务提交后失效相关缓存"""
+    keys = session.info.pop(PENDING_KEY, None)
+    if keys:
+        user_cache.invalidate(*keys)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_user_changes(session):
+    """事务回滚时丢弃未提交的变更"""
+    session.info.pop(PENDING_KEY, None)
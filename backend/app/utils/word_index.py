@@ -0,0 +1,217 @@
+"""
+进程内单词前缀索引
+按规范化单词排序的数组（全部单词一份、每个词组一份），二分查找实现输入联想，不访问数据库。
+只收录启用的单词；单词写入提交后把单词ID广播给其他工作进程（配置了 CACHE_REDIS_URL 时），
+各进程在下次查询前按ID重新读取这些单词
+"""
+import logging
+import threading
+from bisect import bisect_left, insort
+from sqlalchemy import event, inspect, or_
+from app import db
+from app.models.vocabulary import VocabularyWord
+from app.utils.cache import CacheError, bus_subscribers
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'word_index_changes'
+MESSAGE_PREFIX = 'word_index:'
+REBUILD_MESSAGE = 'word_index:*'
+MAX_REFRESH_IDS = 5000  # 待刷新的单词超过该数量时直接重建
+
+
+def normalize_word(word):
+    """规范化单词：去掉首尾空白并转为小写"""
+    return (word or '').strip().casefold()
+
+
+def _is_active(is_active):
+    """is_active 为空的旧数据视为启用"""
+    return is_active is None or bool(is_active)
+
+
+def _remove_entry(entries, entry):
+    i = bisect_left(entries, entry)
+    if i < len(entries) and entries[i] == entry:
+        del entries[i]
+
+
+class SortedWordIndex:
+    """按 (规范化单词, 单词ID) 排序的前缀索引"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = None  # [(normalized, id, group_id, word)]，None 表示尚未构建
+        self._groups = {}  # group_id -> 该词组的有序条目
+        self._by_id = {}
+        self._stale_ids = set()  # 其他事务或工作进程修改过、需要重新读取的单词
+        self.bus = None
+    
+    def configure(self, bus=None):
+        """设置失效广播（cache.init_app 调用），并丢弃已构建的索引"""
+        self.bus = bus
+        if bus is not None:
+            bus.add_listener(self._on_invalidate)
+        self._reset()
+    
+    @property
+    def is_built(self):
+        return self._entries is not None
+    
+    def _build(self):
+        """从数据库加载全部启用的单词（只在首次查询或失效后执行）"""
+        rows = db.session.query(VocabularyWord.id, VocabularyWord.word, VocabularyWord.group_id).filter(
+            or_(VocabularyWord.is_active.is_(None), VocabularyWord.is_active == True)
+        ).all()
+        entries = sorted((normalize_word(word), word_id, group_id, word) for word_id, word, group_id in rows)
+        self._by_id = {entry[1]: entry for entry in entries}
+        self._groups = {}
+        for entry in entries:
+            self._groups.setdefault(entry[2], []).append(entry)
+        self._entries = entries
+        self._stale_ids = set()
+    
+    def _refresh(self):
+        """重新读取待刷新的单词（已删除或停用的从索引中移除）"""
+        ids, self._stale_ids = list(self._stale_ids), set()
+        rows = db.session.query(
+            VocabularyWord.id, VocabularyWord.word, VocabularyWord.group_id, VocabularyWord.is_active
+        ).filter(VocabularyWord.id.in_(ids)).all()
+        for word_id in ids:
+            self._remove(word_id)
+        for word_id, word, group_id, is_active in rows:
+            if _is_active(is_active):
+                self._add(word_id, word, group_id)
+    
+    def suggest(self, prefix, limit=10, group_id=None):
+        """
+        前缀联想
+        
+        Args:
+            prefix (str): 输入的前缀
+            limit (int): 最多返回的数量
+            group_id (int): 只返回指定词组的单词
+        
+        Returns:
+            list: [(单词ID, 单词, 词组ID)]
+        """
+        prefix = normalize_word(prefix)
+        if not prefix:
+            return []
+        if self.bus is not None:
+            # 索引依赖失效广播，读取前确保本进程已订阅
+            self.bus.ensure_started()
+        
+        with self._lock:
+            if self._entries is None:
+                self._build()
+            elif self._stale_ids:
+                self._refresh()
+            entries = self._entries if group_id is None else self._groups.get(group_id, [])
+            results = []
+            i = bisect_left(entries, (prefix,))
+            while i < len(entries) and len(results) < limit:
+                normalized, word_id, entry_group_id, word = entries[i]
+                if not normalized.startswith(prefix):
+                    break
+                results.append((word_id, word, entry_group_id))
+                i += 1
+            return results
+    
+    def refresh(self, word_ids):
+        """标记单词需要重新读取，并通知其他工作进程（单词写入提交后调用）"""
+        word_ids = list(word_ids)
+        if not word_ids:
+            return
+        if len(word_ids) > MAX_REFRESH_IDS:
+            self.invalidate()
+            return
+        self._mark_stale(word_ids)
+        self._publish([f'{MESSAGE_PREFIX}{word_id}' for word_id in word_ids])
+    
+    def invalidate(self):
+        """丢弃所有工作进程的索引，下次查询时重新构建（批量 SQL 修改单词后调用）"""
+        self._reset()
+        self._publish([REBUILD_MESSAGE])
+    
+    def _add(self, word_id, word, group_id):
+        entry = (normalize_word(word), word_id, group_id, word)
+        insort(self._entries, entry)
+        insort(self._groups.setdefault(group_id, []), entry)
+        self._by_id[word_id] = entry
+    
+    def _remove(self, word_id):
+        entry = self._by_id.pop(word_id, None)
+        if entry is not None:
+            _remove_entry(self._entries, entry)
+            group_entries = self._groups.get(entry[2])
+            if group_entries is not None:
+                _remove_entry(group_entries, entry)
+                if not group_entries:
+                    del self._groups[entry[2]]
+    
+    def _mark_stale(self, word_ids):
+        with self._lock:
+            if self._entries is None:
+                return
+            self._stale_ids.update(word_ids)
+            if len(self._stale_ids) > MAX_REFRESH_IDS:
+                self._entries = None
+    
+    def _reset(self):
+        with self._lock:
+            self._entries = None
+            self._groups = {}
+            self._by_id = {}
+            self._stale_ids = set()
+    
+    def _publish(self, keys):
+        if self.bus is None:
+            return
+        try:
+            self.bus.publish(keys)
+        except CacheError as e:
+            logger.warning('广播单词索引失效失败: %s', e)
+    
+    def _on_invalidate(self, keys):
+        """其他工作进程的失效消息（None 表示订阅断线重连，可能漏掉了消息）"""
+        if keys is None or REBUILD_MESSAGE in keys:
+            self._reset()
+            return
+        word_ids = [int(key[len(MESSAGE_PREFIX):]) for key in keys if key.startswith(MESSAGE_PREFIX)]
+        if word_ids:
+            self._mark_stale(word_ids)
+
+
+word_index = SortedWordIndex()
+bus_subscribers.append(word_index)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_word_changes(session, flush_context):
+    """记录本次事务中单词的增删改，提交后再同步到索引"""
+    changes = set()
+    for obj in session.new | session.deleted:
+        if isinstance(obj, VocabularyWord):
+            changes.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, VocabularyWord):
+            attrs = inspect(obj).attrs
+            if any(attrs[name].history.has_changes() for name in ('word', 'group_id', 'is_active')):
+                changes.add(obj.id)
+    if changes:
+        session.info.setdefault(PENDING_KEY, set()).update(changes)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_word_changes(session):
+    """事务提交后刷新索引中被修改的单词（包括其他工作进程）"""
+    word_ids = session.info.pop(PENDING_KEY, None)
+    if word_ids:
+        word_index.refresh(word_ids)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_word_changes(session):
+    """事务回滚时丢弃未提交的单词变更"""
+    session.info.pop(PENDING_KEY, None)
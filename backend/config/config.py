@@ -3,6 +3,7 @@
 支持 SQLite（默认）和 MySQL 数据库配置
 """
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -73,6 +74,45 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_RECORD_QUERIES = True
     
+    # 缓存配置：每个工作进程有容量按字节计算的进程内缓存；
+    # 配置 CACHE_REDIS_URL 后增加多进程共享的 Redis 缓存，并通过发布订阅广播失效
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')  # 如 redis://localhost:6379/0
+    CACHE_KEY_PREFIX = os.environ.get('CACHE_KEY_PREFIX', 'explode_word:')
+    CATALOG_CACHE_MAX_BYTES = int(os.environ.get('CATALOG_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 300))  # 秒
+    USERS_CACHE_MAX_BYTES = int(os.environ.get('USERS_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+    USERS_CACHE_TTL = int(os.environ.get('USERS_CACHE_TTL', 60))  # 秒
+    SESSION_WORDS_CACHE_MAX_BYTES = int(os.environ.get('SESSION_WORDS_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+    SESSION_WORDS_CACHE_TTL = int(os.environ.get('SESSION_WORDS_CACHE_TTL', 3600))  # 秒
+    
+    # 单词导入：每块插入并提交的行数
+    VOCABULARY_IMPORT_CHUNK_SIZE = int(os.environ.get('VOCABULARY_IMPORT_CHUNK_SIZE', 1000))
+    
+    # 后台导入任务：每个工作进程的线程数、全局进行中任务上限、心跳超时（秒，超时后由其他进程接手）
+    IMPORT_JOB_WORKERS = int(os.environ.get('IMPORT_JOB_WORKERS', 2))
+    IMPORT_JOB_MAX_ACTIVE = int(os.environ.get('IMPORT_JOB_MAX_ACTIVE', 20))
+    IMPORT_JOB_HEARTBEAT_TIMEOUT = int(os.environ.get('IMPORT_JOB_HEARTBEAT_TIMEOUT', 120))
+    IMPORT_JOB_MAX_ATTEMPTS = int(os.environ.get('IMPORT_JOB_MAX_ATTEMPTS', 3))
+    # 上传文件保存目录，多台服务器部署时需使用共享存储
+    IMPORT_JOB_DIR = os.environ.get('IMPORT_JOB_DIR') or str(basedir / 'uploads' / 'import_jobs')
+    
+    # 进行中游戏会话的状态存储：redis（多个工作进程共享）、memory（只适用于单进程）或 database（每次答题在会话行上
+    # 原子自增计数并同步写入答题记录），为空时配置了 Redis 地址则用 redis，否则 database；空闲超时（秒）后写回数据库。
+    # database 模式在多个工作进程下计数也一致，但每次答题都要写会话行；多工作进程部署应配置
+    # LIVE_SESSION_REDIS_URL 或 CACHE_REDIS_URL，答题只做 Redis 中的自增，答题记录批量写入
+    LIVE_SESSION_STORE = os.environ.get('LIVE_SESSION_STORE')
+    LIVE_SESSION_REDIS_URL = os.environ.get('LIVE_SESSION_REDIS_URL')  # 默认使用 CACHE_REDIS_URL
+    LIVE_SESSION_IDLE_TIMEOUT = int(os.environ.get('LIVE_SESSION_IDLE_TIMEOUT', 900))
+    LIVE_SESSION_SWEEP_INTERVAL = int(os.environ.get('LIVE_SESSION_SWEEP_INTERVAL', 30))
+    # 答题记录写后缓冲：每隔多少毫秒或累计多少条答题记录批量插入 game_answers，
+    # 工作进程崩溃时最多丢失一个间隔内的答题；为 0 时每次答题立即写入
+    ANSWER_BUFFER_INTERVAL_MS = int(os.environ.get('ANSWER_BUFFER_INTERVAL_MS', 200))
+    ANSWER_BUFFER_MAX_EVENTS = int(os.environ.get('ANSWER_BUFFER_MAX_EVENTS', 100))
+    # 数据库持续不可用时缓冲区最多保留的答题记录数，超出时丢弃最早的记录
+    ANSWER_BUFFER_MAX_PENDING = int(os.environ.get('ANSWER_BUFFER_MAX_PENDING', 10000))
+    # 游戏会话代码置换的密钥，为空时使用 SECRET_KEY（SECRET_KEY 也是默认值时每个进程随机生成）
+    SESSION_CODE_KEY = os.environ.get('SESSION_CODE_KEY')
+    
     # 默认数据库URI，会在init_app中动态更新
     SQLALCHEMY_DATABASE_URI = f'sqlite:///{str(basedir / "explode_word.db")}'
     
@@ -161,6 +201,11 @@ class TestingConfig(Config):
     # 测试环境使用内存数据库
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     JWT_ACCESS_TOKEN_EXPIRES = 60  # 测试时短一些
+    CACHE_REDIS_URL = None  # 测试只使用进程内缓存
+    IMPORT_JOB_WORKERS = 0  # 测试时导入任务在请求中同步执行
+    IMPORT_JOB_DIR = os.path.join(tempfile.gettempdir(), 'explode_word_import_jobs')
+    LIVE_SESSION_STORE = 'memory'  # 测试在单进程中运行
+    ANSWER_BUFFER_INTERVAL_MS = 0  # 测试时答题立即写入
 
 
 # 配置字典
@@ -0,0 +1,33 @@
+"""添加中文 n-gram 倒排索引表
+
+Revision ID: add_cjk_grams
+Revises: add_fulltext_indexes
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_cjk_grams'
+down_revision = 'add_fulltext_indexes'
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cjk_grams',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source', sa.String(length=50), nullable=False),
+        sa.Column('record_id', sa.Integer(), nullable=False),
+        sa.Column('gram', sa.String(length=2), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_cjk_grams_lookup', 'cjk_grams', ['source', 'gram', 'record_id'])
+    op.create_index('ix_cjk_grams_record', 'cjk_grams', ['source', 'record_id'])
+    # 现有数据的索引通过 scripts/rebuild_search_index.py 生成
+
+
+def downgrade():
+    op.drop_index('ix_cjk_grams_record', table_name='cjk_grams')
+    op.drop_index('ix_cjk_grams_lookup', table_name='cjk_grams')
+    op.drop_table('cjk_grams')
@@ -0,0 +1,24 @@
+"""为词库和词组添加内容版本号
+
+Revision ID: add_content_versions
+Revises: add_tag_tables
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_content_versions'
+down_revision = 'add_tag_tables'
+depends_on = None
+
+
+def upgrade():
+    op.add_column('vocabulary_libraries', sa.Column('content_version', sa.Integer(), nullable=False, server_default='1'))
+    op.add_column('word_groups', sa.Column('content_version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    op.drop_column('word_groups', 'content_version')
+    op.drop_column('vocabulary_libraries', 'content_version')
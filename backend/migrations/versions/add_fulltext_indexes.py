@@ -0,0 +1,34 @@
+"""为单词表添加全文索引
+
+Revision ID: add_fulltext_indexes
+Revises: add_vocabulary_counters
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+from app.utils.fulltext import fulltext_ddl, fulltext_drop_ddl
+
+# revision identifiers, used by Alembic.
+revision = 'add_fulltext_indexes'
+down_revision = 'add_vocabulary_counters'
+depends_on = None
+
+FULLTEXT_TABLES = {
+    'vocabulary_words': ['word', 'translation'],
+    'words': ['word', 'translation'],
+}
+
+
+def upgrade():
+    dialect_name = op.get_bind().dialect.name
+    for table_name, columns in FULLTEXT_TABLES.items():
+        # SQLite 建表后会执行 rebuild，把现有数据写入索引
+        for statement in fulltext_ddl(dialect_name, table_name, columns):
+            op.execute(statement)
+
+
+def downgrade():
+    dialect_name = op.get_bind().dialect.name
+    for table_name in FULLTEXT_TABLES:
+        for statement in fulltext_drop_ddl(dialect_name, table_name):
+            op.execute(statement)
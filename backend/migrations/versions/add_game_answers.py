@@ -0,0 +1,38 @@
+"""添加答题记录表
+
+Revision ID: add_game_answers
+Revises: add_word_unique_index
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_game_answers'
+down_revision = 'add_word_unique_index'
+depends_on = None
+
+
+def upgrade():
+    op.create_table('game_answers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('session_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('word_id', sa.Integer(), nullable=True),
+        sa.Column('correct', sa.Boolean(), nullable=False),
+        sa.Column('score', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('latency_ms', sa.Integer(), nullable=True),
+        sa.Column('ts', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['session_id'], ['game_sessions.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_game_answers_session', 'game_answers', ['session_id', 'user_id'])
+    op.create_index('ix_game_answers_user_word', 'game_answers', ['user_id', 'word_id', 'ts'])
+
+
+def downgrade():
+    op.drop_index('ix_game_answers_user_word', table_name='game_answers')
+    op.drop_index('ix_game_answers_session', table_name='game_answers')
+    op.drop_table('game_answers')
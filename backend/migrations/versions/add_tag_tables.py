@@ -0,0 +1,66 @@
+"""添加标签表和标签关联表，并从逗号分隔的 tags 字段迁移数据
+
+Revision ID: add_tag_tables
+Revises: add_cjk_grams
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_tag_tables'
+down_revision = 'add_cjk_grams'
+depends_on = None
+
+# 关联表 -> 原始表
+ASSOCIATIONS = {
+    'vocabulary_library_tags': 'vocabulary_libraries',
+    'vocabulary_word_tags': 'vocabulary_words',
+}
+
+
+def upgrade():
+    op.create_table('tags',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    for association, source in ASSOCIATIONS.items():
+        op.create_table(association,
+            sa.Column('record_id', sa.Integer(), nullable=False),
+            sa.Column('tag_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['record_id'], [f'{source}.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['tag_id'], ['tags.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('record_id', 'tag_id')
+        )
+        op.create_index(f'ix_{association}_tag', association, ['tag_id', 'record_id'])
+    
+    # 迁移现有的逗号分隔标签
+    connection = op.get_bind()
+    tags = sa.table('tags', sa.column('id', sa.Integer), sa.column('name', sa.String))
+    tag_ids = {}
+    for association, source in ASSOCIATIONS.items():
+        rows = connection.execute(sa.text(f"SELECT id, tags FROM {source} WHERE tags IS NOT NULL AND tags != ''"))
+        links = []
+        for record_id, value in rows:
+            names = []
+            for name in value.split(','):
+                name = name.strip()
+                if name and name not in names:
+                    names.append(name)
+            for name in names:
+                if name not in tag_ids:
+                    tag_ids[name] = connection.execute(tags.insert().values(name=name)).inserted_primary_key[0]
+                links.append({'record_id': record_id, 'tag_id': tag_ids[name]})
+        if links:
+            target = sa.table(association, sa.column('record_id', sa.Integer), sa.column('tag_id', sa.Integer))
+            op.bulk_insert(target, links)
+
+
+def downgrade():
+    for association in ASSOCIATIONS:
+        op.drop_index(f'ix_{association}_tag', table_name=association)
+        op.drop_table(association)
+    op.drop_table('tags')
@@ -0,0 +1,40 @@
+"""为词库和词组添加冗余计数字段
+
+Revision ID: add_vocabulary_counters
+Revises: add_level_models
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_vocabulary_counters'
+down_revision = 'add_level_models'
+depends_on = None
+
+
+def upgrade():
+    op.add_column('vocabulary_libraries', sa.Column('groups_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('vocabulary_libraries', sa.Column('words_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('word_groups', sa.Column('words_count', sa.Integer(), nullable=False, server_default='0'))
+    
+    # 回填现有数据
+    op.execute(
+        'UPDATE word_groups SET words_count = ('
+        'SELECT COUNT(*) FROM vocabulary_words '
+        'WHERE vocabulary_words.group_id = word_groups.id AND vocabulary_words.is_active = 1)'
+    )
+    op.execute(
+        'UPDATE vocabulary_libraries SET '
+        'groups_count = (SELECT COUNT(*) FROM word_groups '
+        'WHERE word_groups.library_id = vocabulary_libraries.id AND word_groups.is_active = 1), '
+        'words_count = (SELECT COALESCE(SUM(word_groups.words_count), 0) FROM word_groups '
+        'WHERE word_groups.library_id = vocabulary_libraries.id AND word_groups.is_active = 1)'
+    )
+
+
+def downgrade():
+    op.drop_column('word_groups', 'words_count')
+    op.drop_column('vocabulary_libraries', 'words_count')
+    op.drop_column('vocabulary_libraries', 'groups_count')
@@ -0,0 +1,83 @@
+"""同一词组下单词唯一，导入任务记录冲突处理方式
+
+Revision ID: add_word_unique_index
+Revises: add_import_jobs
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+import logging
+import os
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_word_unique_index'
+down_revision = 'add_import_jobs'
+depends_on = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+# 设置该环境变量后才删除重复的单词（删除前备份到 BACKUP_TABLE），否则迁移中止并列出重复的单词
+DELETE_DUPLICATES_ENV = 'DELETE_DUPLICATE_WORDS'
+BACKUP_TABLE = 'vocabulary_words_duplicates'
+
+# 同一词组下重复的单词（保留ID最小的一条）
+DUPLICATE_IDS = (
+    'SELECT id FROM (SELECT duplicate.id FROM vocabulary_words duplicate '
+    'JOIN vocabulary_words kept ON kept.group_id = duplicate.group_id '
+    'AND kept.word = duplicate.word AND kept.id < duplicate.id) AS duplicate_ids'
+)
+
+
+def upgrade():
+    # 检查已有的重复单词：默认中止迁移，由管理员确认后再删除
+    duplicates = op.get_bind().execute(sa.text(
+        'SELECT duplicate.id, duplicate.group_id, duplicate.word, MIN(kept.id) FROM vocabulary_words duplicate '
+        'JOIN vocabulary_words kept ON kept.group_id = duplicate.group_id '
+        'AND kept.word = duplicate.word AND kept.id < duplicate.id '
+        'GROUP BY duplicate.id, duplicate.group_id, duplicate.word ORDER BY duplicate.id'
+    )).all()
+    if duplicates:
+        for word_id, group_id, word, kept_id in duplicates:
+            logger.warning('词组 %s 的单词 "%s" 重复：ID %s 与保留的 ID %s', group_id, word, word_id, kept_id)
+        if not os.environ.get(DELETE_DUPLICATES_ENV):
+            raise RuntimeError(
+                f'有 {len(duplicates)} 个单词与同一词组下的单词重复（见上方日志），无法创建唯一索引。'
+                f'请先合并或删除这些单词，或设置环境变量 {DELETE_DUPLICATES_ENV}=1 重新执行迁移，'
+                f'重复的单词将备份到 {BACKUP_TABLE} 表后删除（保留每组ID最小的一条）'
+            )
+        _delete_duplicates(len(duplicates))
+    
+    op.create_index('uq_vocabulary_words_group_word', 'vocabulary_words', ['group_id', 'word'], unique=True)
+    
+    op.add_column('import_jobs', sa.Column('on_conflict', sa.String(length=20), nullable=False, server_default='error'))
+    op.add_column('import_jobs', sa.Column('updated_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('import_jobs', sa.Column('skipped_count', sa.Integer(), nullable=False, server_default='0'))
+
+
+def _delete_duplicates(count):
+    """备份并删除重复的单词及其标签关联和 n-gram 索引，然后重新统计冗余计数"""
+    op.execute(f'CREATE TABLE {BACKUP_TABLE} AS SELECT * FROM vocabulary_words WHERE id IN ({DUPLICATE_IDS})')
+    op.execute(f'DELETE FROM vocabulary_word_tags WHERE record_id IN ({DUPLICATE_IDS})')
+    op.execute(f"DELETE FROM cjk_grams WHERE source = 'vocabulary_words' AND record_id IN ({DUPLICATE_IDS})")
+    op.execute(f'DELETE FROM vocabulary_words WHERE id IN ({DUPLICATE_IDS})')
+    
+    # 重新统计冗余计数
+    op.execute(
+        'UPDATE word_groups SET words_count = ('
+        'SELECT COUNT(*) FROM vocabulary_words '
+        'WHERE vocabulary_words.group_id = word_groups.id AND vocabulary_words.is_active = 1)'
+    )
+    op.execute(
+        'UPDATE vocabulary_libraries SET words_count = ('
+        'SELECT COALESCE(SUM(word_groups.words_count), 0) FROM word_groups '
+        'WHERE word_groups.library_id = vocabulary_libraries.id AND word_groups.is_active = 1)'
+    )
+    logger.warning('已删除 %s 个重复的单词，原数据保存在 %s 表中', count, BACKUP_TABLE)
+
+
+def downgrade():
+    op.drop_column('import_jobs', 'skipped_count')
+    op.drop_column('import_jobs', 'updated_count')
+    op.drop_column('import_jobs', 'on_conflict')
+    op.drop_index('uq_vocabulary_words_group_word', table_name='vocabulary_words')
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+单词导入脚本
+逐行读取 CSV / TSV / NDJSON 文件，按块批量插入并逐块提交
+
+用法:
+  python scripts/import_words.py words.csv --group-id 3               # 导入到词组
+  python scripts/import_words.py export.ndjson --library-id 1         # 导入到词库，按 group 列分配词组
+  python scripts/import_words.py words.txt --group-id 3 --format tsv --chunk-size 5000
+  python scripts/import_words.py words.csv --group-id 3 --on-conflict update  # 更新已存在单词的翻译等字段
+"""
+import argparse
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.utils.importer import IMPORT_FORMATS, ON_CONFLICT_MODES, detect_format, import_message, import_words
+
+
+def main():
+    parser = argparse.ArgumentParser(description='导入单词文件')
+    parser.add_argument('path', help='CSV / TSV / NDJSON 文件')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--library-id', type=int, help='导入到词库（文件需包含 group 列）')
+    target.add_argument('--group-id', type=int, help='导入到词组')
+    parser.add_argument('--format', choices=IMPORT_FORMATS, help='文件格式，默认按扩展名判断')
+    parser.add_argument('--chunk-size', type=int, default=None, help='每块行数，每块提交一次')
+    parser.add_argument('--on-conflict', choices=ON_CONFLICT_MODES, default='error',
+                        help='单词已存在时：error 记为错误（默认），skip 跳过，update 更新文件中出现的字段')
+    args = parser.parse_args()
+    
+    import_format = args.format or detect_format(args.path)
+    if import_format is None:
+        parser.error('无法根据扩展名判断文件格式，请指定 --format')
+    
+    app = create_app()
+    with app.app_context():
+        chunk_size = args.chunk_size or app.config.get('VOCABULARY_IMPORT_CHUNK_SIZE', 1000)
+        with open(args.path, 'rb') as stream:
+            result = import_words(stream, import_format, library_id=args.library_id,
+                                  group_id=args.group_id, chunk_size=chunk_size, on_conflict=args.on_conflict)
+    
+    for error in result['errors']:
+        print(f"   第{error['line']}行：{error['message']}")
+    if result['has_more_errors']:
+        print(f"   ……共 {result['error_count']} 个错误")
+    print(f"✅ 导入完成：共 {result['total_count']} 行，{import_message(result)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+重建检索索引脚本
+重新生成中文 n-gram 倒排索引和标签关联（全文索引由数据库自行维护）
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models.search import CjkGram, CJK_INDEXED_FIELDS, reindex_cjk_grams
+from app.models.tag import TAGGED_MODELS, reindex_tags
+
+
+def rebuild_search_index():
+    """重建 n-gram 索引和标签关联"""
+    app = create_app()
+    
+    with app.app_context():
+        db.create_all()
+        try:
+            for model in CJK_INDEXED_FIELDS:
+                reindex_cjk_grams(model)
+                db.session.commit()
+                count = CjkGram.query.filter_by(source=model.__tablename__).count()
+                print(f"   {model.__tablename__}: {count} 条 n-gram")
+            for model, association in TAGGED_MODELS.items():
+                reindex_tags(model)
+                db.session.commit()
+                count = db.session.query(association).count()
+                print(f"   {association.name}: {count} 条标签关联")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ 索引重建失败: {e}")
+            raise
+        print("✅ 索引重建完成")
+
+
+if __name__ == '__main__':
+    rebuild_search_index()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+修复词库冗余计数脚本
+重新统计词组的单词数、词库的词组数和单词数
+
+用法:
+  python scripts/rebuild_vocabulary_counters.py          # 修复全部词库
+  python scripts/rebuild_vocabulary_counters.py 1 2 3    # 只修复指定词库
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models.vocabulary import VocabularyLibrary, rebuild_vocabulary_counters
+
+
+def rebuild_counters(library_ids=None):
+    """重新计算冗余计数"""
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            rebuild_vocabulary_counters(library_ids)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ 计数修复失败: {e}")
+            raise
+        
+        query = VocabularyLibrary.query
+        if library_ids:
+            query = query.filter(VocabularyLibrary.id.in_(library_ids))
+        
+        for library in query.order_by(VocabularyLibrary.id).all():
+            print(f"   {library.name}: {library.groups_count} 个词组, {library.words_count} 个单词")
+        print("✅ 计数修复完成")
+
+
+if __name__ == '__main__':
+    ids = [int(arg) for arg in sys.argv[1:]]
+    rebuild_counters(ids or None)
@@ -1,11 +1,14 @@
 """
 测试配置文件
 """
+import json
 import pytest
 from app import create_app, db
 from app.models.user import User
 from app.models.game import Game
 from app.models.word import Word, WordCategory
+from tests.fake_redis import FakeRedisServer
+from tests.helpers import post_json
 
 
 @pytest.fixture
@@ -89,4 +92,36 @@ def test_words(app, test_category):
             db.session.add(word)
         
         db.session.commit()
-        return words
\ No newline at end of file
+        return words
+
+
+@pytest.fixture
+def auth_headers(client, test_user):
+    """登录测试用户并返回认证请求头"""
+    response = client.post('/api/auth/login',
+                           data=json.dumps({'username': 'testuser', 'password': 'password123'}),
+                           content_type='application/json')
+    token = json.loads(response.data)['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture
+def library_with_words(client, auth_headers):
+    """创建一个包含两个词组的词库"""
+    library = json.loads(post_json(client, '/api/vocabulary/libraries', {'name': '测试词库'}, auth_headers).data)['data']
+    groups = []
+    for name, words in (('第一组', ['apple', 'banana', 'cherry']), ('第二组', ['dog', 'egg'])):
+        group = json.loads(post_json(client, f"/api/vocabulary/libraries/{library['id']}/groups",
+                                     {'name': name}, auth_headers).data)['data']
+        post_json(client, f"/api/vocabulary/groups/{group['id']}/words/batch",
+                  {'words': [{'word': w, 'translation': f'{w}的翻译'} for w in words]}, auth_headers)
+        groups.append(group)
+    return library, groups
+
+
+@pytest.fixture
+def redis_server():
+    """本地 Redis 协议服务器"""
+    server = FakeRedisServer().start()
+    yield server
+    server.stop()
@@ -0,0 +1,212 @@
+"""
+测试用的本地 Redis 协议服务器
+只实现共享缓存和会话存储用到的命令：PING、AUTH、SELECT、GET、SET（EX）、INCR、INCRBY、DEL、SCAN、PUBLISH、SUBSCRIBE、
+HSET、HGETALL、HEXISTS、HINCRBY、EXPIRE、ZADD、ZRANGEBYSCORE（LIMIT）、ZREM，以及事务 WATCH、UNWATCH、MULTI、EXEC
+"""
+import fnmatch
+import socketserver
+import threading
+import time
+
+# 修改键的命令（被 WATCH 的键由这些命令修改后，EXEC 放弃执行）
+WRITE_COMMANDS = ('SET', 'INCR', 'INCRBY', 'DEL', 'HSET', 'HINCRBY', 'EXPIRE', 'ZADD', 'ZREM')
+
+
+class ReplyError(Exception):
+    """错误响应"""
+
+
+def encode(value):
+    """把 Python 值编码为 RESP 响应"""
+    if isinstance(value, ReplyError):
+        return b'-%s\r\n' % str(value).encode('utf-8')
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, str):
+        return b'+%s\r\n' % value.encode('utf-8')
+    if isinstance(value, bytes):
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+    if isinstance(value, list):
+        return b'*%d\r\n' % len(value) + b''.join(encode(item) for item in value)
+    raise TypeError(type(value))
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def dispatch(self, command, args):
+        server = self.server
+        if command == 'WATCH':
+            with server.lock:
+                for key in args:
+                    self.watched[key] = server.versions.get(key, 0)
+            return 'OK'
+        if command == 'UNWATCH':
+            self.watched = {}
+            return 'OK'
+        if command == 'MULTI':
+            self.queued = []
+            return 'OK'
+        if command == 'EXEC':
+            queued, self.queued = self.queued or [], None
+            watched, self.watched = self.watched, {}
+            with server.lock:
+                if any(server.versions.get(key, 0) != version for key, version in watched.items()):
+                    return None
+                return [server.execute(self, queued_command, queued_args) for queued_command, queued_args in queued]
+        if self.queued is not None:
+            self.queued.append((command, args))
+            return 'QUEUED'
+        return server.execute(self, command, args)
+
+    def reply(self, value):
+        with self.write_lock:
+            self.wfile.write(encode(value))
+            self.wfile.flush()
+
+    def handle(self):
+        self.write_lock = threading.Lock()
+        self.watched = {}  # 键 -> WATCH 时的版本
+        self.queued = None  # MULTI 之后排队的命令
+        server = self.server
+        while True:
+            args = self.read_command()
+            if args is None:
+                break
+            server.commands.append(args[0].upper())
+            self.reply(self.dispatch(args[0].upper().decode(), args[1:]))
+        with server.lock:
+            if self in server.subscribers:
+                server.subscribers.remove(self)
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeRedisHandler)
+        self.lock = threading.RLock()
+        self.data = {}  # key -> (value, expires_at)
+        self.versions = {}  # key -> 修改次数（WATCH 用）
+        self.subscribers = []
+        self.commands = []
+
+    @property
+    def url(self):
+        return 'redis://127.0.0.1:%d/0' % self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def _alive(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry
+
+    def execute(self, handler, command, args):
+        with self.lock:
+            if command in WRITE_COMMANDS:
+                for key in (args if command == 'DEL' else args[:1]):
+                    self.versions[key] = self.versions.get(key, 0) + 1
+            if command in ('PING', 'AUTH', 'SELECT'):
+                return 'OK' if command != 'PING' else 'PONG'
+            if command == 'GET':
+                entry = self._alive(args[0])
+                return None if entry is None else entry[0]
+            if command == 'SET':
+                expires_at = None
+                if len(args) >= 4 and args[2].upper() == b'EX':
+                    expires_at = time.monotonic() + int(args[3])
+                self.data[args[0]] = (args[1], expires_at)
+                return 'OK'
+            if command in ('INCR', 'INCRBY'):
+                entry = self._alive(args[0])
+                value = int(entry[0] if entry is not None else b'0') + (int(args[1]) if command == 'INCRBY' else 1)
+                self.data[args[0]] = (str(value).encode(), entry[1] if entry is not None else None)
+                return value
+            if command == 'DEL':
+                return sum(1 for key in args if self.data.pop(key, None) is not None)
+            if command == 'SCAN':
+                pattern = args[args.index(b'MATCH') + 1].decode() if b'MATCH' in args else '*'
+                keys = [key for key in list(self.data) if self._alive(key) and fnmatch.fnmatchcase(key.decode(), pattern)]
+                return [b'0', keys]
+            if command == 'HSET':
+                entry = self._alive(args[0])
+                fields = entry[0] if entry is not None else {}
+                added = 0
+                for i in range(1, len(args), 2):
+                    added += args[i] not in fields
+                    fields[args[i]] = args[i + 1]
+                self.data[args[0]] = (fields, entry[1] if entry is not None else None)
+                return added
+            if command == 'HGETALL':
+                entry = self._alive(args[0])
+                return [] if entry is None else [item for pair in entry[0].items() for item in pair]
+            if command == 'HEXISTS':
+                entry = self._alive(args[0])
+                return int(entry is not None and args[1] in entry[0])
+            if command == 'HINCRBY':
+                entry = self._alive(args[0])
+                fields = entry[0] if entry is not None else {}
+                value = int(fields.get(args[1], b'0')) + int(args[2])
+                fields[args[1]] = str(value).encode()
+                self.data[args[0]] = (fields, entry[1] if entry is not None else None)
+                return value
+            if command == 'EXPIRE':
+                entry = self._alive(args[0])
+                if entry is None:
+                    return 0
+                self.data[args[0]] = (entry[0], time.monotonic() + int(args[1]))
+                return 1
+            if command == 'ZADD':
+                entry = self._alive(args[0])
+                members = entry[0] if entry is not None else {}
+                added = args[2] not in members
+                members[args[2]] = float(args[1])
+                self.data[args[0]] = (members, None)
+                return int(added)
+            if command == 'ZRANGEBYSCORE':
+                entry = self._alive(args[0])
+                low, high = float(args[1]), float(args[2])
+                members = sorted((score, member) for member, score in (entry[0] if entry else {}).items()
+                                 if low <= score <= high)
+                result = [member for _, member in members]
+                if b'LIMIT' in args:
+                    offset, count = (int(arg) for arg in args[args.index(b'LIMIT') + 1:][:2])
+                    result = result[offset:offset + count]
+                return result
+            if command == 'ZREM':
+                entry = self._alive(args[0])
+                if entry is None:
+                    return 0
+                return sum(1 for member in args[1:] if entry[0].pop(member, None) is not None)
+            if command == 'SUBSCRIBE':
+                self.subscribers.append(handler)
+                return [b'subscribe', args[0], 1]
+            if command == 'PUBLISH':
+                receivers = list(self.subscribers)
+            else:
+                return ReplyError(f"ERR unknown command '{command}'")
+        for receiver in receivers:
+            receiver.reply([b'message', args[0], args[1]])
+        return len(receivers)
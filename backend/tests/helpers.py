@@ -0,0 +1,70 @@
+"""
+测试辅助函数
+"""
+import json
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+from app import db
+
+
+def post_json(client, url, data, headers):
+    return client.post(url, data=json.dumps(data), content_type='application/json', headers=headers)
+
+
+def put_json(client, url, data, headers):
+    return client.put(url, data=json.dumps(data), content_type='application/json', headers=headers)
+
+
+def count_queries(client, url, headers=None):
+    """统计一次请求执行的SQL语句数量"""
+    statements = []
+    
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(db.engine, 'before_cursor_execute', before_execute)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_execute)
+    return response, len(statements)
+
+
+def patch_json(client, url, data, headers):
+    return client.patch(url, data=json.dumps(data), content_type='application/json', headers=headers)
+
+
+@contextmanager
+def recorded_statements():
+    """记录代码块中执行的SQL语句"""
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+
+def wait_until(predicate, timeout=2.0):
+    """等待订阅线程处理失效消息"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def walk_cursor(client, url, key, headers, per_page=1):
+    """按游标逐页取出列表接口的全部记录（key 为记录列表的字段名，响应可以包在 data 中）"""
+    items = []
+    cursor = ''
+    while True:
+        body = json.loads(client.get(url, query_string={'cursor': cursor, 'per_page': per_page}, headers=headers).data)
+        data = body.get('data', body)
+        items.extend(data[key])
+        if not data['pagination']['has_next']:
+            return items
+        cursor = data['pagination']['next_cursor']
@@ -0,0 +1,102 @@
+"""
+共享缓存相关测试：跨工作进程的 Redis 缓存、失效广播，以及排行榜和用户资料缓存
+"""
+import json
+import pytest
+from app import db
+from app.models.user import User
+from app.utils.cache import Cache, CacheError, InvalidationBus, RedisBackend, redis_client
+from app.utils.user_cache import user_cache
+from tests.helpers import post_json, wait_until
+
+
+class TestSharedCache:
+    """共享缓存测试类"""
+    
+    def make_worker(self, url):
+        """模拟一个工作进程中的缓存（独立的进程内缓存、连接和订阅）"""
+        client = redis_client(url)
+        cache = Cache('shared_test')
+        cache.configure(remote=RedisBackend(client), bus=InvalidationBus(client, 'test:invalidate'), key_prefix='test:')
+        return cache
+    
+    def test_remote_hit_across_workers(self, redis_server):
+        """测试一个工作进程加载的数据被其他工作进程从共享缓存读取"""
+        first, second = self.make_worker(redis_server.url), self.make_worker(redis_server.url)
+        loads = []
+        loader = lambda: loads.append(1) or {'name': '词库', 'words': ['apple', 'banana']}
+        
+        assert first.get_or_set(('library', 1), loader) == {'name': '词库', 'words': ['apple', 'banana']}
+        assert second.get_or_set(('library', 1), loader) == {'name': '词库', 'words': ['apple', 'banana']}
+        assert len(loads) == 1
+        assert second.stats()['remote_hits'] == 1
+        assert b'test:shared_test:library:1' in redis_server.data
+    
+    def test_invalidation_broadcast(self, redis_server):
+        """测试失效消息删除其他工作进程的进程内副本"""
+        first, second = self.make_worker(redis_server.url), self.make_worker(redis_server.url)
+        first.set('key', 'old')
+        assert second.get('key') == 'old'
+        assert second.local.get('key') is None and second.local.get(second.make_key('key')) == 'old'
+        
+        first.invalidate('key')
+        assert wait_until(lambda: second.local.get(second.make_key('key')) is None)
+        assert second.get('key') is None
+        
+        first.set('a', 1)
+        assert second.get('a') == 1
+        first.clear()
+        assert wait_until(lambda: second.local.get(second.make_key('a')) is None)
+        assert [key for key in redis_server.data if not key.startswith(b'generation@')] == []
+    
+    def test_invalidation_during_load_is_not_overwritten(self, redis_server):
+        """测试加载期间其他工作进程的失效不会被加载到的旧数据覆盖"""
+        first, second = self.make_worker(redis_server.url), self.make_worker(redis_server.url)
+        
+        def stale_loader():
+            # 加载读到旧数据后，其他工作进程写入并失效了该键
+            second.invalidate('key')
+            return 'old'
+        
+        assert first.get_or_set('key', stale_loader) == 'old'
+        assert second.get_or_set('key', lambda: 'new') == 'new'
+        third = self.make_worker(redis_server.url)
+        assert third.get('key') == 'new'
+    
+    def test_unavailable_server_falls_back_to_loader(self):
+        """测试共享缓存不可用时直接调用 loader"""
+        cache = Cache('shared_test')
+        cache.configure(remote=RedisBackend(redis_client('redis://127.0.0.1:1/0', timeout=0.1)))
+        assert cache.get_or_set('key', lambda: 'value') == 'value'
+        assert cache.stats()['remote_errors'] >= 1
+        with pytest.raises(CacheError):
+            cache.remote.get('key')
+    
+    def test_leaderboard_cached_and_invalidated(self, client, test_user):
+        """测试排行榜缓存在用户统计变化后失效"""
+        user = User.query.filter_by(username='testuser').first()
+        user.total_games, user.total_wins, user.best_score = 5, 3, 100
+        db.session.commit()
+        
+        response = client.get('/api/users/leaderboard?limit=5')
+        assert json.loads(response.data)['leaderboard'][0]['best_score'] == 100
+        assert user_cache.local.stats()['entries'] == 1
+        
+        user.best_score = 200
+        db.session.commit()
+        response = client.get('/api/users/leaderboard?limit=5')
+        assert json.loads(response.data)['leaderboard'][0]['best_score'] == 200
+    
+    def test_profile_invalidated_on_finish(self, client, auth_headers, library_with_words):
+        """测试结束游戏后用户档案缓存失效"""
+        profile = json.loads(client.get('/api/users/profile', headers=auth_headers).data)
+        assert profile['statistics']['weekly_games'] == 0
+        
+        library, groups = library_with_words
+        response = post_json(client, '/api/vocabulary-game/start',
+                             {'library_id': library['id'], 'group_id': groups[0]['id']}, auth_headers)
+        code = json.loads(response.data)['session_code']
+        post_json(client, f'/api/vocabulary-game/{code}/finish', {}, auth_headers)
+        
+        profile = json.loads(client.get('/api/users/profile', headers=auth_headers).data)
+        assert profile['statistics']['weekly_games'] == 1
@@ -0,0 +1,403 @@
+"""
+游戏会话相关测试：进行中会话的状态存储、答题写后缓冲、会话单词查找和会话代码分配
+"""
+import json
+import threading
+import time
+import pytest
+from app import db
+from app.models.user import User
+from app.models.game import Game, GameAnswer, GameSession
+from app.models.vocabulary import VocabularyWord
+from app.utils.answer_buffer import AnswerBuffer, answer_buffer
+from app.utils import live_sessions as live_sessions_module
+from app.utils.live_sessions import RedisSessionBackend, live_sessions
+from app.utils.cache import redis_client
+from app.utils.session_codes import CODE_SPACE, encode, permute, session_codes
+from app.utils.validators import validate_session_code
+from tests.helpers import post_json, recorded_statements, walk_cursor
+
+
+class TestLiveSessions:
+    """进行中游戏会话状态存储测试类"""
+    
+    def start_game(self, client, auth_headers, library_with_words):
+        library, groups = library_with_words
+        response = post_json(client, '/api/vocabulary-game/start',
+                             {'library_id': library['id'], 'group_id': groups[0]['id']}, auth_headers)
+        return json.loads(response.data)['session_code']
+    
+    def answer(self, client, auth_headers, code, is_correct, time_used=10):
+        return post_json(client, f'/api/vocabulary-game/{code}/answer',
+                         {'word_id': 1, 'answer': 'x', 'is_correct': is_correct, 'time_used': time_used}, auth_headers)
+    
+    def test_answers_held_in_store_until_finish(self, client, auth_headers, library_with_words):
+        """测试答题只更新会话存储，结束游戏时一次写回数据库"""
+        code = self.start_game(client, auth_headers, library_with_words)
+        
+        with recorded_statements() as statements:
+            response = self.answer(client, auth_headers, code, True)
+            self.answer(client, auth_headers, code, False)
+        assert not any('game_sessions' in statement for statement in statements)
+        assert json.loads(response.data)['current_score'] == 140
+        
+        session = GameSession.query.filter_by(session_code=code).first()
+        assert (session.final_score, session.correct_answers) == (0, 0)
+        status = json.loads(client.get(f'/api/vocabulary-game/{code}/status', headers=auth_headers).data)
+        assert (status['session']['final_score'], status['session']['accuracy']) == (140, 50.0)
+        assert status['players'][0]['score'] == 140
+        
+        response = post_json(client, f'/api/vocabulary-game/{code}/finish', {}, auth_headers)
+        assert json.loads(response.data)['result']['final_score'] == 140
+        db.session.expire_all()
+        session = GameSession.query.filter_by(session_code=code).first()
+        assert (session.final_score, session.correct_answers, session.wrong_answers, session.time_used) == (140, 1, 1, 20)
+        assert session.get_players_data()[0]['score'] == 140
+        assert live_sessions.get(code) is None
+        assert self.answer(client, auth_headers, code, True).status_code == 400
+    
+    def test_idle_session_persisted_and_resumed(self, client, auth_headers, library_with_words):
+        """测试空闲超时的会话写回数据库，再次答题时从数据库恢复"""
+        code = self.start_game(client, auth_headers, library_with_words)
+        self.answer(client, auth_headers, code, True)
+        
+        assert live_sessions.sweep(now=int(time.time())) == 0
+        assert live_sessions.sweep(now=int(time.time()) + live_sessions.idle_timeout + 1) == 1
+        assert live_sessions.get(code) is None
+        session = GameSession.query.filter_by(session_code=code).first()
+        assert (session.status, session.final_score, session.correct_answers) == ('playing', 140, 1)
+        
+        response = self.answer(client, auth_headers, code, True)
+        assert json.loads(response.data)['current_score'] == 280
+        assert live_sessions.get(code)['correct_answers'] == 2
+    
+    def test_database_mode(self, client, auth_headers, library_with_words, monkeypatch):
+        """测试未启用会话存储时每次答题原子自增会话行的计数并插入答题记录，结束游戏时汇总玩家得分"""
+        monkeypatch.setattr(live_sessions, 'backend', None)
+        code = self.start_game(client, auth_headers, library_with_words)
+        self.answer(client, auth_headers, code, True)
+        with recorded_statements() as statements:
+            response = self.answer(client, auth_headers, code, False)
+        assert json.loads(response.data)['correct_answers'] == 1
+        writes = [statement for statement in statements if statement.startswith(('UPDATE', 'INSERT'))]
+        assert len(writes) == 2
+        assert writes[0].startswith('UPDATE game_sessions') and writes[1].startswith('INSERT INTO game_answers')
+        assert 'final_score=(coalesce(game_sessions.final_score, ?) + ?)' in writes[0]
+        
+        db.session.expire_all()
+        session = GameSession.query.filter_by(session_code=code).first()
+        assert (session.final_score, session.correct_answers, session.wrong_answers) == (140, 1, 1)
+        assert GameAnswer.query.filter_by(session_id=session.id).count() == 2
+        status = json.loads(client.get(f'/api/vocabulary-game/{code}/status', headers=auth_headers).data)
+        assert (status['session']['final_score'], status['players'][0]['score']) == (140, 140)
+        
+        post_json(client, f'/api/vocabulary-game/{code}/finish', {}, auth_headers)
+        db.session.expire_all()
+        session = GameSession.query.filter_by(session_code=code).first()
+        assert (session.final_score, session.correct_answers, session.wrong_answers, session.time_used) == (140, 1, 1, 20)
+        assert session.get_players_data()[0]['score'] == 140
+        assert self.answer(client, auth_headers, code, True).status_code == 400
+        assert GameAnswer.query.filter_by(session_id=session.id).count() == 2
+    
+    def test_database_mode_shared_across_workers(self, app, client, auth_headers, library_with_words, monkeypatch):
+        """测试数据库模式下不同工作进程（各自的缓冲区）记录同一会话的答题时返回共享的计数，结束时都计入"""
+        monkeypatch.setattr(live_sessions, 'backend', None)
+        monkeypatch.setattr(answer_buffer, 'interval_ms', 60000)
+        code = self.start_game(client, auth_headers, library_with_words)
+        other = AnswerBuffer()
+        other.init_app(app)
+        other.interval_ms = 60000
+        
+        scores = [json.loads(self.answer(client, auth_headers, code, True).data)['current_score']]
+        monkeypatch.setattr(live_sessions_module, 'answer_buffer', other)
+        scores.append(json.loads(self.answer(client, auth_headers, code, True).data)['current_score'])
+        monkeypatch.setattr(live_sessions_module, 'answer_buffer', answer_buffer)
+        scores.append(json.loads(self.answer(client, auth_headers, code, False).data)['current_score'])
+        assert scores == [140, 280, 280]
+        assert answer_buffer.pending(GameSession.query.filter_by(session_code=code).first().id) == []
+        
+        response = post_json(client, f'/api/vocabulary-game/{code}/finish', {}, auth_headers)
+        assert json.loads(response.data)['result']['final_score'] == 280
+        db.session.expire_all()
+        session = GameSession.query.filter_by(session_code=code).first()
+        assert (session.correct_answers, session.wrong_answers, session.get_players_data()[0]['score']) == (2, 1, 280)
+        assert GameAnswer.query.filter_by(session_id=session.id).count() == 3
+    
+    def test_database_mode_starts_from_saved_counters(self, client, auth_headers, library_with_words, monkeypatch):
+        """测试数据库模式下以会话行中已有的计数和玩家得分为起点"""
+        monkeypatch.setattr(live_sessions, 'backend', None)
+        code = self.start_game(client, auth_headers, library_with_words)
+        session = GameSession.query.filter_by(session_code=code).first()
+        session.final_score, session.correct_answers, session.time_used = 100, 1, 5
+        players_data = session.get_players_data()
+        players_data[0]['score'] = 100
+        session.set_players_data(players_data)
+        db.session.commit()
+        
+        assert json.loads(self.answer(client, auth_headers, code, True).data)['current_score'] == 240
+        response = post_json(client, f'/api/vocabulary-game/{code}/finish', {}, auth_headers)
+        assert json.loads(response.data)['result']['final_score'] == 240
+        db.session.expire_all()
+        session = GameSession.query.filter_by(session_code=code).first()
+        assert (session.correct_answers, session.time_used, session.get_players_data()[0]['score']) == (2, 15, 240)
+    
+    def test_answers_recorded(self, client, auth_headers, library_with_words):
+        """测试每次答题插入一条答题记录"""
+        code = self.start_game(client, auth_headers, library_with_words)
+        apple = VocabularyWord.query.filter_by(word='apple').first()
+        post_json(client, f'/api/vocabulary-game/{code}/answer',
+                  {'word_id': apple.id, 'answer': 'x', 'is_correct': False, 'time_used': 2.5}, auth_headers)
+        self.answer(client, auth_headers, code, True)
+        
+        answers = GameAnswer.query.order_by(GameAnswer.id).all()
+        session = GameSession.query.filter_by(session_code=code).first()
+        assert [(answer.session_id, answer.word_id, answer.correct, answer.latency_ms) for answer in answers] == [
+            (session.id, apple.id, False, 2500), (session.id, 1, True, 10000)
+        ]
+        assert answers[1].score == 140 and answers[0].user_id == session.user_id
+    
+    def test_failed_answer_write_not_counted(self, client, auth_headers, library_with_words, monkeypatch):
+        """测试立即写入模式下答题记录写入失败时撤销计数，客户端重试不会重复计分"""
+        code = self.start_game(client, auth_headers, library_with_words)
+        write = answer_buffer._write
+        def fail(batch):
+            raise RuntimeError('数据库不可用')
+        monkeypatch.setattr(answer_buffer, '_write', fail)
+        assert self.answer(client, auth_headers, code, True).status_code == 500
+        assert live_sessions.get(code)['correct_answers'] == 0
+        
+        monkeypatch.setattr(answer_buffer, '_write', write)
+        assert json.loads(self.answer(client, auth_headers, code, True).data)['current_score'] == 140
+        assert GameAnswer.query.count() == 1
+    
+    def test_redis_backend(self, client, auth_headers, library_with_words, redis_server, monkeypatch):
+        """测试 Redis 会话存储的原子自增和结束时写回"""
+        backend = RedisSessionBackend(redis_client(redis_server.url), 'test:')
+        monkeypatch.setattr(live_sessions, 'backend', backend)
+        code = self.start_game(client, auth_headers, library_with_words)
+        assert b'test:live_session:' + code.encode() in redis_server.data
+        
+        def answer_many():
+            for _ in range(25):
+                backend.increment(code, {'correct_answers': 1, 'final_score': 2}, int(time.time()) + 60)
+        threads = [threading.Thread(target=answer_many) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert live_sessions.get(code)['correct_answers'] == 100
+        
+        assert backend.increment('missing', {'correct_answers': 1}, 0) is None
+        assert b'test:live_session:missing' not in redis_server.data
+        
+        response = post_json(client, f'/api/vocabulary-game/{code}/finish', {}, auth_headers)
+        assert json.loads(response.data)['result']['final_score'] == 200
+        assert b'test:live_session:' + code.encode() not in redis_server.data
+    
+    def test_redis_sweep_keeps_concurrent_answers(self, client, auth_headers, library_with_words, redis_server,
+                                                  monkeypatch):
+        """测试写回数据库期间到达的答题不会随清理删除，已恢复的状态不会被再次恢复覆盖"""
+        backend = RedisSessionBackend(redis_client(redis_server.url), 'test:')
+        monkeypatch.setattr(live_sessions, 'backend', backend)
+        code = self.start_game(client, auth_headers, library_with_words)
+        self.answer(client, auth_headers, code, True)
+        
+        apply = live_sessions.apply
+        def apply_then_answer(session, state):
+            apply(session, state)
+            backend.increment(code, {'correct_answers': 1, 'final_score': 140}, int(time.time()) + 60)
+        monkeypatch.setattr(live_sessions, 'apply', apply_then_answer)
+        assert live_sessions.sweep(now=int(time.time()) + live_sessions.idle_timeout + 1) == 1
+        monkeypatch.setattr(live_sessions, 'apply', apply)
+        assert live_sessions.get(code)['correct_answers'] == 2
+        session = GameSession.query.filter_by(session_code=code).first()
+        assert session.correct_answers == 1
+        
+        live_sessions.resume(session)
+        assert live_sessions.get(code)['final_score'] == 280
+        response = post_json(client, f'/api/vocabulary-game/{code}/finish', {}, auth_headers)
+        assert json.loads(response.data)['result']['final_score'] == 280
+
+
+class TestAnswerBuffer:
+    """答题写后缓冲测试类"""
+    
+    @pytest.fixture(autouse=True)
+    def buffered(self, app, monkeypatch):
+        """答题记录只进入缓冲区（不启动刷新线程）"""
+        monkeypatch.setattr(answer_buffer, 'interval_ms', 60000)
+        monkeypatch.setattr(answer_buffer, 'ensure_started', lambda: None)
+        yield
+        answer_buffer.init_app(app)
+    
+    def start_game(self, client, auth_headers, group):
+        response = post_json(client, '/api/vocabulary-game/start',
+                             {'library_id': group['library_id'], 'group_id': group['id']}, auth_headers)
+        return json.loads(response.data)['session_code']
+    
+    def answer(self, client, auth_headers, code, is_correct):
+        return post_json(client, f'/api/vocabulary-game/{code}/answer',
+                         {'word_id': 1, 'answer': 'x', 'is_correct': is_correct, 'time_used': 10}, auth_headers)
+    
+    def test_answers_flushed_in_one_statement(self, client, auth_headers, library_with_words):
+        """测试答题先进入缓冲区，刷新时一条多行 INSERT 写入"""
+        library, groups = library_with_words
+        first, second = (self.start_game(client, auth_headers, group) for group in groups)
+        
+        with recorded_statements() as statements:
+            response = self.answer(client, auth_headers, first, True)
+            self.answer(client, auth_headers, first, False)
+            self.answer(client, auth_headers, second, True)
+        assert not any(statement.startswith(('UPDATE', 'INSERT')) for statement in statements)
+        assert json.loads(self.answer(client, auth_headers, first, True).data)['current_score'] == 280
+        assert json.loads(response.data)['current_score'] == 140
+        assert GameAnswer.query.count() == 0
+        
+        with recorded_statements() as statements:
+            assert answer_buffer.flush() == 4
+        assert len(statements) == 1 and statements[0].startswith('INSERT INTO game_answers')
+        assert GameAnswer.query.count() == 4
+        session = GameSession.query.filter_by(session_code=first).first()
+        assert answer_buffer.pending(session.id) == []
+    
+    def test_answers_after_finish_written(self, app, client, auth_headers, library_with_words, monkeypatch):
+        """测试不同工作进程缓冲中的答题计入共享的计数，会话结束后才刷新的记录照常写入（已确认的答题不丢弃）"""
+        library, groups = library_with_words
+        code = self.start_game(client, auth_headers, groups[0])
+        other = AnswerBuffer()
+        other.init_app(app)
+        other.interval_ms = 60000
+        monkeypatch.setattr(other, 'ensure_started', lambda: None)
+        
+        assert json.loads(self.answer(client, auth_headers, code, True).data)['current_score'] == 140
+        monkeypatch.setattr(live_sessions_module, 'answer_buffer', other)
+        assert json.loads(self.answer(client, auth_headers, code, True).data)['current_score'] == 280
+        monkeypatch.setattr(live_sessions_module, 'answer_buffer', answer_buffer)
+        
+        response = post_json(client, f'/api/vocabulary-game/{code}/finish', {}, auth_headers)
+        assert json.loads(response.data)['result']['final_score'] == 280
+        assert answer_buffer.flush() == 1
+        assert other.flush() == 1
+        session = GameSession.query.filter_by(session_code=code).first()
+        assert GameAnswer.query.filter_by(session_id=session.id).count() == 2
+    
+    def test_unwritable_answers_dropped(self, client, auth_headers, library_with_words, monkeypatch):
+        """测试无法写入的记录被隔离丢弃，不阻塞其他记录；缓冲区有上限"""
+        library, groups = library_with_words
+        code = self.start_game(client, auth_headers, groups[0])
+        session = GameSession.query.filter_by(session_code=code).first()
+        answer_buffer.add(None, session.user_id, 1, True, 140)
+        answer_buffer.add(session.id, session.user_id, 1, True, 140)
+        assert answer_buffer.flush() == 1
+        assert answer_buffer.flush() == 0
+        assert GameAnswer.query.count() == 1
+        
+        monkeypatch.setattr(answer_buffer, 'max_pending', 3)
+        for score in range(5):
+            answer_buffer.add(session.id, session.user_id, 1, True, score)
+        assert [event['score'] for event in answer_buffer.pending(session.id)] == [2, 3, 4]
+
+
+class TestSessionWords:
+    """游戏会话单词查找测试类"""
+    
+    def test_answer_uses_indexed_words(self, client, auth_headers, test_game, monkeypatch):
+        """测试答题按ID从缓存中查找单词，不再解析 words_data"""
+        user = User.query.filter_by(username='testuser').first()
+        game = Game.query.filter_by(name='测试游戏').first()
+        session = GameSession(session_code='WORDS001', game_id=game.id, user_id=user.id, status='playing')
+        session.set_words_data([{'id': i, 'english': f'word{i}', 'translation': f'翻译{i}'} for i in range(1, 201)])
+        session.set_players_data([{'user_id': str(user.id), 'username': user.username, 'score': 0}])
+        db.session.add(session)
+        db.session.commit()
+        url = '/api/sessions/WORDS001/answer'
+        
+        response = post_json(client, url, {'word_id': 150, 'answer': '翻译150'}, auth_headers)
+        assert json.loads(response.data)['is_correct'] is True
+        
+        monkeypatch.setattr(GameSession, 'get_words_data', lambda self: pytest.fail('不应解析 words_data'))
+        with recorded_statements() as statements:
+            response = post_json(client, url, {'word_id': 7, 'answer': ' 翻译7 '}, auth_headers)
+        assert json.loads(response.data)['total_score'] == 20
+        assert not any('game_sessions.words_data' in statement for statement in statements)
+        assert post_json(client, url, {'word_id': 999, 'answer': 'x'}, auth_headers).status_code == 404
+        assert post_json(client, url, {'word_id': '7', 'answer': '翻译7'}, auth_headers).status_code == 404
+
+
+class TestMySessions:
+    """我的游戏会话列表测试类"""
+    
+    def test_cursor_walks_sessions_with_tied_keys(self, client, auth_headers, test_game):
+        """测试按游标翻页时 created_at 相同或为 NULL 的会话不重不漏，其他用户的会话不返回"""
+        from datetime import datetime
+        user = User.query.filter_by(username='testuser').first()
+        other = User(username='other', email='other@example.com')
+        other.set_password('password123')
+        db.session.add(other)
+        game = Game.query.filter_by(name='测试游戏').first()
+        created_at = datetime(2024, 1, 1)
+        for code, owner, created in (('CURSOR01', user, created_at), ('CURSOR02', user, datetime(2024, 1, 2)),
+                                     ('CURSOR03', user, created_at), ('CURSOR04', user, created_at),
+                                     ('CURSOR05', other, created_at)):
+            db.session.add(GameSession(session_code=code, game_id=game.id, user=owner, created_at=created))
+        db.session.commit()
+        GameSession.query.filter_by(session_code='CURSOR03').update({'created_at': None})
+        db.session.commit()
+        
+        for per_page in (1, 3):
+            sessions = walk_cursor(client, '/api/sessions/my-sessions', 'sessions', auth_headers, per_page)
+            # created_at 降序（NULL 排最后），再按 ID 降序
+            assert [session['session_code'] for session in sessions] == ['CURSOR02', 'CURSOR04', 'CURSOR01', 'CURSOR03']
+
+
+class TestSessionCodes:
+    """游戏会话代码分配测试类"""
+    
+    def test_permutation_is_bijective(self):
+        """测试带密钥的置换不产生重复，密钥不同时结果不同"""
+        numbers = list(range(5000)) + [CODE_SPACE - 1 - i for i in range(5000)]
+        results = {permute(b'key', number) for number in numbers}
+        assert len(results) == len(numbers) and all(0 <= result < CODE_SPACE for result in results)
+        assert permute(b'key', 12345) != permute(b'other', 12345)
+        assert encode(0) == 'AAAAAAAA' and encode(CODE_SPACE - 1) == '99999999'
+    
+    def test_codes_unique_without_queries(self, client, auth_headers, library_with_words):
+        """测试分配代码不查询数据库，同一进程内不重复"""
+        codes = [session_codes.next_code() for _ in range(3000)]
+        assert len(set(codes)) == 3000
+        assert all(validate_session_code(code) for code in codes)
+        
+        library, groups = library_with_words
+        with recorded_statements() as statements:
+            response = post_json(client, '/api/vocabulary-game/start',
+                                 {'library_id': library['id'], 'group_id': groups[0]['id']}, auth_headers)
+        assert validate_session_code(json.loads(response.data)['session_code'])
+        assert not any('game_sessions.session_code =' in statement for statement in statements)
+    
+    def test_code_key(self, app, monkeypatch):
+        """测试未配置密钥（SECRET_KEY 为默认值）时不使用公开的默认值"""
+        monkeypatch.setitem(app.config, 'SECRET_KEY', 'explode-word-secret-key-2024')
+        monkeypatch.setitem(app.config, 'SESSION_CODE_KEY', None)
+        session_codes.init_app(app)
+        assert session_codes.key != b'explode-word-secret-key-2024' and len(session_codes.key) == 32
+        
+        monkeypatch.setitem(app.config, 'SESSION_CODE_KEY', 'configured-key')
+        session_codes.init_app(app)
+        assert session_codes.key == b'configured-key'
+    
+    def test_retry_on_conflict(self, client, auth_headers, library_with_words, test_game, monkeypatch):
+        """测试代码冲突时只回滚保存点并换一个代码，同一事务中的其他修改保留"""
+        user = User.query.filter_by(username='testuser').first()
+        game = Game.query.filter_by(name='测试游戏').first()
+        db.session.add(GameSession(session_code='TAKEN001', game_id=game.id, user_id=user.id))
+        db.session.commit()
+        
+        codes = iter(['TAKEN001', 'FRESH001'])
+        monkeypatch.setattr(session_codes, 'next_code', lambda: next(codes))
+        library, groups = library_with_words
+        response = post_json(client, '/api/vocabulary-game/start',
+                             {'library_id': library['id'], 'group_id': groups[0]['id']}, auth_headers)
+        assert response.status_code == 200
+        assert json.loads(response.data)['session_code'] == 'FRESH001'
+        assert Game.query.filter_by(name='词库游戏').count() == 1
+        assert GameSession.query.count() == 2
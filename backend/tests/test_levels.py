@@ -0,0 +1,34 @@
+"""
+关卡相关测试
+"""
+from datetime import datetime
+from app import db
+from app.models.level import GameHistory, Level
+from app.models.user import User
+from tests.helpers import walk_cursor
+
+
+class TestGameHistory:
+    """游戏历史记录测试类"""
+    
+    def test_cursor_walks_history_with_tied_keys(self, client, auth_headers):
+        """测试按游标翻页时 played_at 相同或为 NULL 的记录不重不漏，其他用户的记录不返回"""
+        user = User.query.filter_by(username='testuser').first()
+        other = User(username='other', email='other@example.com')
+        other.set_password('password123')
+        level = Level(title='第一关', difficulty='简单')
+        db.session.add_all([other, level])
+        db.session.flush()
+        played_at = datetime(2024, 1, 1)
+        for score, user_id, played in ((10, user.id, played_at), (20, user.id, datetime(2024, 1, 2)),
+                                       (30, user.id, played_at), (40, user.id, played_at), (50, other.id, played_at)):
+            db.session.add(GameHistory(user_id=user_id, level_id=level.id, score=score, played_at=played))
+        db.session.commit()
+        GameHistory.query.filter_by(score=30).update({'played_at': None})
+        db.session.commit()
+        
+        for per_page in (1, 3):
+            histories = walk_cursor(client, '/api/levels/history', 'histories', auth_headers, per_page)
+            # played_at 降序（NULL 排最后），再按 ID 降序
+            assert [history['score'] for history in histories] == [20, 40, 10, 30]
+            assert histories[0]['level_title'] == '第一关'
@@ -0,0 +1,1276 @@
+"""
+词库管理相关测试
+"""
+import json
+import pytest
+from sqlalchemy import event
+from app import db
+from app.models.word import Word
+from app.models.search import CjkGram, reindex_cjk_grams
+from app.models.tag import Tag, reindex_tags, word_tags
+from app.utils.word_index import SortedWordIndex, word_index
+from app.utils.fuzzy import BKTree, fuzzy_indexes, levenshtein
+from app.utils.cache import InvalidationBus, LRUCache, redis_client
+from app.utils.catalog_cache import catalog_cache
+from app.models.vocabulary import VocabularyLibrary, WordGroup, VocabularyWord, rebuild_vocabulary_counters
+from app.models.job import ImportJob
+from tests.helpers import count_queries, patch_json, post_json, put_json, recorded_statements, wait_until, walk_cursor
+
+
+class TestVocabularyCounters:
+    """冗余计数测试类"""
+    
+    def test_counters_after_create(self, client, auth_headers, library_with_words):
+        """测试创建词组和单词后计数正确"""
+        library, groups = library_with_words
+        
+        response = client.get(f"/api/vocabulary/libraries/{library['id']}", headers=auth_headers)
+        result = json.loads(response.data)['data']
+        assert result['groups_count'] == 2
+        assert result['total_words_count'] == 5
+        
+        response = client.get(f"/api/vocabulary/groups/{groups[0]['id']}", headers=auth_headers)
+        assert json.loads(response.data)['data']['words_count'] == 3
+    
+    def test_counters_after_toggle_and_delete(self, client, auth_headers, library_with_words):
+        """测试启用状态切换和删除后计数正确"""
+        library, groups = library_with_words
+        word = VocabularyWord.query.filter_by(word='apple').first()
+        
+        put_json(client, f'/api/vocabulary/words/{word.id}', {'is_active': False}, auth_headers)
+        assert db.session.get(WordGroup, groups[0]['id']).words_count == 2
+        assert db.session.get(VocabularyLibrary, library['id']).words_count == 4
+        
+        put_json(client, f"/api/vocabulary/groups/{groups[1]['id']}", {'is_active': False}, auth_headers)
+        db.session.expire_all()
+        assert db.session.get(VocabularyLibrary, library['id']).groups_count == 1
+        assert db.session.get(VocabularyLibrary, library['id']).words_count == 2
+        
+        word = VocabularyWord.query.filter_by(word='banana').first()
+        client.delete(f'/api/vocabulary/words/{word.id}', headers=auth_headers)
+        db.session.expire_all()
+        assert db.session.get(WordGroup, groups[0]['id']).words_count == 1
+        assert db.session.get(VocabularyLibrary, library['id']).words_count == 1
+    
+    def test_counts_exclude_inactive_rows(self, client, auth_headers, library_with_words):
+        """测试接口返回的计数只统计启用的行（旧版本统计全部行，停用的词组和单词也计入）"""
+        library, groups = library_with_words
+        apple = VocabularyWord.query.filter_by(word='apple').first()
+        put_json(client, f'/api/vocabulary/words/{apple.id}', {'is_active': False}, auth_headers)
+        put_json(client, f"/api/vocabulary/groups/{groups[1]['id']}", {'is_active': False}, auth_headers)
+        db.session.expire_all()
+        
+        # 旧版本的计算方式：word_groups.count() 和逐个词组 vocabulary_words.count()
+        model = db.session.get(VocabularyLibrary, library['id'])
+        old_counts = (model.word_groups.count(), sum(group.vocabulary_words.count() for group in model.word_groups),
+                      db.session.get(WordGroup, groups[0]['id']).vocabulary_words.count())
+        assert old_counts == (2, 5, 3)
+        
+        result = json.loads(client.get(f"/api/vocabulary/libraries/{library['id']}", headers=auth_headers).data)['data']
+        group = json.loads(client.get(f"/api/vocabulary/groups/{groups[0]['id']}", headers=auth_headers).data)['data']
+        assert (result['groups_count'], result['total_words_count'], group['words_count']) == (1, 2, 2)
+    
+    def test_rebuild_counters(self, library_with_words):
+        """测试批量修复计数"""
+        library, groups = library_with_words
+        WordGroup.query.update({'words_count': 0})
+        VocabularyLibrary.query.update({'groups_count': 0, 'words_count': 0})
+        db.session.commit()
+        
+        rebuild_vocabulary_counters()
+        db.session.commit()
+        
+        assert db.session.get(WordGroup, groups[0]['id']).words_count == 3
+        library = db.session.get(VocabularyLibrary, library['id'])
+        assert library.groups_count == 2
+        assert library.words_count == 5
+
+
+class TestVocabularyAggregateLoading:
+    """列表计数批量加载测试类"""
+    
+    def test_load_counts(self, library_with_words):
+        """测试批量加载词库和词组计数"""
+        library, groups = library_with_words
+        counts = VocabularyLibrary.load_counts([library['id'], 999])
+        assert counts[library['id']] == {'groups_count': 2, 'total_words_count': 5}
+        assert counts[999] == {'groups_count': 0, 'total_words_count': 0}
+        
+        words_counts = WordGroup.load_words_counts([group['id'] for group in groups])
+        assert words_counts == {groups[0]['id']: 3, groups[1]['id']: 2}
+    
+    def test_library_listing_query_count_is_constant(self, client, auth_headers, library_with_words):
+        """测试词库列表的查询数量不随词库数量增长"""
+        _, first_count = count_queries(client, '/api/vocabulary-test/libraries')
+        
+        for i in range(5):
+            post_json(client, '/api/vocabulary/libraries', {'name': f'词库{i}'}, auth_headers)
+        
+        response, second_count = count_queries(client, '/api/vocabulary-test/libraries')
+        assert len(json.loads(response.data)['data']['libraries']) == 6
+        assert second_count == first_count
+
+
+class TestVocabularyWordSerialization:
+    """单词序列化测试类"""
+    
+    def test_word_listing_includes_context(self, client, auth_headers, library_with_words):
+        """测试单词列表包含词组和词库信息且不逐行查询"""
+        library, groups = library_with_words
+        url = f"/api/vocabulary/groups/{groups[0]['id']}/words"
+        
+        response, first_count = count_queries(client, url, auth_headers)
+        words = json.loads(response.data)['data']['words']
+        assert {word['group_name'] for word in words} == {'第一组'}
+        assert {word['library_name'] for word in words} == {'测试词库'}
+        
+        post_json(client, f"/api/vocabulary/groups/{groups[0]['id']}/words/batch",
+                  {'words': [{'word': f'extra{i}', 'translation': '额外'} for i in range(5)]}, auth_headers)
+        _, second_count = count_queries(client, url, auth_headers)
+        assert second_count == first_count
+    
+    def test_query_with_context(self, library_with_words):
+        """测试预加载查询一次取出词组和词库"""
+        word = VocabularyWord.query_with_context().filter(VocabularyWord.word == 'dog').first()
+        data = word.to_dict()
+        assert data['group_name'] == '第二组'
+        assert data['library_name'] == '测试词库'
+
+
+class TestVocabularyCursorPagination:
+    """游标分页测试类"""
+    
+    def test_cursor_walks_all_words(self, client, auth_headers, library_with_words):
+        """测试按游标翻页能不重不漏地取出全部单词"""
+        library, groups = library_with_words
+        url = f"/api/vocabulary/groups/{groups[0]['id']}/words"
+        
+        seen = []
+        cursor = ''
+        while True:
+            response = client.get(url, query_string={'cursor': cursor, 'per_page': 2}, headers=auth_headers)
+            data = json.loads(response.data)['data']
+            assert 'total' not in data['pagination']
+            seen.extend(word['word'] for word in data['words'])
+            if not data['pagination']['has_next']:
+                break
+            cursor = data['pagination']['next_cursor']
+        
+        assert sorted(seen) == ['apple', 'banana', 'cherry']
+        assert len(seen) == len(set(seen))
+    
+    def test_cursor_with_null_sort_order(self, client, auth_headers, library_with_words):
+        """测试排序列为 NULL 的单词不会被跳过"""
+        library, groups = library_with_words
+        VocabularyWord.query.filter_by(word='banana').update({'sort_order': None})
+        db.session.commit()
+        url = f"/api/vocabulary/groups/{groups[0]['id']}/words"
+        
+        seen = []
+        cursor = ''
+        while True:
+            response = client.get(url, query_string={'cursor': cursor, 'per_page': 1}, headers=auth_headers)
+            data = json.loads(response.data)['data']
+            seen.extend(word['word'] for word in data['words'])
+            if not data['pagination']['has_next']:
+                break
+            cursor = data['pagination']['next_cursor']
+        
+        assert sorted(seen) == ['apple', 'banana', 'cherry']
+    
+    def test_cursor_per_page_zero(self, client, auth_headers, library_with_words):
+        """测试 per_page=0 按每页 1 条处理"""
+        library, groups = library_with_words
+        response = client.get(f"/api/vocabulary/groups/{groups[0]['id']}/words",
+                              query_string={'cursor': '', 'per_page': 0}, headers=auth_headers)
+        assert response.status_code == 200
+        data = json.loads(response.data)['data']
+        assert len(data['words']) == 1
+        assert data['pagination']['has_next']
+    
+    def test_cursor_walks_libraries_with_tied_keys(self, client, auth_headers):
+        """测试词库列表翻页时 sort_order 为 NULL 与为 0 的词库并列、created_at 相同或为 NULL 时不重不漏"""
+        from datetime import datetime
+        for name, sort_order in (('甲', None), ('乙', 0), ('丙', 0), ('丁', None), ('戊', 1)):
+            db.session.add(VocabularyLibrary(name=name, sort_order=sort_order, created_at=datetime(2024, 1, 1)))
+        db.session.commit()
+        VocabularyLibrary.query.filter_by(name='丙').update({'created_at': None})
+        db.session.commit()
+        
+        for per_page in (1, 2):
+            libraries = walk_cursor(client, '/api/vocabulary/libraries', 'libraries', auth_headers, per_page)
+            # sort_order 升序（NULL 按 0），created_at 降序（NULL 排最后），再按 ID 降序
+            assert [library['name'] for library in libraries] == ['丁', '乙', '甲', '丙', '戊']
+    
+    def test_invalid_cursor(self, client, auth_headers, library_with_words):
+        """测试无效游标返回400"""
+        response = client.get('/api/vocabulary/libraries', query_string={'cursor': 'not-a-cursor'},
+                              headers=auth_headers)
+        assert response.status_code == 400
+
+
+class TestVocabularyFulltextSearch:
+    """全文检索测试类"""
+    
+    def search(self, client, auth_headers, group_id, keyword):
+        response = client.get(f'/api/vocabulary/groups/{group_id}/words',
+                              query_string={'search': keyword}, headers=auth_headers)
+        return [word['word'] for word in json.loads(response.data)['data']['words']]
+    
+    def test_search_uses_index_and_stays_in_sync(self, client, auth_headers, library_with_words):
+        """测试全文检索随新增、修改、删除同步"""
+        library, groups = library_with_words
+        group_id = groups[0]['id']
+        assert self.search(client, auth_headers, group_id, 'ban') == ['banana']
+        
+        word = VocabularyWord.query.filter_by(word='banana').first()
+        put_json(client, f'/api/vocabulary/words/{word.id}', {'word': 'blueberry', 'translation': '蓝莓'}, auth_headers)
+        assert self.search(client, auth_headers, group_id, 'ban') == []
+        assert self.search(client, auth_headers, group_id, 'blue') == ['blueberry']
+        
+        client.delete(f'/api/vocabulary/words/{word.id}', headers=auth_headers)
+        assert self.search(client, auth_headers, group_id, 'blue') == []
+    
+    def test_search_matches_substrings(self, client, auth_headers, library_with_words):
+        """测试全文检索与 LIKE 一样按子串匹配整个检索词"""
+        library, groups = library_with_words
+        group_id = groups[0]['id']
+        assert self.search(client, auth_headers, group_id, 'ple') == ['apple']
+        assert self.search(client, auth_headers, group_id, 'NAN') == ['banana']
+        assert self.search(client, auth_headers, group_id, 'an') == ['banana']
+        assert self.search(client, auth_headers, group_id, 'apple banana') == []
+    
+    def test_search_ranks_by_relevance(self, client, auth_headers, library_with_words):
+        """测试检索结果按相关度排序"""
+        library, groups = library_with_words
+        group_id = groups[1]['id']
+        post_json(client, f'/api/vocabulary/groups/{group_id}/words/batch', {'words': [
+            {'word': 'hotdog', 'translation': 'sausage'},
+            {'word': 'dog', 'translation': 'dog dog dog'},
+        ]}, auth_headers)
+        assert self.search(client, auth_headers, group_id, 'dog')[0] == 'dog'
+    
+    def test_words_search_endpoint(self, client):
+        """测试 /api/words/search 走全文索引"""
+        db.session.add_all([Word(word='hello', translation='你好'), Word(word='world', translation='世界')])
+        db.session.commit()
+        
+        response = client.get('/api/words/search', query_string={'q': 'wor'})
+        assert [word['word'] for word in json.loads(response.data)['words']] == ['world']
+        
+        response = client.get('/api/words/search', query_string={'q': '世界'})
+        assert [word['word'] for word in json.loads(response.data)['words']] == ['world']
+    
+    def test_cjk_search_uses_ngram_index(self, client, auth_headers, library_with_words):
+        """测试中文检索走 n-gram 索引并随修改同步"""
+        library, groups = library_with_words
+        group_id = groups[1]['id']
+        post_json(client, f'/api/vocabulary/groups/{group_id}/words/batch', {'words': [
+            {'word': 'puppy', 'translation': '小狗', 'example_translation': '一只可爱的小猫'},
+            {'word': 'kitten', 'translation': '小猫'},
+        ]}, auth_headers)
+        
+        assert self.search(client, auth_headers, group_id, '小猫') == ['kitten', 'puppy']
+        assert self.search(client, auth_headers, group_id, '狗') == ['puppy']
+        
+        word = VocabularyWord.query.filter_by(word='kitten').first()
+        put_json(client, f'/api/vocabulary/words/{word.id}', {'translation': '幼猫'}, auth_headers)
+        assert self.search(client, auth_headers, group_id, '小猫') == ['puppy']
+        assert CjkGram.query.filter_by(record_id=word.id, gram='小猫').count() == 0
+    
+    def test_reindex_cjk_grams(self, library_with_words):
+        """测试重建 n-gram 索引"""
+        CjkGram.query.delete()
+        db.session.commit()
+        
+        reindex_cjk_grams(VocabularyWord)
+        db.session.commit()
+        
+        word = VocabularyWord.query.filter_by(word='apple').first()
+        grams = {row.gram for row in CjkGram.query.filter_by(record_id=word.id)}
+        assert grams == {'的', '翻', '译', '的翻', '翻译'}
+
+
+class TestVocabularyWordSuggest:
+    """单词输入联想测试类"""
+    
+    def suggest(self, client, auth_headers, prefix, **params):
+        response = client.get('/api/vocabulary/words/suggest',
+                              query_string={'prefix': prefix, **params}, headers=auth_headers)
+        return [item['word'] for item in json.loads(response.data)['data']]
+    
+    def test_suggest_by_prefix(self, client, auth_headers, library_with_words):
+        """测试前缀联想和增量刷新"""
+        word_index.invalidate()
+        library, groups = library_with_words
+        post_json(client, f"/api/vocabulary/groups/{groups[1]['id']}/words/batch", {'words': [
+            {'word': 'Apricot', 'translation': '杏'},
+            {'word': 'avocado', 'translation': '牛油果'},
+        ]}, auth_headers)
+        
+        assert self.suggest(client, auth_headers, 'a') == ['apple', 'Apricot', 'avocado']
+        assert self.suggest(client, auth_headers, 'AP') == ['apple', 'Apricot']
+        assert self.suggest(client, auth_headers, 'a', limit=1) == ['apple']
+        assert self.suggest(client, auth_headers, 'a', group_id=groups[0]['id']) == ['apple']
+        
+        # 索引构建后的写入增量同步
+        word = VocabularyWord.query.filter_by(word='apple').first()
+        put_json(client, f'/api/vocabulary/words/{word.id}', {'word': 'pineapple'}, auth_headers)
+        post_json(client, f"/api/vocabulary/groups/{groups[0]['id']}/words",
+                  {'word': 'apex', 'translation': '顶点'}, auth_headers)
+        assert self.suggest(client, auth_headers, 'ap') == ['apex', 'Apricot']
+        
+        word = VocabularyWord.query.filter_by(word='apex').first()
+        client.delete(f'/api/vocabulary/words/{word.id}', headers=auth_headers)
+        assert self.suggest(client, auth_headers, 'ap') == ['Apricot']
+        assert self.suggest(client, auth_headers, 'pine') == ['pineapple']
+    
+    def test_suggest_skips_inactive_words(self, client, auth_headers, library_with_words):
+        """测试停用的单词不出现在联想中，重新启用后恢复"""
+        word_index.invalidate()
+        library, groups = library_with_words
+        word = VocabularyWord.query.filter_by(word='banana').first()
+        put_json(client, f'/api/vocabulary/words/{word.id}', {'is_active': False}, auth_headers)
+        assert self.suggest(client, auth_headers, 'b') == []
+        assert self.suggest(client, auth_headers, 'b', group_id=groups[0]['id']) == []
+        
+        put_json(client, f'/api/vocabulary/words/{word.id}', {'is_active': True}, auth_headers)
+        assert self.suggest(client, auth_headers, 'b', group_id=groups[0]['id']) == ['banana']
+        assert self.suggest(client, auth_headers, 'b', group_id=groups[1]['id']) == []
+    
+    def test_changes_reach_other_workers(self, library_with_words, redis_server):
+        """测试一个工作进程的单词修改通过失效广播刷新其他工作进程的索引"""
+        first, second = SortedWordIndex(), SortedWordIndex()
+        for index in (first, second):
+            client = redis_client(redis_server.url)
+            index.configure(bus=InvalidationBus(client, 'test:invalidate'))
+        assert [word for _, word, _ in second.suggest('a')] == ['apple']
+        
+        word = VocabularyWord.query.filter_by(word='apple').first()
+        word.word = 'apricot'
+        db.session.commit()
+        first.refresh([word.id])
+        assert wait_until(lambda: second._stale_ids == {word.id})
+        assert [word for _, word, _ in second.suggest('a')] == ['apricot']
+        
+        first.invalidate()
+        assert wait_until(lambda: not second.is_built)
+
+
+class TestFuzzySearch:
+    """容错检索测试类"""
+    
+    def test_levenshtein(self):
+        """测试编辑距离及提前结束"""
+        assert levenshtein('kitten', 'sitting') == 3
+        assert levenshtein('apple', 'apple') == 0
+        assert levenshtein('apple', 'banana', limit=1) == 2
+    
+    def test_bk_tree_matches_brute_force(self):
+        """测试 BK 树检索结果与逐个比较一致"""
+        words = ['apple', 'apply', 'ample', 'maple', 'angle', 'bangle', 'apples', 'happy', 'pale']
+        tree = BKTree()
+        for word in words:
+            tree.add(word)
+        for query in ('aple', 'apple', 'bagle'):
+            expected = sorted((levenshtein(query, w), w) for w in words if levenshtein(query, w) <= 2)
+            assert sorted(tree.search(query, 2)) == expected
+    
+    def test_fuzzy_word_search(self, client, auth_headers, library_with_words):
+        """测试单词列表的容错搜索"""
+        fuzzy_indexes[VocabularyWord].invalidate()
+        library, groups = library_with_words
+        response = client.get(f"/api/vocabulary/groups/{groups[0]['id']}/words",
+                              query_string={'search': 'banan', 'fuzzy': 'true'}, headers=auth_headers)
+        assert [word['word'] for word in json.loads(response.data)['data']['words']] == ['banana']
+        
+        post_json(client, f"/api/vocabulary/groups/{groups[0]['id']}/words",
+                  {'word': 'bananas', 'translation': '香蕉们'}, auth_headers)
+        response = client.get(f"/api/vocabulary/groups/{groups[0]['id']}/words",
+                              query_string={'search': 'banan', 'fuzzy': 'true'}, headers=auth_headers)
+        assert [word['word'] for word in json.loads(response.data)['data']['words']] == ['banana', 'bananas']
+    
+    def test_fuzzy_words_search_endpoint(self, client):
+        """测试 /api/words/search 的容错搜索"""
+        fuzzy_indexes[Word].invalidate()
+        db.session.add_all([Word(word='receive', translation='收到'), Word(word='believe', translation='相信')])
+        db.session.commit()
+        
+        response = client.get('/api/words/search', query_string={'q': 'recieve', 'fuzzy': 'true'})
+        assert [word['word'] for word in json.loads(response.data)['words']] == ['receive', 'believe']
+        
+        response = client.get('/api/words/search', query_string={'q': 'recieve', 'fuzzy': 'true', 'distance': 1})
+        assert json.loads(response.data)['words'] == []
+    
+    def test_fuzzy_filters_group_before_limit(self, client, auth_headers, library_with_words, monkeypatch):
+        """测试候选数上限在按词组和启用状态过滤之后计算"""
+        monkeypatch.setattr('app.utils.fuzzy.MAX_CANDIDATES', 2)
+        fuzzy_indexes[VocabularyWord].invalidate()
+        library, groups = library_with_words
+        post_json(client, f"/api/vocabulary/groups/{groups[1]['id']}/words/batch", {'words': [
+            {'word': word, 'translation': '近似'} for word in ('banana', 'bananas', 'banane')
+        ]}, auth_headers)
+        word = VocabularyWord.query.filter_by(group_id=groups[0]['id'], word='banana').first()
+        
+        index = fuzzy_indexes[VocabularyWord]
+        assert list(index.search('banan', scope=groups[0]['id'])) == [word.id]
+        assert index.search('banan', scope=groups[0]['id'], is_active=False) == {}
+        
+        put_json(client, f'/api/vocabulary/words/{word.id}', {'is_active': False}, auth_headers)
+        assert index.search('banan', scope=groups[0]['id'], is_active=True) == {}
+        assert list(index.search('banan', scope=groups[0]['id'], is_active=False)) == [word.id]
+    
+    def test_fuzzy_rebuilds_after_deletes(self, client, auth_headers, library_with_words, monkeypatch):
+        """测试已删除单词的树节点过多时重建"""
+        monkeypatch.setattr('app.utils.fuzzy.TOMBSTONE_MIN', 1)
+        index = fuzzy_indexes[VocabularyWord]
+        index.invalidate()
+        library, groups = library_with_words
+        index.search('apple')
+        assert index._tree.size == 5
+        
+        for name in ('apple', 'banana'):
+            word = VocabularyWord.query.filter_by(word=name).first()
+            client.delete(f'/api/vocabulary/words/{word.id}', headers=auth_headers)
+        assert index.search('aple') == {}
+        assert index._tree.size == 3
+
+
+class TestVocabularyTags:
+    """标签关联测试类"""
+    
+    def tag_words(self, client, auth_headers, tags_by_word):
+        for word, tags in tags_by_word.items():
+            word_id = VocabularyWord.query.filter_by(word=word).first().id
+            put_json(client, f'/api/vocabulary/words/{word_id}', {'tags': tags}, auth_headers)
+    
+    def list_words(self, client, auth_headers, group_id, tags):
+        response = client.get(f'/api/vocabulary/groups/{group_id}/words',
+                              query_string={'tags': tags}, headers=auth_headers)
+        return sorted(word['word'] for word in json.loads(response.data)['data']['words'])
+    
+    def test_tag_filter_matches_exact_tags(self, client, auth_headers, library_with_words):
+        """测试标签筛选按整个标签匹配且需同时带有全部标签"""
+        library, groups = library_with_words
+        self.tag_words(client, auth_headers, {'apple': ['CET4', '水果'], 'banana': ['CET46', '水果'], 'cherry': ['CET4']})
+        
+        assert self.list_words(client, auth_headers, groups[0]['id'], 'CET4') == ['apple', 'cherry']
+        assert self.list_words(client, auth_headers, groups[0]['id'], 'CET4,水果') == ['apple']
+        
+        self.tag_words(client, auth_headers, {'apple': ['CET6']})
+        assert self.list_words(client, auth_headers, groups[0]['id'], 'CET4') == ['cherry']
+        
+        post_json(client, '/api/vocabulary/libraries', {'name': '四级词库', 'tags': ['CET4']}, auth_headers)
+        response = client.get('/api/vocabulary/libraries', query_string={'tags': 'CET4'}, headers=auth_headers)
+        assert [lib['name'] for lib in json.loads(response.data)['data']['libraries']] == ['四级词库']
+    
+    def test_deleted_word_tags_removed(self, client, auth_headers, library_with_words):
+        """测试删除单词时同步删除标签关联"""
+        self.tag_words(client, auth_headers, {'apple': ['CET4']})
+        word_id = VocabularyWord.query.filter_by(word='apple').first().id
+        client.delete(f'/api/vocabulary/words/{word_id}', headers=auth_headers)
+        assert db.session.query(word_tags).filter(word_tags.c.record_id == word_id).count() == 0
+    
+    def test_facets(self, client, auth_headers, library_with_words):
+        """测试标签、难度、词性分布统计在一次查询中完成"""
+        library, groups = library_with_words
+        self.tag_words(client, auth_headers, {'apple': ['CET4', '水果'], 'banana': ['水果'], 'dog': ['CET4']})
+        word_id = VocabularyWord.query.filter_by(word='apple').first().id
+        put_json(client, f'/api/vocabulary/words/{word_id}', {'part_of_speech': 'n.', 'difficulty_level': 2}, auth_headers)
+        
+        response, queries = count_queries(client, f"/api/vocabulary/words/facets?library_id={library['id']}", auth_headers)
+        facets = json.loads(response.data)['data']
+        assert facets['tags'] == [{'value': 'CET4', 'count': 2}, {'value': '水果', 'count': 2}]
+        assert facets['difficulty_level'] == [{'value': 1, 'count': 4}, {'value': 2, 'count': 1}]
+        assert {'value': 'n.', 'count': 1} in facets['part_of_speech']
+        assert queries <= 2
+        
+        response = client.get('/api/vocabulary/words/facets',
+                              query_string={'group_id': groups[0]['id'], 'tags': 'CET4'}, headers=auth_headers)
+        assert json.loads(response.data)['data']['tags'] == [{'value': 'CET4', 'count': 1}, {'value': '水果', 'count': 1}]
+    
+    def test_reindex_tags(self, library_with_words):
+        """测试批量修改 tags 字段后重建标签关联"""
+        db.session.execute(VocabularyWord.__table__.update().values(tags='CET4, 水果,CET4'))
+        reindex_tags(VocabularyWord)
+        db.session.commit()
+        
+        query = VocabularyWord.query
+        assert Tag.filter_tagged(query, VocabularyWord, ['CET4', '水果']).count() == 5
+        assert Tag.query.count() == 2
+
+
+class TestConditionalRequests:
+    """ETag / 304 测试类"""
+    
+    def test_not_modified_skips_listing_query(self, client, auth_headers, library_with_words):
+        """测试 If-None-Match 命中时返回 304 且不执行列表查询"""
+        library, groups = library_with_words
+        url = f"/api/vocabulary/groups/{groups[0]['id']}/words"
+        response = client.get(url, headers=auth_headers)
+        etag = response.headers['ETag']
+        assert response.status_code == 200 and response.last_modified is not None
+        
+        _, full_queries = count_queries(client, url, auth_headers)
+        response, queries = count_queries(client, url, {**auth_headers, 'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+        assert queries < full_queries
+        
+        response = client.get(url, query_string={'page': 2}, headers={**auth_headers, 'If-None-Match': etag})
+        assert response.status_code == 200
+    
+    def test_child_write_changes_etag(self, client, auth_headers, library_with_words):
+        """测试单词写入递增词组和词库的内容版本号"""
+        library, groups = library_with_words
+        urls = [
+            '/api/vocabulary/libraries',
+            f"/api/vocabulary/libraries/{library['id']}",
+            f"/api/vocabulary/libraries/{library['id']}/groups",
+            f"/api/vocabulary/groups/{groups[0]['id']}",
+            f"/api/vocabulary/groups/{groups[0]['id']}/words",
+        ]
+        etags = {url: client.get(url, headers=auth_headers).headers['ETag'] for url in urls}
+        versions = (db.session.get(VocabularyLibrary, library['id']).content_version,
+                    db.session.get(WordGroup, groups[0]['id']).content_version,
+                    db.session.get(WordGroup, groups[1]['id']).content_version)
+        
+        word = VocabularyWord.query.filter_by(word='apple').first()
+        put_json(client, f'/api/vocabulary/words/{word.id}', {'translation': '苹果'}, auth_headers)
+        
+        db.session.expire_all()
+        assert db.session.get(VocabularyLibrary, library['id']).content_version == versions[0] + 1
+        assert db.session.get(WordGroup, groups[0]['id']).content_version == versions[1] + 1
+        assert db.session.get(WordGroup, groups[1]['id']).content_version == versions[2]
+        for url, etag in etags.items():
+            response = client.get(url, headers={**auth_headers, 'If-None-Match': etag})
+            assert response.status_code == 200, url
+
+
+    def test_library_list_etag_after_delete_and_create(self, client, auth_headers, library_with_words):
+        """测试删除一个词库再创建一个后，词库列表不会误返回 304"""
+        library, groups = library_with_words
+        post_json(client, '/api/vocabulary/libraries', {'name': '第二个词库'}, auth_headers)
+        response = client.get('/api/vocabulary/libraries', headers=auth_headers)
+        etag = response.headers['ETag']
+        assert response.last_modified is None
+        
+        second = VocabularyLibrary.query.filter_by(name='第二个词库').first()
+        client.delete(f'/api/vocabulary/libraries/{second.id}', headers=auth_headers)
+        post_json(client, '/api/vocabulary/libraries', {'name': '第三个词库'}, auth_headers)
+        response = client.get('/api/vocabulary/libraries', headers={**auth_headers, 'If-None-Match': etag})
+        assert response.status_code == 200
+        
+        response = client.get('/api/vocabulary/libraries',
+                              headers={**auth_headers, 'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+        assert response.status_code == 200
+
+
+class TestCatalogCache:
+    """词库目录缓存测试类"""
+    
+    def test_lru_skips_set_after_invalidation_during_load(self):
+        """测试加载期间键被删除或缓存被清空时不写入加载到的值"""
+        cache = LRUCache(ttl=0)
+        assert cache.get_or_set('a', lambda: cache.delete('a') or 'old') == 'old'
+        assert cache.get('a') is None
+        assert cache.get_or_set('a', lambda: cache.clear() or 'old') == 'old'
+        assert cache.get('a') is None
+        assert cache.get_or_set('a', lambda: cache.delete('b') or 'value') == 'value'
+        assert cache.get('a') == 'value'
+    
+    def test_lru_cache_bounded_by_bytes(self):
+        """测试按字节数淘汰最久未使用的条目"""
+        value = 'x' * 1000
+        cache = LRUCache(max_bytes=3500, ttl=0)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, value)
+        assert cache.get('a') == value
+        cache.set('d', value)
+        assert cache.get('b') is None
+        assert cache.get('a') == value
+        assert cache.set('big', 'x' * 5000) is False
+        
+        stats = cache.stats()
+        assert stats['evictions'] == 1
+        assert stats['hits'] == 2 and stats['misses'] == 1
+        assert stats['bytes'] <= 3500
+    
+    def test_lru_cache_ttl(self, monkeypatch):
+        """测试条目过期"""
+        import app.utils.cache as cache_module
+        now = [1000.0]
+        monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+        cache = LRUCache(ttl=10)
+        cache.set('a', 1)
+        assert cache.get('a') == 1
+        now[0] += 11
+        assert cache.get('a') is None
+        assert cache.stats()['expirations'] == 1
+    
+    def start_game(self, client, auth_headers, library, group):
+        return post_json(client, '/api/vocabulary-game/start',
+                         {'library_id': library['id'], 'group_id': group['id']}, auth_headers)
+    
+    def test_start_game_uses_cache(self, client, auth_headers, library_with_words):
+        """测试开始游戏时词库、词组和单词列表来自缓存，单词写入后失效"""
+        library, groups = library_with_words
+        self.start_game(client, auth_headers, library, groups[0])
+        misses = catalog_cache.local.misses
+        
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            response = self.start_game(client, auth_headers, library, groups[0])
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert response.status_code == 200
+        assert catalog_cache.local.misses == misses
+        assert not any('FROM vocabulary_words' in statement for statement in statements)
+        
+        post_json(client, f"/api/vocabulary/groups/{groups[0]['id']}/words",
+                  {'word': 'date', 'translation': '枣'}, auth_headers)
+        response = self.start_game(client, auth_headers, library, groups[0])
+        assert json.loads(response.data)['words_count'] == 4
+    
+    def test_library_metadata_invalidated_on_write(self, client, auth_headers, library_with_words):
+        """测试词库修改后缓存的词库和词组元数据失效"""
+        library, groups = library_with_words
+        url = f"/api/vocabulary/groups/{groups[0]['id']}"
+        assert json.loads(client.get(url, headers=auth_headers).data)['data']['library_name'] == '测试词库'
+        
+        put_json(client, f"/api/vocabulary/libraries/{library['id']}", {'name': '新词库'}, auth_headers)
+        assert json.loads(client.get(url, headers=auth_headers).data)['data']['library_name'] == '新词库'
+        response = client.get(f"/api/vocabulary/libraries/{library['id']}", headers=auth_headers)
+        assert json.loads(response.data)['data']['name'] == '新词库'
+        
+        response = client.get('/api/vocabulary/cache/stats', headers=auth_headers)
+        stats = json.loads(response.data)['data']
+        assert {'hits', 'misses', 'evictions', 'bytes', 'max_bytes'} <= set(stats)
+        
+        response = client.get('/api/vocabulary/libraries/9999', headers=auth_headers)
+        assert response.status_code == 404
+
+
+def capture_statements(client, url, headers):
+    """执行请求并记录执行的SQL语句"""
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return response, statements
+
+
+class TestSparseFieldsets:
+    """稀疏字段集测试类"""
+    
+    def test_words_fields(self, client, auth_headers, library_with_words):
+        """测试单词列表只查询和输出指定字段"""
+        library, groups = library_with_words
+        for cursor in ('', '&cursor='):
+            url = f"/api/vocabulary/groups/{groups[0]['id']}/words?fields=word,translation,phonetic{cursor}"
+            response, statements = capture_statements(client, url, auth_headers)
+            assert response.status_code == 200
+            words = json.loads(response.data)['data']['words']
+            assert len(words) == 3
+            assert all(set(word) == {'id', 'word', 'translation', 'phonetic'} for word in words)
+            select_words = [statement for statement in statements
+                            if statement.startswith('SELECT vocabulary_words.id') and 'LIMIT' in statement]
+            assert select_words and not any('example_sentence' in statement for statement in select_words)
+        
+        response = client.get(f"/api/vocabulary/groups/{groups[0]['id']}/words", headers=auth_headers)
+        assert 'example_sentence' in json.loads(response.data)['data']['words'][0]
+    
+    def test_word_and_library_fields(self, client, auth_headers, library_with_words):
+        """测试单词详情、词库列表和词库详情的字段裁剪"""
+        library, groups = library_with_words
+        word = VocabularyWord.query.filter_by(word='apple').first()
+        response = client.get(f'/api/vocabulary/words/{word.id}?fields=word,library_name', headers=auth_headers)
+        assert json.loads(response.data)['data'] == {'id': word.id, 'word': 'apple', 'library_name': '测试词库'}
+        
+        response = client.get('/api/vocabulary/libraries?fields=name,total_words_count', headers=auth_headers)
+        assert json.loads(response.data)['data']['libraries'] == [
+            {'id': library['id'], 'name': '测试词库', 'total_words_count': 5}
+        ]
+        response = client.get(f"/api/vocabulary/libraries/{library['id']}?fields=name", headers=auth_headers)
+        assert json.loads(response.data)['data'] == {'id': library['id'], 'name': '测试词库'}
+    
+    def test_game_words_fields(self, client, auth_headers, library_with_words):
+        """测试游戏单词接口的字段裁剪"""
+        library, groups = library_with_words
+        response = post_json(client, '/api/vocabulary-game/start',
+                             {'library_id': library['id'], 'group_id': groups[0]['id']}, auth_headers)
+        session_code = json.loads(response.data)['session_code']
+        response = client.get(f'/api/vocabulary-game/{session_code}/words?fields=english,chinese', headers=auth_headers)
+        words = json.loads(response.data)['words']
+        assert len(words) == 3 and all(set(word) == {'id', 'english', 'chinese'} for word in words)
+    
+    def test_words_api_fields(self, client):
+        """测试 /api/words 随机和搜索接口的字段裁剪"""
+        word = Word(word='hello', translation='你好')
+        db.session.add_all([word, Word(word='world', translation='世界')])
+        db.session.commit()
+        response = client.get('/api/words/random', query_string={'fields': 'word'})
+        words = json.loads(response.data)['words']
+        assert len(words) == 2 and all(set(item) == {'id', 'word'} for item in words)
+        response = client.get('/api/words/search', query_string={'q': 'hello', 'fields': 'translation,category_name'})
+        assert json.loads(response.data)['words'] == [{'id': word.id, 'translation': '你好', 'category_name': None}]
+        response = client.get('/api/words/random', query_string={'fields': 'secret'})
+        assert response.status_code == 400
+    
+    def test_unknown_field(self, client, auth_headers, library_with_words):
+        """测试未知字段返回400"""
+        library, groups = library_with_words
+        response = client.get(f"/api/vocabulary/groups/{groups[0]['id']}/words?fields=word,secret", headers=auth_headers)
+        assert response.status_code == 400
+        assert 'secret' in json.loads(response.data)['message']
+
+
+class TestLibraryExport:
+    """词库导出测试类"""
+    
+    def test_export_ndjson(self, client, auth_headers, library_with_words):
+        """测试按词组顺序导出 NDJSON"""
+        library, groups = library_with_words
+        response = client.get(f"/api/vocabulary/libraries/{library['id']}/export", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        assert 'Content-Encoding' not in response.headers
+        rows = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+        assert [(row['group'], row['word']) for row in rows] == [
+            ('第一组', 'apple'), ('第一组', 'banana'), ('第一组', 'cherry'), ('第二组', 'dog'), ('第二组', 'egg')
+        ]
+        assert rows[0]['translation'] == 'apple的翻译' and rows[0]['tags'] == []
+    
+    def test_export_csv_gzip(self, client, auth_headers, library_with_words):
+        """测试 gzip 压缩的 CSV 导出"""
+        import csv
+        import gzip
+        import io
+        library, groups = library_with_words
+        response = client.get(f"/api/vocabulary/libraries/{library['id']}/export?format=csv",
+                              headers={**auth_headers, 'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.data).decode('utf-8-sig'))))
+        assert len(rows) == 5
+        assert rows[3]['group'] == '第二组' and rows[3]['word'] == 'dog'
+    
+    def test_export_in_batches(self, app, auth_headers, library_with_words):
+        """测试按批读取和输出"""
+        from app.utils.export import export_library
+        library, groups = library_with_words
+        chunks = list(export_library(library['id'], 'ndjson', batch_size=2))
+        assert len(chunks) == 3
+        assert b''.join(chunks).count(b'\n') == 5
+    
+    def test_export_errors(self, client, auth_headers, library_with_words):
+        """测试不支持的格式和不存在的词库"""
+        library, groups = library_with_words
+        response = client.get(f"/api/vocabulary/libraries/{library['id']}/export?format=xml", headers=auth_headers)
+        assert response.status_code == 400
+        response = client.get('/api/vocabulary/libraries/9999/export', headers=auth_headers)
+        assert response.status_code == 404
+
+
+class TestStreamingImport:
+    """单词流式导入测试类"""
+    
+    def upload(self, client, url, content, filename, headers):
+        import io
+        return client.post(url, data={'file': (io.BytesIO(content.encode('utf-8')), filename)},
+                           content_type='multipart/form-data', headers=headers)
+    
+    def test_import_csv_to_group(self, client, auth_headers, library_with_words):
+        """测试分块导入 CSV，跳过已存在、重复和不合法的行"""
+        library, groups = library_with_words
+        content = (
+            'word,translation,tags,difficulty_level\n'
+            'apple,苹果,,1\n'
+            'grape,葡萄,水果,2\n'
+            'lemon,柠檬,"水果,黄色",\n'
+            'grape,葡萄,,\n'
+            'melon,,,\n'
+            'kiwi,猕猴桃,,9\n'
+            'mango,芒果,,\n'
+        )
+        response = self.upload(client, f"/api/vocabulary/groups/{groups[0]['id']}/words/import?chunk_size=2",
+                               content, 'words.csv', auth_headers)
+        result = json.loads(response.data)['data']
+        assert result['total_count'] == 7
+        assert result['created_count'] == 3
+        assert result['chunks'] == 3
+        assert [error['line'] for error in result['errors']] == [2, 5, 6, 7]
+        
+        response = client.get(f"/api/vocabulary/libraries/{library['id']}", headers=auth_headers)
+        assert json.loads(response.data)['data']['total_words_count'] == 8
+        assert db.session.get(WordGroup, groups[0]['id']).words_count == 6
+        
+        lemon = VocabularyWord.query.filter_by(word='lemon').first()
+        assert lemon.get_tags_list() == ['水果', '黄色']
+        response = client.get(f"/api/vocabulary/groups/{groups[0]['id']}/words?tags=水果", headers=auth_headers)
+        assert {word['word'] for word in json.loads(response.data)['data']['words']} == {'grape', 'lemon'}
+        response = client.get(f"/api/vocabulary/groups/{groups[0]['id']}/words?search=柠檬", headers=auth_headers)
+        assert [word['word'] for word in json.loads(response.data)['data']['words']] == ['lemon']
+        response = client.get('/api/vocabulary/words/suggest?prefix=man', headers=auth_headers)
+        assert [item['word'] for item in json.loads(response.data)['data']] == ['mango']
+    
+    def test_export_then_import_library(self, client, auth_headers, library_with_words):
+        """测试导出的 NDJSON 可原样导入新词库，词组按名称创建"""
+        library, groups = library_with_words
+        exported = client.get(f"/api/vocabulary/libraries/{library['id']}/export", headers=auth_headers).data
+        target = json.loads(post_json(client, '/api/vocabulary/libraries', {'name': '副本'}, auth_headers).data)['data']
+        
+        response = client.post(f"/api/vocabulary/libraries/{target['id']}/import", data=exported + b'{bad json\n',
+                               content_type='application/x-ndjson', headers=auth_headers)
+        result = json.loads(response.data)['data']
+        assert result['created_count'] == 5
+        assert result['errors'] == [{'line': 6, 'message': 'JSON 格式错误'}]
+        
+        response = client.get(f"/api/vocabulary/libraries/{target['id']}/groups", headers=auth_headers)
+        target_groups = json.loads(response.data)['data']['groups']
+        assert sorted((group['name'], group['words_count']) for group in target_groups) == [('第一组', 3), ('第二组', 2)]
+        assert db.session.get(VocabularyLibrary, target['id']).words_count == 5
+    
+    def test_import_errors(self, client, auth_headers, library_with_words):
+        """测试格式无法识别和目标不存在"""
+        library, groups = library_with_words
+        response = client.post(f"/api/vocabulary/groups/{groups[0]['id']}/words/import", data=b'x',
+                               content_type='application/octet-stream', headers=auth_headers)
+        assert response.status_code == 400
+        response = client.post('/api/vocabulary/groups/9999/words/import?format=csv', data=b'word,translation\n',
+                               content_type='text/csv', headers=auth_headers)
+        assert response.status_code == 404
+
+
+class TestImportJobs:
+    """后台导入任务测试类"""
+    
+    def test_background_file_import(self, client, auth_headers, library_with_words):
+        """测试后台导入返回任务，并可查询进度和结果"""
+        import io
+        import os
+        library, groups = library_with_words
+        content = 'word,translation\ngrape,葡萄\napple,苹果\nlemon,柠檬\n'
+        response = client.post(f"/api/vocabulary/groups/{groups[0]['id']}/words/import?background=true&chunk_size=1",
+                               data={'file': (io.BytesIO(content.encode('utf-8')), 'words.csv')},
+                               content_type='multipart/form-data', headers=auth_headers)
+        assert response.status_code == 202
+        job_id = json.loads(response.data)['data']['id']
+        
+        response = client.get(f'/api/vocabulary/jobs/{job_id}', headers=auth_headers)
+        job = json.loads(response.data)['data']
+        assert job['status'] == 'succeeded'
+        assert (job['created_count'], job['error_count'], job['chunks'], job['processed_line']) == (2, 1, 3, 4)
+        assert job['errors'] == [{'line': 3, 'message': '单词"apple"已存在'}]
+        assert not os.path.exists(db.session.get(ImportJob, job_id).source_path)
+    
+    def test_background_batch(self, client, auth_headers, library_with_words):
+        """测试 JSON 批量接口的后台模式"""
+        library, groups = library_with_words
+        response = post_json(client, f"/api/vocabulary/groups/{groups[1]['id']}/words/batch?background=true",
+                             {'words': [{'word': 'fish', 'translation': '鱼'}, {'word': 'goat'}]}, auth_headers)
+        assert response.status_code == 202
+        job = json.loads(client.get(f"/api/vocabulary/jobs/{json.loads(response.data)['data']['id']}",
+                                    headers=auth_headers).data)['data']
+        assert job['status'] == 'succeeded' and job['created_count'] == 1 and job['error_count'] == 1
+    
+    def make_interrupted_job(self, app, group, content, **values):
+        """模拟执行到一半时工作进程退出的任务"""
+        from datetime import datetime, timedelta
+        from app.utils.jobs import save_upload
+        import io
+        job = ImportJob(
+            library_id=group['library_id'], group_id=group['id'], import_format='csv', chunk_size=2,
+            source_path=save_upload(io.BytesIO(content.encode('utf-8')), app.config['IMPORT_JOB_DIR']),
+            status=ImportJob.STATUS_RUNNING, heartbeat_at=datetime.utcnow() - timedelta(hours=1), **values
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job.id
+    
+    def test_resume_interrupted_job(self, app, client, auth_headers, library_with_words):
+        """测试心跳超时的任务被接手，并从最后提交的行继续"""
+        library, groups = library_with_words
+        post_json(client, f"/api/vocabulary/groups/{groups[0]['id']}/words/batch",
+                  {'words': [{'word': 'grape', 'translation': '葡萄'}]}, auth_headers)
+        content = 'word,translation\ngrape,葡萄\n,\nlemon,柠檬\nmango,芒果\n'
+        job_id = self.make_interrupted_job(app, groups[0], content, attempts=1, processed_line=2,
+                                           total_count=1, created_count=1, chunks=1)
+        
+        job = json.loads(client.get(f'/api/vocabulary/jobs/{job_id}', headers=auth_headers).data)['data']
+        assert job['status'] == 'succeeded'
+        assert job['attempts'] == 2
+        assert (job['created_count'], job['error_count'], job['total_count']) == (3, 0, 3)
+        assert db.session.get(WordGroup, groups[0]['id']).words_count == 6
+    
+    def test_give_up_after_max_attempts(self, app, client, auth_headers, library_with_words):
+        """测试多次中断的任务标记为失败"""
+        library, groups = library_with_words
+        job_id = self.make_interrupted_job(app, groups[0], 'word,translation\n', attempts=3)
+        job = json.loads(client.get(f'/api/vocabulary/jobs/{job_id}', headers=auth_headers).data)['data']
+        assert job['status'] == 'failed' and '中断' in job['message']
+    
+    def test_running_job_not_recovered(self, app, library_with_words):
+        """测试执行中的任务（单块耗时超过心跳超时）不会被接手"""
+        from app.utils.jobs import JobHeartbeat, import_jobs, worker_name
+        library, groups = library_with_words
+        job_id = self.make_interrupted_job(app, groups[0], 'word,translation\n', attempts=1, worker=worker_name())
+        
+        # 本进程仍在执行的任务即使心跳超时也不接手
+        import_jobs._running.add(job_id)
+        try:
+            assert import_jobs.recover(job_id) is False
+        finally:
+            import_jobs._running.discard(job_id)
+        
+        # 心跳线程刷新心跳后，其他进程也不会接手
+        assert JobHeartbeat(app, job_id, worker_name(), 1, 1).beat() is True
+        assert import_jobs.recover(job_id) is False
+        assert db.session.get(ImportJob, job_id, populate_existing=True).status == ImportJob.STATUS_RUNNING
+        
+        # 任务已被其他执行接手时不再刷新
+        assert JobHeartbeat(app, job_id, worker_name(), 2, 1).beat() is False
+
+
+class TestUpsertImport:
+    """批量导入冲突处理测试类"""
+    
+    def test_batch_update_existing(self, client, auth_headers, library_with_words):
+        """测试 on_conflict=update 更新记录中出现的字段，未出现的字段保持不变"""
+        library, groups = library_with_words
+        apple = VocabularyWord.query.filter_by(word='apple').first()
+        put_json(client, f'/api/vocabulary/words/{apple.id}', {'notes': '常用', 'tags': ['水果']}, auth_headers)
+        
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            response = post_json(client, f"/api/vocabulary/groups/{groups[0]['id']}/words/batch?on_conflict=update",
+                                 {'words': [
+                                     {'word': 'apple', 'translation': '苹果'},
+                                     {'word': 'banana', 'translation': '香蕉', 'tags': ['黄色'], 'is_active': False},
+                                     {'word': 'grape', 'translation': '葡萄'},
+                                     {'word': 'grape', 'translation': '提子', 'difficulty_level': 2},
+                                 ]}, auth_headers)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        result = json.loads(response.data)['data']
+        assert (result['created_count'], result['updated_count'], result['error_count']) == (1, 3, 0)
+        # 每种字段组合一条 INSERT ... ON CONFLICT
+        assert len([statement for statement in statements if 'ON CONFLICT' in statement]) == 3
+        
+        db.session.expire_all()
+        apple = VocabularyWord.query.filter_by(word='apple').first()
+        assert (apple.translation, apple.notes, apple.get_tags_list()) == ('苹果', '常用', ['水果'])
+        grape = VocabularyWord.query.filter_by(word='grape').first()
+        assert (grape.translation, grape.difficulty_level) == ('提子', 2)
+        assert db.session.get(WordGroup, groups[0]['id']).words_count == 3
+        assert db.session.get(VocabularyLibrary, library['id']).words_count == 5
+        
+        response = client.get(f"/api/vocabulary/groups/{groups[0]['id']}/words?search=苹果", headers=auth_headers)
+        assert [word['word'] for word in json.loads(response.data)['data']['words']] == ['apple']
+        banana = VocabularyWord.query.filter_by(word='banana').first()
+        assert (banana.is_active, banana.get_tags_list()) == (False, ['黄色'])
+        assert db.session.execute(db.select(Tag.name).join(word_tags, word_tags.c.tag_id == Tag.id).where(
+            word_tags.c.record_id == banana.id)).scalars().all() == ['黄色']
+    
+    def test_import_skip_existing(self, client, auth_headers, library_with_words):
+        """测试 on_conflict=skip 跳过已存在的单词且不记为错误"""
+        library, groups = library_with_words
+        response = client.post(f"/api/vocabulary/groups/{groups[1]['id']}/words/import?on_conflict=skip",
+                               data='word,translation\ndog,狗\nfish,鱼\nfish,鱼\n'.encode('utf-8'),
+                               content_type='text/csv', headers=auth_headers)
+        result = json.loads(response.data)['data']
+        assert (result['created_count'], result['skipped_count'], result['error_count']) == (1, 2, 0)
+        assert VocabularyWord.query.filter_by(word='dog').first().translation == 'dog的翻译'
+        assert db.session.get(WordGroup, groups[1]['id']).words_count == 3
+    
+    def test_background_update(self, client, auth_headers, library_with_words):
+        """测试后台任务保存 on_conflict 并按其执行"""
+        library, groups = library_with_words
+        response = post_json(client, f"/api/vocabulary/groups/{groups[1]['id']}/words/batch?background=true&on_conflict=update",
+                             {'words': [{'word': 'egg', 'translation': '鸡蛋'}]}, auth_headers)
+        job = json.loads(response.data)['data']
+        assert job['on_conflict'] == 'update'
+        job = json.loads(client.get(f"/api/vocabulary/jobs/{job['id']}", headers=auth_headers).data)['data']
+        assert (job['status'], job['created_count'], job['updated_count']) == ('succeeded', 0, 1)
+        assert VocabularyWord.query.filter_by(word='egg').first().translation == '鸡蛋'
+    
+    def test_invalid_mode_and_unique_index(self, client, auth_headers, library_with_words):
+        """测试不合法的 on_conflict 参数，以及 (group_id, word) 唯一索引"""
+        from sqlalchemy.exc import IntegrityError
+        library, groups = library_with_words
+        response = post_json(client, f"/api/vocabulary/groups/{groups[0]['id']}/words/batch?on_conflict=merge",
+                             {'words': [{'word': 'apple', 'translation': '苹果'}]}, auth_headers)
+        assert response.status_code == 400
+        
+        db.session.add(VocabularyWord(word='apple', translation='苹果', group_id=groups[0]['id']))
+        with pytest.raises(IntegrityError):
+            db.session.flush()
+        db.session.rollback()
+    
+    def test_test_api_batch_import(self, client, auth_headers, library_with_words):
+        """测试无需认证的批量导入接口同样支持 on_conflict"""
+        library, groups = library_with_words
+        url = f"/api/vocabulary-test/groups/{groups[0]['id']}/words/batch"
+        words = {'words': [{'word': 'apple', 'translation': '红苹果'}, {'word': 'kiwi', 'translation': '猕猴桃'}]}
+        result = json.loads(post_json(client, url, words, {}).data)['data']
+        assert (result['created_count'], result['error_count']) == (1, 1)
+        assert result['errors'] == ['第1行：单词"apple"已存在']
+        
+        result = json.loads(post_json(client, f'{url}?on_conflict=update', words, {}).data)['data']
+        assert (result['created_count'], result['updated_count']) == (0, 2)
+        assert VocabularyWord.query.filter_by(word='apple', group_id=groups[0]['id']).one().translation == '红苹果'
+        assert post_json(client, f'{url}?on_conflict=merge', words, {}).status_code == 400
+    
+    def test_test_api_batch_import_single_commit(self, client, library_with_words, app, monkeypatch):
+        """测试无需认证的批量导入接口整个列表只提交一次，不合法的难度等级按 1 处理"""
+        monkeypatch.setitem(app.config, 'VOCABULARY_IMPORT_CHUNK_SIZE', 1)
+        library, groups = library_with_words
+        commits = []
+        listener = lambda session: commits.append(session)
+        event.listen(db.session, 'after_commit', listener)
+        try:
+            response = post_json(client, f"/api/vocabulary-test/groups/{groups[1]['id']}/words/batch", {'words': [
+                {'word': 'fig', 'translation': '无花果', 'difficulty_level': 9},
+                {'word': 'lime', 'translation': '青柠', 'difficulty_level': '3'},
+                {'word': 'plum', 'translation': '李子', 'difficulty_level': 4},
+            ]}, {})
+        finally:
+            event.remove(db.session, 'after_commit', listener)
+        result = json.loads(response.data)['data']
+        assert (result['created_count'], result['error_count']) == (3, 0)
+        assert len(commits) == 1
+        levels = dict(db.session.execute(db.select(VocabularyWord.word, VocabularyWord.difficulty_level).where(
+            VocabularyWord.group_id == groups[1]['id'], VocabularyWord.word.in_(['fig', 'lime', 'plum']))).all())
+        assert levels == {'fig': 1, 'lime': 1, 'plum': 4}
+    
+    def test_case_insensitive_conflicts(self, client, auth_headers, library_with_words):
+        """测试 MySQL 排序规则下只差大小写或重音的单词按已存在处理，逐行报告而不是整块写入失败"""
+        from app.utils.importer import WordImporter, fold_word
+        library, groups = library_with_words
+        assert fold_word('Café') == fold_word('cafe') == 'cafe'
+        
+        importer = WordImporter(group_id=groups[1]['id'], on_conflict='error')
+        importer.fold_case = True
+        result = importer.run(enumerate([{'word': 'Kiwi', 'translation': '猕猴桃'},
+                                         {'word': 'kiwi', 'translation': '奇异果'}], 1))
+        assert (result['created_count'], result['error_count']) == (1, 1)
+        assert result['errors'] == [{'line': 2, 'message': '单词"kiwi"已存在'}]
+    
+    def test_unsupported_dialect(self, client, auth_headers, library_with_words, monkeypatch):
+        """测试不支持冲突处理子句的数据库返回 400 而不是写入失败"""
+        monkeypatch.setattr('app.utils.importer.UPSERT_DIALECTS', {})
+        library, groups = library_with_words
+        response = post_json(client, f"/api/vocabulary/groups/{groups[0]['id']}/words/batch?on_conflict=skip",
+                             {'words': [{'word': 'apple', 'translation': '苹果'}]}, auth_headers)
+        assert response.status_code == 400
+        assert 'on_conflict=skip' in json.loads(response.data)['message']
+        response = client.post(f"/api/vocabulary/groups/{groups[0]['id']}/words/import?on_conflict=update",
+                               data='word,translation\napple,苹果\n'.encode('utf-8'), content_type='text/csv',
+                               headers=auth_headers)
+        assert response.status_code == 400
+
+
+class TestBulkOperations:
+    """批量修改、删除和排序测试类"""
+    
+    def word_ids(self, *words):
+        return [VocabularyWord.query.filter_by(word=word).first().id for word in words]
+    
+    def test_bulk_update_words(self, client, auth_headers, library_with_words):
+        """测试批量停用单词并设置标签：一条 UPDATE，计数和标签关联同步"""
+        library, groups = library_with_words
+        ids = self.word_ids('apple', 'banana', 'dog')
+        with recorded_statements() as statements:
+            response = patch_json(client, '/api/vocabulary/words/bulk', {
+                'ids': ids + [9999], 'changes': {'is_active': False, 'tags': ['复习']}
+            }, auth_headers)
+        result = json.loads(response.data)['data']
+        assert (result['count'], result['missing_ids']) == (3, [9999])
+        assert len([statement for statement in statements if statement.startswith('UPDATE vocabulary_words')]) == 1
+        
+        assert db.session.get(WordGroup, groups[0]['id']).words_count == 1
+        assert db.session.get(WordGroup, groups[1]['id']).words_count == 1
+        assert db.session.get(VocabularyLibrary, library['id']).words_count == 2
+        assert Tag.query.filter_by(name='复习').first() is not None
+        assert sorted(db.session.execute(db.select(word_tags.c.record_id)).scalars().all()) == sorted(ids)
+        
+        response = client.get(f"/api/vocabulary/groups/{groups[0]['id']}", headers=auth_headers)
+        assert json.loads(response.data)['data']['words_count'] == 1
+    
+    def test_bulk_delete_words(self, client, auth_headers, library_with_words):
+        """测试批量删除单词后计数、联想索引和 n-gram 索引同步"""
+        library, groups = library_with_words
+        client.get('/api/vocabulary/words/suggest?prefix=a', headers=auth_headers)
+        ids = self.word_ids('apple', 'egg')
+        response = client.delete('/api/vocabulary/words/bulk', data=json.dumps({'ids': ids}),
+                                  content_type='application/json', headers=auth_headers)
+        assert json.loads(response.data)['data']['count'] == 2
+        
+        assert VocabularyWord.query.filter(VocabularyWord.id.in_(ids)).count() == 0
+        assert CjkGram.query.filter(CjkGram.source == 'vocabulary_words', CjkGram.record_id.in_(ids)).count() == 0
+        assert db.session.get(VocabularyLibrary, library['id']).words_count == 3
+        response = client.get('/api/vocabulary/words/suggest?prefix=a', headers=auth_headers)
+        assert json.loads(response.data)['data'] == []
+    
+    def test_reorder_words_and_groups(self, client, auth_headers, library_with_words):
+        """测试用一条 CASE 更新重新排序"""
+        library, groups = library_with_words
+        ids = self.word_ids('apple', 'banana', 'cherry')
+        with recorded_statements() as statements:
+            response = put_json(client, '/api/vocabulary/words/order', {
+                'items': [{'id': ids[0], 'sort_order': 3}, {'id': ids[1], 'sort_order': 1}, [ids[2], 2]]
+            }, auth_headers)
+        assert json.loads(response.data)['data']['count'] == 3
+        updates = [statement for statement in statements if statement.startswith('UPDATE vocabulary_words')]
+        assert len(updates) == 1 and 'CASE' in updates[0]
+        response = client.get(f"/api/vocabulary/groups/{groups[0]['id']}/words", headers=auth_headers)
+        assert [word['word'] for word in json.loads(response.data)['data']['words']] == ['banana', 'cherry', 'apple']
+        
+        version = db.session.get(VocabularyLibrary, library['id']).content_version
+        put_json(client, '/api/vocabulary/groups/order',
+                 {'items': [{'id': groups[0]['id'], 'sort_order': 2}, {'id': groups[1]['id'], 'sort_order': 1}]},
+                 auth_headers)
+        response = client.get(f"/api/vocabulary/libraries/{library['id']}/groups", headers=auth_headers)
+        assert [group['name'] for group in json.loads(response.data)['data']['groups']] == ['第二组', '第一组']
+        assert db.session.get(VocabularyLibrary, library['id']).content_version > version
+    
+    def test_bulk_groups(self, client, auth_headers, library_with_words):
+        """测试批量停用词组和删除空词组"""
+        library, groups = library_with_words
+        response = patch_json(client, '/api/vocabulary/groups/bulk',
+                              {'ids': [groups[1]['id']], 'changes': {'is_active': False}}, auth_headers)
+        assert response.status_code == 200
+        library_row = db.session.get(VocabularyLibrary, library['id'])
+        assert (library_row.groups_count, library_row.words_count) == (1, 3)
+        
+        empty = json.loads(post_json(client, f"/api/vocabulary/libraries/{library['id']}/groups",
+                                     {'name': '空词组'}, auth_headers).data)['data']
+        response = client.delete('/api/vocabulary/groups/bulk', data=json.dumps({'ids': [groups[0]['id'], empty['id']]}),
+                                 content_type='application/json', headers=auth_headers)
+        assert response.status_code == 400
+        assert db.session.get(WordGroup, empty['id']) is not None
+        
+        response = client.delete('/api/vocabulary/groups/bulk', data=json.dumps({'ids': [empty['id']]}),
+                                 content_type='application/json', headers=auth_headers)
+        assert json.loads(response.data)['data']['count'] == 1
+        assert db.session.get(VocabularyLibrary, library['id']).groups_count == 1
+    
+    def test_invalid_requests(self, client, auth_headers, library_with_words):
+        """测试不合法的批量参数"""
+        ids = self.word_ids('apple')
+        for data in ({'ids': ids, 'changes': {'word': 'x'}}, {'ids': ids, 'changes': {'difficulty_level': 9}},
+                     {'ids': 'all', 'changes': {'is_active': True}}, {'ids': ids}):
+            assert patch_json(client, '/api/vocabulary/words/bulk', data, auth_headers).status_code == 400
+        assert put_json(client, '/api/vocabulary/words/order', {'items': [{'id': ids[0]}]},
+                        auth_headers).status_code == 400
+
+
+class TestLibraryClone:
+    """词库复制测试类"""
+    
+    def test_clone_library(self, client, auth_headers, library_with_words):
+        """测试复制词库的词组、单词、标签和检索索引，且与源词库互不影响"""
+        library, groups = library_with_words
+        apple = VocabularyWord.query.filter_by(word='apple').first()
+        put_json(client, f'/api/vocabulary/words/{apple.id}', {'translation': '苹果', 'tags': ['水果']}, auth_headers)
+        
+        with recorded_statements() as statements:
+            response = post_json(client, f"/api/vocabulary/libraries/{library['id']}/clone", {}, auth_headers)
+        assert response.status_code == 201
+        clone = json.loads(response.data)['data']
+        assert clone['name'] == '测试词库（副本）'
+        assert (clone['groups_count'], clone['total_words_count']) == (2, 5)
+        assert not any(statement.startswith('INSERT INTO vocabulary_words') and 'SELECT' not in statement
+                       for statement in statements)
+        
+        response = client.get(f"/api/vocabulary/libraries/{clone['id']}/groups", headers=auth_headers)
+        cloned_groups = json.loads(response.data)['data']['groups']
+        assert sorted((group['name'], group['words_count']) for group in cloned_groups) == [('第一组', 3), ('第二组', 2)]
+        first = next(group for group in cloned_groups if group['name'] == '第一组')
+        
+        response = client.get(f"/api/vocabulary/groups/{first['id']}/words?search=苹果", headers=auth_headers)
+        words = json.loads(response.data)['data']['words']
+        assert [(word['word'], word['tags']) for word in words] == [('apple', ['水果'])]
+        response = client.get(f"/api/vocabulary/groups/{first['id']}/words?tags=水果", headers=auth_headers)
+        assert [word['id'] for word in json.loads(response.data)['data']['words']] == [words[0]['id']]
+        assert words[0]['id'] != apple.id
+        
+        # 修改副本不影响源词库
+        put_json(client, f"/api/vocabulary/words/{words[0]['id']}", {'translation': '苹果树'}, auth_headers)
+        assert db.session.get(VocabularyWord, apple.id).translation == '苹果'
+        response = post_json(client, f"/api/vocabulary/libraries/{library['id']}/clone", {}, auth_headers)
+        assert json.loads(response.data)['data']['name'] == '测试词库（副本2）'
+    
+    def test_clone_errors(self, client, auth_headers, library_with_words):
+        """测试源词库不存在和名称重复"""
+        library, groups = library_with_words
+        response = post_json(client, '/api/vocabulary/libraries/9999/clone', {}, auth_headers)
+        assert response.status_code == 404
+        response = post_json(client, f"/api/vocabulary/libraries/{library['id']}/clone", {'name': '测试词库'}, auth_headers)
+        assert response.status_code == 400
+
+
+class TestForceDelete:
+    """强制删除词库和词组测试类"""
+    
+    def test_force_delete_group(self, client, auth_headers, library_with_words):
+        """测试强制删除词组：不加载单词对象，子记录和计数同步"""
+        library, groups = library_with_words
+        apple_id = VocabularyWord.query.filter_by(word='apple').first().id
+        put_json(client, f'/api/vocabulary/words/{apple_id}', {'translation': '苹果', 'tags': ['水果']}, auth_headers)
+        assert client.delete(f"/api/vocabulary/groups/{groups[0]['id']}", headers=auth_headers).status_code == 400
+        
+        with recorded_statements() as statements:
+            response = client.delete(f"/api/vocabulary/groups/{groups[0]['id']}?force=true", headers=auth_headers)
+        assert response.status_code == 200
+        assert not any('FROM vocabulary_words' in statement and statement.startswith('SELECT')
+                       for statement in statements)
+        
+        assert db.session.get(WordGroup, groups[0]['id']) is None
+        assert VocabularyWord.query.filter_by(group_id=groups[0]['id']).count() == 0
+        assert CjkGram.query.filter_by(source='vocabulary_words', record_id=apple_id).count() == 0
+        assert db.session.execute(db.select(word_tags).where(word_tags.c.record_id == apple_id)).first() is None
+        library_row = db.session.get(VocabularyLibrary, library['id'])
+        assert (library_row.groups_count, library_row.words_count) == (1, 2)
+    
+    def test_force_delete_library_in_batches(self, app, client, auth_headers, library_with_words):
+        """测试分批强制删除词库"""
+        from app.utils.bulk import force_delete_library
+        library, groups = library_with_words
+        other = json.loads(post_json(client, '/api/vocabulary/libraries', {'name': '其他词库'}, auth_headers).data)['data']
+        force_delete_library(library['id'], batch_size=1)
+        
+        assert db.session.get(VocabularyLibrary, library['id']) is None
+        assert WordGroup.query.filter_by(library_id=library['id']).count() == 0
+        assert VocabularyWord.query.count() == 0
+        assert db.session.get(VocabularyLibrary, other['id']) is not None
+        response = client.get(f"/api/vocabulary/libraries/{library['id']}", headers=auth_headers)
+        assert response.status_code == 404
+    
+    def test_background_and_active_jobs(self, app, client, auth_headers, library_with_words):
+        """测试后台强制删除，以及有进行中的导入任务时拒绝删除"""
+        library, groups = library_with_words
+        job = ImportJob(library_id=library['id'], group_id=groups[1]['id'], import_format='csv',
+                        source_path='/nonexistent', status=ImportJob.STATUS_RUNNING)
+        db.session.add(job)
+        db.session.commit()
+        response = client.delete(f"/api/vocabulary/libraries/{library['id']}?force=true", headers=auth_headers)
+        assert response.status_code == 409
+        response = client.delete(f"/api/vocabulary/groups/{groups[0]['id']}?force=true&background=true",
+                                 headers=auth_headers)
+        assert response.status_code == 202
+        assert db.session.get(WordGroup, groups[0]['id']) is None
+        
+        job.status = ImportJob.STATUS_SUCCEEDED
+        db.session.commit()
+        response = client.delete(f"/api/vocabulary/libraries/{library['id']}?force=true&background=true",
+                                 headers=auth_headers)
+        assert response.status_code == 202
+        assert db.session.get(VocabularyLibrary, library['id']) is None
+        assert ImportJob.query.count() == 0